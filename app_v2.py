@@ -1,42 +1,39 @@
 import streamlit as st
-from google import genai
-from google.genai import types
-from google.cloud import storage
-import base64
-import pdf2image
-import tempfile
-import re
-from dotenv import load_dotenv
-import os
+import threading
+import time
+from concurrent.futures import wait
+from dataclasses import replace
+from datetime import date
 
-# Load environment variables
-load_dotenv()
-
-# Constants
-PROJECT_ID = "orbit-web-apps"
-LOCATION = "us-central1"
-MODEL_NAME = "gemini-2.0-flash-exp"
-BUCKET_NAME = "orbit-reports-repository"
-REPORTS_FOLDER = "trendspot"
-
-# System instructions for the AI model
-SYSTEM_INSTRUCTIONS = """O usuário irá anexar um arquivo pdf de um relatório chamado trendspot.
-Extraia as informações dos relatórios no seguinte formato:
-Nome : Trendspot do dia "data que aparece no inicio do arquivo"
-Categoria : "categoria que aparece logo abaixo da data", podendo ser "Beleza", "Alimentação" ou outro
-Link do relatório : "link para o relatório no site do trendspot"
-****************************************************************
-Com Potencial de Crescimento: Os 2 primeiros quadros do relatório (Os que estão dentro da área com findo cinza escuro)
-Em Destaque: Os demais quadros
-Para Aproveitar Agora: Informações na área em cinza escuro na parte inferior do relatório.
-
-Observações:
-Para cada quadro extraia o título e a descrição, além do tipo, que aparece na parte inferior do quadro ("Áudio", "Produto"...)
-Para deixe uma linha com a informação "Link : Insira o link aqui"
-Retorne somente o que está sendo pedido, nenhuma informação a mais.
-Não retorne no formato MArkdown
-Separe cada informação com uma linha e com ***********************************************
-"""
+from pdf2train.batch import BatchProcessor
+from pdf2train.cache import ExtractionCache, get_extraction_cache
+from pdf2train.clients import get_client_registry
+from pdf2train.config import (
+    BUCKET_NAME,
+    JOB_POLL_INTERVAL,
+    JOB_WORKERS,
+    LOCATION,
+    METRICS_PORT,
+    PAGES_PER_SHARD,
+    PROJECT_ID,
+    REPORTS_FOLDER,
+    SAVE_MESSAGES,
+    SERVER_HOST,
+    STREAM_RENDER_INTERVAL,
+    STRUCTURED_SYSTEM_INSTRUCTIONS,
+    SYSTEM_INSTRUCTIONS,
+    THUMBNAIL_TIMEOUT,
+)
+from pdf2train.dedup import DuplicateIndex, get_duplicate_index
+from pdf2train.documents import get_thumbnail_service
+from pdf2train.gemini import GeminiClient
+from pdf2train.jobs import JobWorker, get_job_store, get_worker_pool
+from pdf2train.naming import ReportNameGenerator
+from pdf2train.pipeline import ReportPipeline
+from pdf2train.search import get_report_index
+from pdf2train.session import get_session_store
+from pdf2train.storage import StorageManager
+from pdf2train.telemetry import start_metrics_server
 
 # CSS styles for the application
 CUSTOM_CSS = """
@@ -94,144 +91,93 @@ CUSTOM_CSS = """
     </style>
 """
 
-class GeminiClient:
-    """Client for interacting with Google's Gemini AI model."""
+class StreamRenderer:
+    """Coalesce streamed chunks and flush them to a placeholder at a bounded rate."""
     
-    def __init__(self, project_id, location):
-        self.client = genai.Client(
-            vertexai=True,
-            project=project_id,
-            location=location,
-        )
-    
-    def get_safety_settings(self):
-        """Define safety settings for the model."""
-        return [
-            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
-            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
-        ]
+    def __init__(self, placeholder, interval=STREAM_RENDER_INTERVAL):
+        self.placeholder = placeholder
+        self.interval = interval
+        self._rendered = ""
+        self._pending = []
+        self._last_flush = 0.0
     
-    def process_pdf(self, base64_document, system_instructions):
-        """Process a PDF document with Gemini AI model."""
-        document = types.Part.from_bytes(
-            data=base64.b64decode(base64_document),
-            mime_type="application/pdf",
-        )
-        
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    document,
-                    types.Part.from_text("Avalie o documento anexado")
-                ]
-            )
-        ]
-        
-        generate_content_config = types.GenerateContentConfig(
-            temperature=1,
-            top_p=0.95,
-            max_output_tokens=8192,
-            response_modalities=["TEXT"],
-            safety_settings=self.get_safety_settings(),
-            system_instruction=[types.Part.from_text(system_instructions)],
-        )
-        
-        for chunk in self.client.models.generate_content_stream(
-            model=MODEL_NAME,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if not chunk.candidates or not chunk.candidates[0].content.parts:
-                continue
-            yield chunk.text
-
-
-class StorageManager:
-    """Manager for Google Cloud Storage operations."""
+    def add(self, chunk):
+        """Buffer a chunk, flushing if the last refresh is older than the interval."""
+        self._pending.append(chunk)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
     
-    def __init__(self, project_id):
-        self.storage_client = storage.Client(project_id)
+    def flush(self):
+        """Render everything received so far."""
+        if self._pending:
+            self._rendered += "".join(self._pending)
+            self._pending = []
+        self.placeholder.markdown(self._rendered)
+        self._last_flush = time.monotonic()
     
-    def save_report(self, bucket_name, file_path, report_content):
-        """Save report content to Google Cloud Storage."""
-        bucket = self.storage_client.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-        blob.upload_from_string(report_content)
-        return "Relatório Salvo !!"
-
-
-class ReportNameGenerator:
-    """Generator for report file names."""
-    
-    @staticmethod
-    def suggest_name(text, max_words=10, max_length=50):
-        """
-        Suggest a report name based on the first words of the generated text.
-        
-        Args:
-            text (str): Report text
-            max_words (int): Maximum number of words to use
-            max_length (int): Maximum length of the filename
-            
-        Returns:
-            str: Suggested report name
-        """
-        if not text.strip():
-            return "relatorio_sem_nome"
-
-        # Extract the first `max_words` words from the text
-        words = text.split()[:max_words]
-        clean_text = " ".join(words)
-
-        # Remove special characters, keep only letters, numbers and spaces
-        clean_text = re.sub(r"[^a-zA-Z0-9\s]", "", clean_text)
-
-        # Replace spaces with underscores to avoid filename issues
-        clean_text = clean_text.replace(" ", "_")
-
-        return clean_text[:max_length]
-
-
-class PdfProcessor:
-    """Processor for PDF files."""
-    
-    @staticmethod
-    def to_base64(pdf_file):
-        """Convert PDF file to base64 encoding."""
-        return base64.b64encode(pdf_file.read()).decode("utf-8")
-    
-    @staticmethod
-    def create_thumbnail(pdf_file):
-        """Create a thumbnail image from the first page of a PDF."""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            temp_pdf.write(pdf_file.getvalue())
-            temp_pdf_path = temp_pdf.name
-
-        # Convert the first page of the PDF to an image
-        images = pdf2image.convert_from_path(temp_pdf_path, first_page=1, last_page=1)
-        if images:
-            return images[0]
-        return None
+    def text(self):
+        """Full text received so far."""
+        return self._rendered + "".join(self._pending)
 
 
 class Pdf2TrainApp:
     """Main Streamlit application for Pdf2Train Trendspot."""
     
     def __init__(self):
-        self.gemini_client = GeminiClient(PROJECT_ID, LOCATION)
-        self.storage_manager = StorageManager(PROJECT_ID)
+        self.client_registry = get_client_registry()
+        self.report_index = get_report_index()
+        self.storage_manager = StorageManager(
+            PROJECT_ID, storage_client=self.client_registry.get("storage"), report_index=self.report_index
+        )
+        self.gemini_client = GeminiClient(
+            PROJECT_ID, LOCATION, client=self.client_registry.get("gemini"), storage_manager=self.storage_manager
+        )
+        self.extraction_cache = get_extraction_cache()
+        self.duplicate_index = get_duplicate_index()
+        self.thumbnail_service = get_thumbnail_service()
+        self.session_store = get_session_store()
+        self.job_store = get_job_store()
+        if JOB_WORKERS > 0:
+            get_worker_pool()
+        if METRICS_PORT:
+            start_metrics_server(SERVER_HOST, METRICS_PORT)
+        self.thumbnail_slot = None
+        self.thumbnail_future = None
         self.initialize_session_state()
         self.setup_page_config()
         
     def initialize_session_state(self):
         """Initialize Streamlit session state variables."""
+        if "session_id" not in st.session_state:
+            st.session_state["session_id"] = self.session_store.new_session()
+        # PDFs and responses live in the session store; session state only keeps their Payload handles
         if "response" not in st.session_state:
-            st.session_state["response"] = ""
+            st.session_state["response"] = None
         if "uploaded_file" not in st.session_state:
             st.session_state["uploaded_file"] = None
+        if "response_key" not in st.session_state:
+            st.session_state["response_key"] = None
+        if "uploaded_files" not in st.session_state:
+            st.session_state["uploaded_files"] = []
+        if "upload_handles" not in st.session_state:
+            # Per Streamlit file id, so reruns do not hash and write the same upload again
+            st.session_state["upload_handles"] = {}
+        if "batch_results" not in st.session_state:
+            st.session_state["batch_results"] = []
+        if "batch_key" not in st.session_state:
+            st.session_state["batch_key"] = None
+        if "extraction_metrics" not in st.session_state:
+            st.session_state["extraction_metrics"] = None
+        if "structured_mode" not in st.session_state:
+            st.session_state["structured_mode"] = False
+        if "page_split" not in st.session_state:
+            st.session_state["page_split"] = False
+        if "duplicate_choices" not in st.session_state:
+            # Per upload cache key: "reuse" or "extract", once the user answered the near-duplicate prompt
+            st.session_state["duplicate_choices"] = {}
+        if "restored_job" not in st.session_state:
+            # A fresh session with a job in the URL is a refreshed page: attach to that job
+            st.session_state["restored_job"] = st.query_params.get("job")
             
     def setup_page_config(self):
         """Set up the page configuration."""
@@ -255,47 +201,456 @@ class Pdf2TrainApp:
             )
             st.divider()
             
-            uploaded_file = st.file_uploader("Faça o upload de um arquivo PDF", type=["pdf"])
-            st.session_state["uploaded_file"] = uploaded_file
+            uploaded_files = st.file_uploader(
+                "Faça o upload de um ou mais arquivos PDF", type=["pdf"], accept_multiple_files=True
+            )
+            previous = st.session_state["upload_handles"]
+            handles = {f.file_id: self.store_upload(f, previous.get(f.file_id)) for f in uploaded_files}
+            st.session_state["upload_handles"] = handles
+            st.session_state["uploaded_files"] = list(handles.values())
+            st.session_state["uploaded_file"] = (
+                st.session_state["uploaded_files"][0] if len(uploaded_files) == 1 else None
+            )
+            if uploaded_files:
+                st.session_state["restored_job"] = None
+            self.thumbnail_slot = st.empty()
+            
+            st.toggle("Extração estruturada (JSON)", key="structured_mode")
+            st.toggle(
+                "Dividir PDFs longos por páginas", key="page_split",
+                help=f"Extrai blocos de {PAGES_PER_SHARD} páginas em paralelo e junta o resultado.",
+            )
             
+    def store_upload(self, uploaded_file, handle=None):
+        """Handle of an upload in the session store, written only if `handle` (from an earlier rerun) is gone."""
+        if handle is None or not self.session_store.contains(handle):
+            handle = self.session_store.put(
+                st.session_state["session_id"], uploaded_file.getbuffer(), "pdf", name=uploaded_file.name
+            )
+        return handle
+    
+    def open_upload(self, handle):
+        """Memory-map an upload from the session store, asking for it again if it was evicted."""
+        document = self.session_store.open_document(handle)
+        if document is None:
+            st.session_state["upload_handles"] = {}
+            st.warning("O arquivo expirou no servidor. Envie o PDF novamente.")
+        return document
+    
+    def response(self):
+        """Text of the response on screen, or None if there is none (or it was evicted)."""
+        handle = st.session_state["response"]
+        if handle is None:
+            return None
+        return self.session_store.get(st.session_state["session_id"], handle)
+    
+    def store_response(self, response, cache_key, metrics=None):
+        """Put a finished extraction on screen."""
+        st.session_state["response"] = self.session_store.put(st.session_state["session_id"], response, "text")
+        st.session_state["response_key"] = cache_key
+        st.session_state["extraction_metrics"] = metrics
+    
+    def store_cached_response(self, response, cache_key, page_split=False):
+        """Put a cached extraction on screen, post-processed as a fresh job would be; the cache keeps it raw."""
+        if not st.session_state["structured_mode"] and not page_split:
+            report = ReportPipeline().process([response])
+            response = report.text
+            self.render_problems("; ".join(report.problems))
+        self.store_response(response, cache_key)
+    
+    @staticmethod
+    def render_problems(problems):
+        """Point out what the report pipeline advises reviewing."""
+        if problems:
+            st.warning(f"Revise o relatório: {problems}.")
+    
+    def start_thumbnail(self, document):
+        """Start rendering the preview of `document` in the background."""
+        self.thumbnail_future = self.thumbnail_service.submit(document)
+        self.render_thumbnail()
+    
+    def render_thumbnail(self, timeout=0):
+        """Show the preview once it has rendered, waiting at most `timeout` seconds."""
+        future = self.thumbnail_future
+        if future is None:
+            return
+        wait([future], timeout=timeout)
+        if not future.done():
+            return
+        self.thumbnail_future = None
+        if future.exception() is None and future.result():
+            self.thumbnail_slot.image(future.result(), caption="Primeira página")
+    
+    def render_cache_stats(self):
+        """Render extraction cache and shared client counters in the sidebar."""
+        stats = self.extraction_cache.stats()
+        with st.sidebar:
+            st.divider()
+            st.caption(
+                f"Cache de extrações: {stats['hits']} acertos "
+                f"({stats['disk_hits']} do disco) / {stats['misses']} falhas"
+            )
+            st.caption(f"Índice de duplicatas: {self.duplicate_index.stats()['documents']} relatórios")
+            st.caption(f"Índice de busca: {self.report_index.stats()['reports']} relatórios salvos")
+            session_stats = self.session_store.stats()
+            st.caption(
+                f"Sessões: {session_stats['sessions']} com dados em memória "
+                f"({session_stats['memory_bytes'] / 1024 ** 2:.1f} MB)"
+            )
+            for name, client_stats in self.client_registry.stats().items():
+                st.caption(
+                    f"Cliente {name}: {client_stats['builds']} criações "
+                    f"({client_stats['build_seconds']:.2f}s), {client_stats['reuses']} reutilizações"
+                )
             
-    def process_pdf_document(self):
+    @staticmethod
+    def system_instructions():
+        """System instructions for the extraction mode selected in the sidebar."""
+        if st.session_state["structured_mode"]:
+            return STRUCTURED_SYSTEM_INSTRUCTIONS
+        return SYSTEM_INSTRUCTIONS
+    
+    def process_pdf_document(self, document):
         """Process the uploaded PDF document."""
+        from pdf2train.pages import PageSplitExtractor
+        
+        structured = st.session_state["structured_mode"]
+        system_instructions = self.system_instructions()
+        page_split = (
+            st.session_state["page_split"] and PageSplitExtractor.page_count(document) > PAGES_PER_SHARD
+        )
+        instructions_key = system_instructions + ("\0page-split" if page_split else "")
+        cache_key = ExtractionCache.make_key(document.data, self.gemini_client.model_key, instructions_key)
+        
+        # Reruns of the same upload keep the response already in the session
+        if st.session_state["response_key"] == cache_key and self.response() is not None:
+            self.render_extraction_metrics()
+            return
+        
+        cached_response = self.extraction_cache.get(cache_key)
+        if cached_response is not None:
+            self.store_cached_response(cached_response, cache_key, page_split)
+            return
         
-        with st.spinner("Extraindo Dados. Aguarde..."):
-            uploaded_file = st.session_state["uploaded_file"]
-            base64_pdf = PdfProcessor.to_base64(uploaded_file)
-            st.session_state["response"] = ""
+        if self.offer_duplicate(document, instructions_key, cache_key):
+            return
+        
+        job = self.job_store.submit(
+            st.session_state["uploaded_file"].name, document, cache_key, structured, page_split
+        )
+        # Keeping the job in the URL lets a refreshed page attach to it without re-uploading
+        st.query_params["job"] = job.id
+        self.follow_job(job.id)
+    
+    def offer_duplicate(self, document, instructions_key, cache_key):
+        """
+        Offer the extraction of an already processed near duplicate instead of calling the model.
+        
+        Returns:
+            bool: True if the upload is settled (extraction reused or awaiting
+            the user's choice), False to extract it
+        """
+        choices = st.session_state["duplicate_choices"]
+        if choices.get(cache_key) == "extract" or not self.duplicate_index.enabled:
+            return False
+        variant = DuplicateIndex.variant(self.gemini_client.model_key, instructions_key)
+        match, response = self.duplicate_index.lookup(document, variant, self.extraction_cache, exclude=cache_key)
+        if match is None:
+            return False
+        
+        if choices.get(cache_key) != "reuse":
+            st.info(
+                f"Este PDF é muito parecido com \"{match.name}\" (similaridade de {match.similarity:.0%}), "
+                "que já foi extraído. Reaproveitar a extração evita uma nova chamada ao modelo."
+            )
+            reuse_column, extract_column = st.columns(2)
+            if extract_column.button("Extrair novamente"):
+                choices[cache_key] = "extract"
+                return False
+            if not reuse_column.button("Usar extração existente"):
+                return True
+            choices[cache_key] = "reuse"
+        
+        self.store_cached_response(response, cache_key, instructions_key.endswith("\0page-split"))
+        return True
+    
+    def follow_job(self, job_id):
+        """Poll an extraction job, rendering its partial output until it finishes."""
+        from pdf2train.schema import StructuredStreamParser
+        
+        job = self.job_store.get(job_id)
+        if job is None:
+            st.error("A extração não foi encontrada. Envie o PDF novamente.")
+            st.session_state["restored_job"] = None
+            del st.query_params["job"]
+            return
+        if st.session_state["response_key"] == job.cache_key and self.response() is not None:
+            self.render_extraction_metrics()
+            return
+        
+        if not job.finished:
+            with st.spinner("Extraindo Dados. Aguarde..."):
+                status = st.empty()
+                placeholder = st.empty()
+                renderer = StreamRenderer(placeholder)
+                parser = StructuredStreamParser() if job.structured else None
+                seen = 0
+                local_run = None
+                
+                while not job.finished:
+                    # Without a live worker the job would wait forever, so this process runs it instead;
+                    # behind busy workers it keeps its place in the queue
+                    if (local_run is None or not local_run.is_alive()) and self.job_store.orphaned(job):
+                        local_run = self.run_job_here(job.id)
+                    if job.status == "queued":
+                        status.caption("Na fila de extração...")
+                    elif job.page_split:
+                        status.caption(f"Extraindo blocos de páginas (tentativa {job.attempts})...")
+                    else:
+                        status.caption(f"Extraindo (tentativa {job.attempts})...")
+                    
+                    # A retried job streams again from the start
+                    if len(job.partial) < seen:
+                        renderer = StreamRenderer(placeholder)
+                        parser = StructuredStreamParser() if job.structured else None
+                        seen = 0
+                    chunk = job.partial[seen:]
+                    seen = len(job.partial)
+                    if chunk and parser is None:
+                        renderer.add(chunk)
+                    elif chunk:
+                        for quadro in parser.feed(chunk):
+                            renderer.add(f"**{quadro.get('title', '')}** · {quadro.get('type', '')}\n\n")
+                    
+                    self.render_thumbnail()
+                    time.sleep(JOB_POLL_INTERVAL)
+                    job = self.job_store.get(job_id)
+                
+                # The editor below shows the final text, so the live preview is cleared
+                status.empty()
+                placeholder.empty()
+        
+        if job.status == "failed":
+            st.error(f"Falha na extração: {job.error}")
+            return
+        
+        if job.error:
+            st.error(job.error)
+        self.render_problems(job.problems)
+        if job.truncated:
+            st.warning(
+                "A resposta atingiu o limite de tokens e está incompleta. "
+                "Ative \"Dividir PDFs longos por páginas\" para extrair o relatório em partes."
+            )
+        self.store_response(job.response, job.cache_key, job.metrics())
+        self.render_extraction_metrics()
+                
+    def run_job_here(self, job_id):
+        """Run a job no worker has claimed on a thread of this process."""
+        worker = JobWorker(self.job_store, self.gemini_client, cache=self.extraction_cache,
+                           duplicates=self.duplicate_index)
+        thread = threading.Thread(target=worker.run_once, args=(job_id,), name="pdf2train-local-job", daemon=True)
+        thread.start()
+        return thread
+    
+    def render_extraction_metrics(self):
+        """Render timing of the last extraction."""
+        metrics = st.session_state["extraction_metrics"]
+        if not metrics:
+            return
+        if metrics["time_to_first_chunk"] is None:
+            st.caption(f"Extração por páginas concluída em {metrics['total']:.1f}s")
+            return
+        st.caption(
+            f"Primeiro trecho em {metrics['time_to_first_chunk']:.1f}s · "
+            f"concluído em {metrics['total']:.1f}s ({metrics['chunks']} trechos)"
+        )
+    
+    def process_batch(self):
+        """Process several uploaded PDFs concurrently, showing each result as it finishes."""
+        uploaded_files = st.session_state["uploaded_files"]
+        batch_key = (st.session_state["structured_mode"],) + tuple(
+            (f.name, f.digest) for f in uploaded_files
+        )
+        
+        if st.session_state["batch_key"] != batch_key:
+            documents = [(f.name, self.open_upload(f)) for f in uploaded_files]
+            if any(document is None for _, document in documents):
+                return
+            processor = BatchProcessor(
+                self.gemini_client, self.system_instructions(),
+                cache=self.extraction_cache, structured=st.session_state["structured_mode"],
+                duplicates=self.duplicate_index, pipeline=ReportPipeline(),
+            )
+            progress = st.progress(0.0, text=f"0/{len(documents)} arquivos processados")
+            results = []
             
-            placeholder = st.empty()
+            for result in processor.process(documents):
+                # Session state keeps the response's handle in place of its text, and not the parsed report
+                if result.response:
+                    result = replace(result, report=None, response=self.session_store.put(
+                        st.session_state["session_id"], result.response, "text"
+                    ))
+                results.append(result)
+                progress.progress(
+                    len(results) / len(documents),
+                    text=f"{len(results)}/{len(documents)} arquivos processados",
+                )
+                self.render_batch_result(result)
             
-            for chunk in self.gemini_client.process_pdf(base64_pdf, SYSTEM_INSTRUCTIONS):
-                st.session_state["response"] += chunk
-                # Uncomment to show streaming updates:
-                # placeholder.markdown(st.session_state["response"])
+            st.session_state["batch_results"] = results
+            st.session_state["batch_key"] = batch_key
+        else:
+            for result in st.session_state["batch_results"]:
+                self.render_batch_result(result)
+        
+        self.render_batch_save()
+    
+    def render_batch_result(self, result):
+        """Render the outcome of a single batch extraction."""
+        if result.ok:
+            timing = "cache" if result.cached else f"{result.elapsed:.1f}s"
+            if result.duplicate_of and result.cached:
+                timing = f"reaproveitado de {result.duplicate_of}"
+            elif result.duplicate_of:
+                timing += f", parecido com {result.duplicate_of}"
+            if result.time_to_first_chunk is not None:
+                timing += f", primeiro trecho em {result.time_to_first_chunk:.1f}s"
+            label = f"✅ {result.name} ({timing})"
+        elif result.truncated:
+            label = f"⚠️ {result.name} (resposta incompleta)"
+        else:
+            label = f"⚠️ {result.name} (falhou após {result.attempts} tentativas)"
+        
+        with st.expander(label):
+            if not result.ok:
+                st.error(result.error)
+            if result.response:
+                st.text(self.session_store.get(st.session_state["session_id"], result.response) or "")
+    
+    def render_batch_save(self):
+        """Render the button that saves every successful batch extraction."""
+        from pydantic import ValidationError
+        
+        results = [r for r in st.session_state["batch_results"] if r.ok and r.response]
+        if not results:
+            return
+        
+        st.divider()
+        if st.button(f"Salvar {len(results)} Relatórios"):
+            with st.spinner("Salvando Relatórios. Aguarde..."):
+                reports = []
+                for result in results:
+                    response = self.session_store.get(st.session_state["session_id"], result.response)
+                    if response is None:
+                        st.error(f"{result.name} expirou no servidor e não foi salvo. Processe o lote novamente.")
+                        continue
+                    try:
+                        report_name, report_content, extension = self.prepare_report(response)
+                    except ValidationError:
+                        st.error(f"{result.name} não segue o esquema esperado e não foi salvo.")
+                        continue
+                    reports.append((f"{REPORTS_FOLDER}/{report_name}.{extension}", report_content))
                 
+                saved = 0
+                for file_path, status, error in self.storage_manager.save_reports(BUCKET_NAME, reports):
+                    if error is not None:
+                        st.error(f"Falha ao salvar {file_path}: {error}")
+                    elif status == "conflict":
+                        st.warning(f"Já existe outro relatório em {file_path}; ele não foi substituído.")
+                    else:
+                        saved += 1
+            st.success(f"{saved} Relatórios Salvos !!")
+    
+    @staticmethod
+    def prepare_report(response):
+        """Turn an extraction into (suggested name, content, file extension) for the current mode."""
+        from pdf2train.schema import render_report
+        
+        return render_report(response, st.session_state["structured_mode"])
+    
     def render_report_editor(self):
         """Render the report editor UI."""
-        if st.session_state["response"] != "":
+        response = self.response()
+        if response:
+            # pydantic and the Cloud Storage SDK load with the first report on screen, not with the app
+            from google.api_core.exceptions import PreconditionFailed
+            from pydantic import ValidationError
+            
             st.markdown("### Relatório Gerado")
             edited_response = st.text_area(
                 "Edite o relatório antes de salvar:", 
-                value=st.session_state["response"], 
+                value=response, 
                 height=300
             )
             
             st.divider()
-            suggested_name = ReportNameGenerator.suggest_name(st.session_state["response"])
+            try:
+                suggested_name = self.prepare_report(response)[0]
+            except ValidationError:
+                suggested_name = ReportNameGenerator.suggest_name(response)
             report_name = st.text_input("Nome do Relatório:", suggested_name)
+            overwrite = st.checkbox("Substituir o relatório salvo com este nome, se houver")
             
             if st.button("Salvar Relatório"):
                 with st.spinner("Salvando Relatório. Aguarde..."):
-                    if report_name.strip():
-                        file_path = f"{REPORTS_FOLDER}/{report_name}.txt"
-                        result = self.storage_manager.save_report(BUCKET_NAME, file_path, edited_response)
-                        st.success(result)
-                    else:
+                    if not report_name.strip():
                         st.error("O nome do relatório não pode estar em branco.")
+                        return
+                    try:
+                        _, report_content, extension = self.prepare_report(edited_response)
+                    except ValidationError as exc:
+                        st.error(f"O relatório não segue o esquema esperado: {exc.error_count()} erros.")
+                        return
+                    file_path = f"{REPORTS_FOLDER}/{report_name}.{extension}"
+                    try:
+                        outcome = self.storage_manager.upload_report(BUCKET_NAME, file_path, report_content,
+                                                                     overwrite=overwrite)
+                    except PreconditionFailed:
+                        st.error("O relatório foi alterado por outra pessoa enquanto era salvo. Tente novamente.")
+                        return
+                    if outcome == "conflict":
+                        st.warning(SAVE_MESSAGES[outcome])
+                    else:
+                        st.success(SAVE_MESSAGES[outcome])
+    
+    def render_report_search(self):
+        """Render the search over the saved reports, answered by the local report index."""
+        facets = self.report_index.facets()
+        with st.expander("Buscar relatórios salvos"):
+            with st.form("report_search"):
+                text = st.text_input("Palavras nos quadros")
+                category_column, type_column = st.columns(2)
+                category = category_column.selectbox(
+                    "Categoria", ["Todas"] + [name for name, _ in facets["categories"]]
+                )
+                quadro_type = type_column.selectbox(
+                    "Tipo de quadro", ["Todos"] + [name for name, _ in facets["types"]]
+                )
+                dates = st.date_input("Período", value=(), format="DD/MM/YYYY")
+                submitted = st.form_submit_button("Buscar")
+            if not submitted:
+                return
+            
+            result = self.report_index.search(
+                text,
+                category=None if category == "Todas" else category,
+                quadro_type=None if quadro_type == "Todos" else quadro_type,
+                date_from=dates[0] if len(dates) > 0 else None,
+                date_to=dates[1] if len(dates) > 1 else None,
+                bucket=BUCKET_NAME,
+            )
+            st.caption(f"{result.total} relatórios encontrados em {result.seconds * 1000:.0f} ms")
+            for hit in result.hits:
+                report_date = "sem data"
+                if hit.report_date:
+                    report_date = date.fromisoformat(hit.report_date).strftime("%d/%m/%Y")
+                st.markdown(f"**{hit.name}** · {hit.category or 'sem categoria'} · {report_date}")
+                for quadro in hit.quadros[:5]:
+                    suffix = f" ({quadro['type']})" if quadro["type"] else ""
+                    st.markdown(f"- {quadro['title']}{suffix}")
+                if len(hit.quadros) > 5:
+                    st.caption(f"e mais {len(hit.quadros) - 5} quadros")
     
     def run(self):
         """Run the Streamlit application."""
@@ -307,9 +662,24 @@ class Pdf2TrainApp:
         if st.session_state["uploaded_file"] is not None:
             
             st.success("Arquivo PDF carregado com sucesso!")            
-            #display_pdf(st.session_state["uploaded_file"])
-            self.process_pdf_document()
+            document = self.open_upload(st.session_state["uploaded_file"])
+            if document is not None:
+                self.start_thumbnail(document)
+                self.process_pdf_document(document)
+            self.render_report_editor()
+            # Everything else is on screen by now, so waiting here delays nothing visible
+            self.render_thumbnail(timeout=THUMBNAIL_TIMEOUT)
+        elif len(st.session_state["uploaded_files"]) > 1:
+            st.success(f"{len(st.session_state['uploaded_files'])} arquivos PDF carregados com sucesso!")
+            self.process_batch()
+        elif st.session_state["restored_job"]:
+            self.follow_job(st.session_state["restored_job"])
             self.render_report_editor()
+        elif "job" in st.query_params:
+            del st.query_params["job"]
+        
+        self.render_report_search()
+        self.render_cache_stats()
 
 
 
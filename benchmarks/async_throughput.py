@@ -0,0 +1,67 @@
+"""Throughput of GeminiClient.process_pdf (threads) vs process_pdf_async (one event loop).
+
+Run from the repository root:
+    python -m benchmarks.async_throughput --requests 100 --threads 8
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf2train import SYSTEM_INSTRUCTIONS, GeminiClient, PdfDocument
+from pdf2train.quota import build_quota_guard
+from benchmarks.fake_gemini import FakeGenaiClient
+
+
+def run_sync(client, documents, threads):
+    def extract(document):
+        return "".join(client.process_pdf(document, SYSTEM_INSTRUCTIONS))
+    
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(extract, documents))
+    return time.monotonic() - start
+
+
+async def run_async(client, documents, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def extract(document):
+        async with semaphore:
+            return "".join([chunk async for chunk in client.process_pdf_async(document, SYSTEM_INSTRUCTIONS)])
+    
+    start = time.monotonic()
+    await asyncio.gather(*(extract(document) for document in documents))
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8, help="Server threads available to the sync path")
+    parser.add_argument("--concurrency", type=int, default=100, help="In-flight streams on the async path")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--chunks", type=int, default=20)
+    args = parser.parse_args()
+    
+    fake = FakeGenaiClient(first_chunk_latency=args.latency, chunk_latency=0.01, chunks=args.chunks)
+    # No quota here: the benchmark measures the transport, not the rate limiter
+    guard = build_quota_guard(requests_per_minute=0, max_concurrency=args.concurrency, state_path=None)
+    client = GeminiClient(None, None, client=fake, quota_guard=guard)
+    documents = [PdfDocument(os.urandom(4096)) for _ in range(args.requests)]
+    
+    sync_elapsed = run_sync(client, documents, args.threads)
+    print(f"sync   threads={args.threads:<4} elapsed={sync_elapsed:.2f}s "
+          f"throughput={args.requests / sync_elapsed:.1f} req/s")
+    
+    threads_before = threading.active_count()
+    async_elapsed = asyncio.run(run_async(client, documents, args.concurrency))
+    print(f"async  threads=1    elapsed={async_elapsed:.2f}s "
+          f"throughput={args.requests / async_elapsed:.1f} req/s "
+          f"(in-flight limit {args.concurrency}, threads before run {threads_before})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Batch throughput against FakeGeminiClient.
+
+Run from the repository root:
+    python -m benchmarks.batch_throughput --files 40 --workers 1 4 8
+"""
+import argparse
+import os
+import time
+
+from pdf2train import SYSTEM_INSTRUCTIONS, BatchProcessor, PdfDocument
+from benchmarks.fake_gemini import FakeGeminiClient
+
+
+def run(files, workers, rpm, failure_rate, latency):
+    client = FakeGeminiClient(first_chunk_latency=latency, failure_rate=failure_rate, seed=0)
+    processor = BatchProcessor(
+        client, SYSTEM_INSTRUCTIONS,
+        max_workers=workers, requests_per_minute=rpm, max_retries=2, retry_backoff=0.1,
+    )
+    documents = [(f"doc_{i}.pdf", PdfDocument(os.urandom(2048))) for i in range(files)]
+    
+    start = time.monotonic()
+    results = list(processor.process(documents))
+    elapsed = time.monotonic() - start
+    
+    ok = sum(1 for r in results if r.ok)
+    print(f"workers={workers:<3} files={files} ok={ok} calls={client.calls} "
+          f"max_in_flight={client.max_in_flight} elapsed={elapsed:.2f}s "
+          f"throughput={files / elapsed:.2f} files/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rpm", type=float, default=0, help="0 disables the rate limiter")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    
+    for workers in args.workers:
+        run(args.files, workers, args.rpm, args.failure_rate, args.latency)
+
+
+if __name__ == "__main__":
+    main()
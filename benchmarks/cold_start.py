@@ -0,0 +1,173 @@
+"""Cold start vs warm start: time until a new replica is ready and until its first request is served.
+
+Measures, each in a fresh interpreter:
+  * import time of app_v2 with the old eager imports (pydantic, the Cloud
+    Storage SDK, pdf2train.pages and pdf2train.schema) and with the lazy ones,
+    both compiled from source and from precompiled bytecode
+  * time-to-first-request of the Streamlit app. "before" is `streamlit run
+    app_v2.py` compiling from source, "after" is the image's `python -m
+    pdf2train app` with precompiled bytecode and the boot warm-up. The first
+    request is a browser session running the script once.
+  * time-to-first-request of `python -m pdf2train serve`, without the warm-up
+    and from source vs with it and precompiled, the first request being a
+    report search
+
+"Compiled from source" points PYTHONPYCACHEPREFIX at an empty directory and
+turns bytecode writing off, so every module is compiled again on every run,
+as in an image built without compileall.
+
+Run from the repository root, inside the app image to compare like for like:
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --runs 3 --skip-servers
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+EAGER_IMPORTS = "import google.api_core.exceptions, pydantic, pdf2train.pages, pdf2train.schema, app_v2"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Stays empty: with bytecode writing off, nothing is ever cached in it
+_NO_BYTECODE = tempfile.TemporaryDirectory(prefix="pdf2train_nopyc_")
+
+
+def environment(precompiled, **settings):
+    env = dict(os.environ, **settings)
+    if not precompiled:
+        env.update(PYTHONPYCACHEPREFIX=_NO_BYTECODE.name, PYTHONDONTWRITEBYTECODE="1")
+    return env
+
+
+def time_import(statement, precompiled):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, env=environment(precompiled))
+    return time.perf_counter() - start
+
+
+def wait_until(url, process, start, timeout):
+    """Seconds since `start` until `url` answers 200."""
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+
+def run_script_once(port, timeout):
+    """Open a browser session on the Streamlit app and wait for its first script run to finish."""
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from websockets.sync.client import connect
+    
+    message = BackMsg()
+    message.rerun_script.SetInParent()
+    with connect(f"ws://127.0.0.1:{port}/_stcore/stream", open_timeout=timeout) as websocket:
+        websocket.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(websocket.recv(timeout=timeout))
+            if forward.WhichOneof("type") == "script_finished":
+                return
+
+
+def search_once(port, timeout):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/reports?q=trendspot", timeout=timeout) as response:
+        json.load(response)
+
+
+def time_to_first_request(command, ready_path, first_request, port, env, timeout=120):
+    """(seconds until ready, seconds until the first request is served) for a freshly started server."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    try:
+        ready = wait_until(f"http://127.0.0.1:{port}{ready_path}", process, start, timeout)
+        first_request(port, timeout)
+        return ready, time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def report(label, samples):
+    print(f"{label:<44} median={statistics.median(samples):.2f}s min={min(samples):.2f}s max={max(samples):.2f}s")
+
+
+def report_startup(label, samples):
+    ready = [ready for ready, _ in samples]
+    served = [served for _, served in samples]
+    first = [served - ready for ready, served in samples]
+    print(f"{label:<44} ready={statistics.median(ready):.2f}s first request={statistics.median(first):.2f}s "
+          f"time-to-first-request={statistics.median(served):.2f}s (median of {len(samples)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-servers", action="store_true", help="Only measure import time")
+    args = parser.parse_args()
+    
+    # One run writes the bytecode the precompiled runs read, as compileall does in the image
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "app_v2.py", "pdf2train"], check=True)
+    time_import(EAGER_IMPORTS, precompiled=True)
+    for precompiled in (False, True):
+        suffix = "precompiled" if precompiled else "from source"
+        report(f"import app_v2, eager imports ({suffix})",
+               [time_import(EAGER_IMPORTS, precompiled) for _ in range(args.runs)])
+        report(f"import app_v2, lazy imports ({suffix})",
+               [time_import("import app_v2", precompiled) for _ in range(args.runs)])
+    report("import pdf2train.cli", [time_import("import pdf2train.cli", True) for _ in range(args.runs)])
+    if args.skip_servers:
+        return
+    
+    streamlit_settings = {
+        "STREAMLIT_SERVER_HEADLESS": "true",
+        "STREAMLIT_BROWSER_GATHER_USAGE_STATS": "false",
+        "STREAMLIT_SERVER_FILE_WATCHER_TYPE": "none",
+    }
+    app = {"before": [], "after": []}
+    service = {"before": [], "after": []}
+    for _ in range(args.runs):
+        port = free_port()
+        app["before"].append(time_to_first_request(
+            [sys.executable, "-m", "streamlit", "run", "app_v2.py", "--server.address", "127.0.0.1",
+             "--server.port", str(port)],
+            "/_stcore/health", run_script_once, port,
+            environment(False, PDF2TRAIN_STARTUP_WARMUP="0", **streamlit_settings),
+        ))
+        port = free_port()
+        app["after"].append(time_to_first_request(
+            [sys.executable, "-m", "pdf2train", "app", "--host", "127.0.0.1", "--port", str(port)],
+            "/_stcore/health", run_script_once, port,
+            environment(True, PDF2TRAIN_STARTUP_WARMUP="1", **streamlit_settings),
+        ))
+        for variant, warmup in (("before", "0"), ("after", "1")):
+            port = free_port()
+            service[variant].append(time_to_first_request(
+                [sys.executable, "-m", "pdf2train", "serve", "--host", "127.0.0.1", "--port", str(port)],
+                "/readyz", search_once, port, environment(variant == "after", PDF2TRAIN_STARTUP_WARMUP=warmup),
+            ))
+    for variant in ("before", "after"):
+        report_startup(f"streamlit app ({variant})", app[variant])
+    for variant in ("before", "after"):
+        report_startup(f"pdf2train serve ({variant})", service[variant])
+
+
+if __name__ == "__main__":
+    main()
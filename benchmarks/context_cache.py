@@ -0,0 +1,98 @@
+"""Per-request overhead and savings of caching the shared system instructions.
+
+Offline, the request config is built for every request the way it used to be
+and then reused from the client, and the time per request is compared. This
+needs google-genai installed but no credentials.
+
+With --live, each PDF is sent alternately with the instructions inline and
+referenced from a cached content, and every request reports its time to first
+chunk, total time, billed prompt and cached tokens and estimated cost. The
+model refuses to cache prefixes below its minimum size, so --pad repeats the
+instructions until they reach it; the inline requests send the same padded
+text so both paths carry the same prefix.
+
+Run from the repository root:
+    python -m benchmarks.context_cache
+    python -m benchmarks.context_cache entrada/*.pdf --live --runs 3 --pad 4096
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+import pdf2train.gemini
+from pdf2train import MODEL_NAME, SYSTEM_INSTRUCTIONS, GeminiClient
+from pdf2train.cli import collect_documents
+from pdf2train.context_cache import ContextCache
+from pdf2train.telemetry import estimate_cost
+
+
+def offline(requests):
+    gemini = GeminiClient(None, None, client=object(), context_cache=ContextCache(None, ttl=0))
+    for structured in (False, True):
+        start = time.perf_counter()
+        for _ in range(requests):
+            gemini._configs.clear()
+            pdf2train.gemini._safety_settings = None
+            gemini.generation_config(SYSTEM_INSTRUCTIONS, structured)
+        rebuilt = (time.perf_counter() - start) / requests
+        
+        start = time.perf_counter()
+        for _ in range(requests):
+            gemini.generation_config(SYSTEM_INSTRUCTIONS, structured)
+        reused = (time.perf_counter() - start) / requests
+        print(f"config structured={structured!s:<5} rebuilt={rebuilt * 1e6:.0f}us reused={reused * 1e6:.1f}us "
+              f"per request")
+
+
+def live(documents, runs, pad_tokens):
+    from pdf2train.gemini import build_gemini_client
+    
+    instructions = SYSTEM_INSTRUCTIONS
+    while len(instructions) // 4 < pad_tokens:
+        instructions += "\n\n" + SYSTEM_INSTRUCTIONS
+    client = build_gemini_client()
+    cache = ContextCache(client, min_tokens=0)
+    paths = {
+        "inline": GeminiClient(None, None, client=client, context_cache=ContextCache(client, ttl=0)),
+        "cached": GeminiClient(None, None, client=client, context_cache=cache),
+    }
+    try:
+        for name, document in documents:
+            for run in range(runs):
+                for path, gemini in paths.items():
+                    metadata = {}
+                    start = time.perf_counter()
+                    first_chunk = None
+                    for _ in gemini.process_pdf(document, instructions, metadata=metadata):
+                        if first_chunk is None:
+                            first_chunk = time.perf_counter() - start
+                    total = time.perf_counter() - start
+                    tokens = metadata.get("tokens", {})
+                    cost = estimate_cost(MODEL_NAME, **tokens)
+                    print(f"{name} {path:<6} run={run} prompt_tokens={tokens.get('prompt_tokens')} "
+                          f"cached_tokens={tokens.get('cached_tokens')} first_chunk={first_chunk or total:.2f}s "
+                          f"total={total:.2f}s cost=${cost:.5f}")
+    finally:
+        print(f"cached contents: {cache.stats()}")
+        cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="PDF files, globs or directories (for --live)")
+    parser.add_argument("--requests", type=int, default=2000, help="Configs built per offline measurement")
+    parser.add_argument("--live", action="store_true", help="Send inline and cached requests (needs credentials)")
+    parser.add_argument("--runs", type=int, default=1, help="Live requests per path and file")
+    parser.add_argument("--pad", type=int, default=4096, help="Minimum instruction size in estimated tokens")
+    args = parser.parse_args()
+    
+    offline(args.requests)
+    if args.live:
+        live(collect_documents(args.inputs), args.runs, args.pad)
+
+
+if __name__ == "__main__":
+    main()
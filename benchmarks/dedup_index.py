@@ -0,0 +1,87 @@
+"""Near-duplicate index: lookup latency as it grows, and how well SimHash finds re-exports.
+
+Synthetic reports are random Portuguese-like word sequences. A "re-export" of a
+report changes a few words (dates, a typo, a footer); an unrelated report is a
+fresh sequence. Recall is the share of re-exports found, false positives the
+share of unrelated reports matched.
+
+Run from the repository root:
+    python -m benchmarks.dedup_index --reports 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from pdf2train.dedup import DuplicateIndex, Fingerprint, simhash
+
+VOCABULARY = [
+    "tendência", "consumo", "moda", "beleza", "marca", "criadores", "crescimento", "busca", "redes",
+    "jovens", "coleção", "sustentável", "verão", "varejo", "digital", "conteúdo", "campanha", "público",
+    "produto", "experiência", "cultura", "música", "viagem", "casa", "bem-estar", "alimentação", "café",
+    "quadro", "potencial", "aproveitar", "agora", "semana", "mês", "mercado", "lançamento", "parceria",
+]
+
+
+def report_words(rng, words=600):
+    return [rng.choice(VOCABULARY) + str(rng.randrange(40)) for _ in range(words)]
+
+
+def re_export(rng, words, edits):
+    edited = list(words)
+    for _ in range(edits):
+        edited[rng.randrange(len(edited))] = rng.choice(VOCABULARY)
+    return edited
+
+
+def run(reports, edits, lookups, max_distance):
+    rng = random.Random(reports)
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = DuplicateIndex(os.path.join(index_dir, "dedup.sqlite3"), max_distance=max_distance)
+        originals = []
+        start = time.perf_counter()
+        for number in range(reports):
+            # Only a sample keeps its words; the rest just need realistic fingerprints
+            words = report_words(rng) if number < lookups else None
+            value = simhash(words) if words else rng.getrandbits(64)
+            index.add(f"key-{number}", f"report-{number}.pdf", Fingerprint("text", value), "v")
+            if words:
+                originals.append((f"key-{number}", words))
+        build = time.perf_counter() - start
+        
+        found = false_positives = 0
+        timings = []
+        for cache_key, words in originals:
+            probe = Fingerprint("text", simhash(re_export(rng, words, edits)))
+            start = time.perf_counter()
+            matches = index.find(probe, "v")
+            timings.append(time.perf_counter() - start)
+            found += any(match.cache_key == cache_key for match in matches)
+            unrelated = Fingerprint("text", simhash(report_words(rng)))
+            false_positives += bool(index.find(unrelated, "v"))
+        
+        timings.sort()
+        print(f"reports={reports:<6} edits={edits} build={build:.1f}s "
+              f"lookup_p50={timings[len(timings) // 2] * 1000:.2f}ms "
+              f"lookup_p95={timings[int(len(timings) * 0.95)] * 1000:.2f}ms "
+              f"recall={found / len(originals):.0%} false_positives={false_positives / len(originals):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--edits", type=int, default=3, help="Words changed in each re-export")
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--max-distance", type=int, default=7)
+    args = parser.parse_args()
+    
+    for reports in args.reports:
+        run(reports, args.edits, args.lookups, args.max_distance)
+
+
+if __name__ == "__main__":
+    main()
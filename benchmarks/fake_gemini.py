@@ -0,0 +1,242 @@
+"""Stand-ins for GeminiClient and the SDK clients that simulate latency without network calls."""
+import random
+import threading
+import time
+
+
+class FakeGeminiClient:
+    """Yields canned Trendspot text, sleeping to mimic first-token and streaming latency."""
+    
+    model_key = "fake"
+    
+    def __init__(self, first_chunk_latency=1.0, chunk_latency=0.05, chunks=20,
+                 failure_rate=0.0, seed=None, finish_reason="STOP"):
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.failure_rate = failure_rate
+        # Reported in `metadata` as the real client does; "MAX_TOKENS" mimics a truncated response
+        self.finish_reason = finish_reason
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def _should_fail(self):
+        with self._lock:
+            return self._random.random() < self.failure_rate
+    
+    def process_pdf(self, document, system_instructions, structured=False, metadata=None):
+        """Mimic GeminiClient.process_pdf."""
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.first_chunk_latency)
+            for index in range(self.chunks):
+                if self._should_fail():
+                    raise RuntimeError("simulated 429 RESOURCE_EXHAUSTED")
+                if index:
+                    time.sleep(self.chunk_latency)
+                yield f"Quadro {index}: Trendspot do dia {document.size}\n"
+            if metadata is not None:
+                metadata["finish_reason"] = self.finish_reason
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class _FakeChunk:
+    """Minimal stand-in for a streamed GenerateContentResponse."""
+    
+    def __init__(self, text, finish_reason=None):
+        part = type("Part", (), {"text": text})()
+        content = type("Content", (), {"parts": [part]})()
+        self.candidates = [type("Candidate", (), {"content": content, "finish_reason": finish_reason})()]
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, server):
+        self._server = server
+    
+    def generate_content_stream(self, model, contents, config):
+        time.sleep(self._server.first_chunk_latency)
+        for index in range(self._server.chunks):
+            if index:
+                time.sleep(self._server.chunk_latency)
+            yield _FakeChunk(f"Quadro {index}\n")
+
+
+class _FakeAsyncModels:
+    def __init__(self, server):
+        self._server = server
+    
+    async def generate_content_stream(self, model, contents, config):
+        import asyncio
+        
+        await asyncio.sleep(self._server.first_chunk_latency)
+        for index in range(self._server.chunks):
+            if index:
+                await asyncio.sleep(self._server.chunk_latency)
+            yield _FakeChunk(f"Quadro {index}\n")
+
+
+class FakeGenaiClient:
+    """Local fake of the genai.Client streaming surface, sync (`models`) and async (`aio.models`).
+    
+    Pass it to GeminiClient(..., client=FakeGenaiClient()) to exercise the real request
+    building and chunk filtering without network access.
+    """
+    
+    def __init__(self, first_chunk_latency=1.0, chunk_latency=0.05, chunks=20):
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_latency = chunk_latency
+        self.chunks = chunks
+        self.models = _FakeModels(self)
+        self.aio = type("Aio", (), {})()
+        self.aio.models = _FakeAsyncModels(self)
+
+
+class FakeApiError(Exception):
+    """Mimics the SDK's API errors, which carry the HTTP status in `code`."""
+    
+    def __init__(self, code, status):
+        super().__init__(f"{code} {status}")
+        self.code = code
+
+
+class FakeQuotaService:
+    """Streaming endpoint that enforces a requests-per-minute quota like Vertex AI.
+    
+    Calls over the quota fail at once with 429; with `drop_rate`, accepted streams
+    sometimes break midway with 503. `stream(emitted)` continues after the chunks
+    already received, like a resumed request.
+    """
+    
+    def __init__(self, requests_per_minute, latency=0.5, chunks=10, chunk_latency=0.02,
+                 burst=5, drop_rate=0.0, seed=None):
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+    
+    def _admit(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.rejected += 1
+                raise FakeApiError(429, "RESOURCE_EXHAUSTED")
+            self._tokens -= 1
+            self.accepted += 1
+            return self._random.random() < self.drop_rate
+    
+    def stream(self, emitted=""):
+        drop = self._admit()
+        time.sleep(self.latency)
+        start = emitted.count("\n")
+        drop_at = self._random.randrange(start, self.chunks) if drop and start < self.chunks else None
+        for index in range(start, self.chunks):
+            if index == drop_at:
+                with self._lock:
+                    self.dropped += 1
+                raise FakeApiError(503, "UNAVAILABLE")
+            if index > start:
+                time.sleep(self.chunk_latency)
+            yield f"Quadro {index}\n"
+
+
+class _FakeBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self.name = name
+        self.content_encoding = None
+        self.metadata = None
+        self.generation = None
+    
+    def exists(self):
+        return self.name in self._bucket.objects
+    
+    def reload(self):
+        self.generation, self.metadata, _ = self._bucket.objects[self.name]
+    
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        from google.api_core.exceptions import PreconditionFailed
+        
+        with self._bucket.lock:
+            current = self._bucket.objects.get(self.name)
+            if if_generation_match is not None and (current[0] if current else 0) != if_generation_match:
+                raise PreconditionFailed(f"{self.name} changed")
+            self.generation = (current[0] if current else 0) + 1
+            self._bucket.objects[self.name] = (self.generation, self.metadata, data)
+    
+    def upload_from_file(self, stream, size=None, content_type=None, **kwargs):
+        self.upload_from_string(stream.read(), content_type=content_type)
+    
+    def delete(self, if_generation_match=None, **kwargs):
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+        
+        with self._bucket.lock:
+            current = self._bucket.objects.get(self.name)
+            if current is None:
+                raise NotFound(f"{self.name} not found")
+            if if_generation_match is not None and current[0] != if_generation_match:
+                raise PreconditionFailed(f"{self.name} changed")
+            del self._bucket.objects[self.name]
+    
+    def download_as_bytes(self, **kwargs):
+        time.sleep(self._bucket.latency)
+        if self.name not in self._bucket.objects:
+            from google.api_core.exceptions import NotFound
+            
+            raise NotFound(f"{self.name} not found")
+        return self._bucket.objects[self.name][2]
+
+
+class _FakeBucket:
+    def __init__(self, name, latency=0.0):
+        self.name = name
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.latency = latency
+    
+    def exists(self):
+        return True
+    
+    def blob(self, name):
+        return _FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """In-memory stand-in for storage.Client with generation preconditions, for offline app runs."""
+    
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, name):
+        with self._lock:
+            return self._buckets.setdefault(name, _FakeBucket(name, self.latency))
+    
+    def list_blobs(self, bucket_name, prefix=""):
+        bucket = self.bucket(bucket_name)
+        with bucket.lock:
+            names = sorted(name for name in bucket.objects if name.startswith(prefix))
+        for name in names:
+            blob = bucket.blob(name)
+            blob.reload()
+            yield blob
@@ -0,0 +1,82 @@
+"""Request payload, input tokens and latency: full-PDF requests vs the hybrid text-layer mode.
+
+Offline, each PDF's request is built both ways and compared by payload size and
+estimated input tokens (Gemini bills a PDF page or an image as 258 tokens; text
+is estimated at 4 characters per token). With --live, both requests are sent to
+Gemini and the billed prompt tokens, time to first chunk and total time are
+reported instead of estimates.
+
+Run from the repository root:
+    python -m benchmarks.hybrid_payload entrada/*.pdf
+    python -m benchmarks.hybrid_payload entrada/*.pdf --live --runs 3
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from pdf2train import SYSTEM_INSTRUCTIONS, GeminiClient
+from pdf2train.cli import collect_documents
+from pdf2train.layout import extract_layout
+
+TOKENS_PER_PAGE = 258
+
+
+def offline(name, document):
+    from pypdf import PdfReader
+    
+    pages = len(PdfReader(document.open()).pages)
+    start = time.perf_counter()
+    layout = extract_layout(document)
+    elapsed = time.perf_counter() - start
+    pdf_tokens = pages * TOKENS_PER_PAGE
+    if layout is None:
+        print(f"{name}: {pages} pages, text layer too thin, hybrid falls back to the PDF "
+              f"(layout {elapsed * 1000:.0f}ms)")
+        return
+    hybrid_bytes = len(layout.text.encode("utf-8")) + sum(len(crop) for crop in layout.crops)
+    hybrid_tokens = len(layout.text) // 4 + len(layout.crops) * TOKENS_PER_PAGE
+    print(f"{name}: {pages} pages, layout {elapsed * 1000:.0f}ms | "
+          f"pdf {document.size / 1024:.0f}KB ~{pdf_tokens} tokens | "
+          f"hybrid {hybrid_bytes / 1024:.0f}KB ({len(layout.crops)} crops) ~{hybrid_tokens} tokens "
+          f"({hybrid_tokens / pdf_tokens:.0%})")
+
+
+def live(name, document, runs):
+    from pdf2train.gemini import build_gemini_client
+    
+    client = build_gemini_client()
+    for mode in ("pdf", "hybrid"):
+        gemini = GeminiClient(None, None, client=client, extraction_mode=mode)
+        for run in range(runs):
+            metadata = {}
+            start = time.perf_counter()
+            first_chunk = None
+            for _ in gemini.process_pdf(document, SYSTEM_INSTRUCTIONS, metadata=metadata):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+            total = time.perf_counter() - start
+            tokens = metadata.get("tokens", {})
+            print(f"{name} {mode:<6} run={run} prompt_tokens={tokens.get('prompt_tokens')} "
+                  f"output_tokens={tokens.get('output_tokens')} first_chunk={first_chunk or total:.2f}s "
+                  f"total={total:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="PDF files, globs or directories")
+    parser.add_argument("--live", action="store_true", help="Send both requests to Gemini (needs credentials)")
+    parser.add_argument("--runs", type=int, default=1, help="Live requests per mode and file")
+    args = parser.parse_args()
+    
+    documents = collect_documents(args.inputs)
+    for name, document in documents:
+        offline(name, document)
+        if args.live:
+            live(name, document, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Durable job queue throughput and crash recovery against FakeGeminiClient.
+
+Each run uses a fresh SQLite store and real worker processes. With --crash, one
+worker is killed mid-stream; its job must be picked up again once the lease
+expires, and every job must still finish.
+
+Run from the repository root:
+    python -m benchmarks.job_queue_throughput --jobs 24 --workers 1 2 4
+    python -m benchmarks.job_queue_throughput --workers 2 --crash
+"""
+import argparse
+import functools
+import os
+import tempfile
+import time
+
+# Keep worker spans off stderr and out of the host's real metrics
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from pdf2train import ExtractionCache, JobStore, PdfDocument, SYSTEM_INSTRUCTIONS, WorkerPool
+from benchmarks.fake_gemini import FakeGeminiClient
+
+
+def run(jobs, workers, latency, crash, lease):
+    with tempfile.TemporaryDirectory() as jobs_dir:
+        db_path = os.path.join(jobs_dir, "jobs.sqlite3")
+        store = JobStore(db_path, lease_seconds=lease)
+        job_ids = []
+        for index in range(jobs):
+            document = PdfDocument(os.urandom(2048))
+            job = store.submit(f"doc_{index}.pdf", document,
+                               ExtractionCache.make_key(document.data, "fake", SYSTEM_INSTRUCTIONS))
+            job_ids.append(job.id)
+        
+        factory = functools.partial(FakeGeminiClient, first_chunk_latency=latency)
+        pool = WorkerPool(workers=workers, db_path=db_path, gemini_factory=factory, use_cache=False,
+                          lease_seconds=lease)
+        start = time.monotonic()
+        pool.ensure_running()
+        crashed = False
+        try:
+            while True:
+                stats = store.stats()
+                if stats.get("done", 0) + stats.get("failed", 0) == jobs:
+                    break
+                if crash and not crashed and stats.get("running") and time.monotonic() - start > latency:
+                    pool.processes()[0].kill()
+                    crashed = True
+                pool.ensure_running()
+                time.sleep(0.05)
+        finally:
+            elapsed = time.monotonic() - start
+            pool.stop()
+        
+        retried = sum(1 for job_id in job_ids if store.get(job_id).attempts > 1)
+        print(f"workers={workers:<3} jobs={jobs} done={stats.get('done', 0)} failed={stats.get('failed', 0)} "
+              f"retried={retried} restarts={pool.restarts} elapsed={elapsed:.2f}s "
+              f"throughput={jobs / elapsed:.2f} jobs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--crash", action="store_true", help="Kill one worker mid-stream")
+    parser.add_argument("--lease", type=float, default=3.0, help="Lease seconds, i.e. crash detection delay")
+    args = parser.parse_args()
+    
+    for workers in args.workers:
+        run(args.jobs, workers, args.latency, args.crash, args.lease)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Peak RSS while preparing one upload for Gemini: legacy base64 path vs PdfDocument.
+
+Each variant runs in its own subprocess because ru_maxrss only ever grows.
+
+Run from the repository root:
+    python -m benchmarks.memory_per_upload --size-mb 20
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def run_variant(variant, size_mb, as_json=False):
+    from google.genai import types
+    
+    from pdf2train import SYSTEM_INSTRUCTIONS, GeminiClient, PdfDocument
+    from benchmarks.fake_gemini import FakeGenaiClient
+    
+    # Stand-in for Streamlit's UploadedFile, which is a BytesIO subclass
+    upload = io.BytesIO(b"%PDF-1.4\n" + os.urandom(size_mb * 1024 * 1024))
+    client = GeminiClient(None, None, client=FakeGenaiClient())
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    
+    if variant == "before":
+        base64_pdf = base64.b64encode(upload.read()).decode("utf-8")
+        part = types.Part.from_bytes(data=base64.b64decode(base64_pdf), mime_type="application/pdf")
+        upload.seek(0)
+        thumbnail_copy = upload.getvalue()
+        # What the variant prepared stays alive until peak RSS is sampled
+        prepared = (part, thumbnail_copy)
+    else:
+        document = PdfDocument.from_upload(upload)
+        contents, _ = client.build_request(document, SYSTEM_INSTRUCTIONS)
+        with document.as_file():
+            pass
+        prepared = contents
+    
+    elapsed = time.perf_counter() - start
+    peak_rss_delta = peak_rss_mb() - baseline
+    del prepared
+    if as_json:
+        print(json.dumps({"variant": variant, "size_mb": size_mb, "peak_rss_delta_mb": round(peak_rss_delta, 1),
+                          "prepare_ms": round(elapsed * 1000, 1)}))
+        return
+    print(f"{variant:<7} upload={size_mb}MB peak_rss_delta={peak_rss_delta:.1f}MB "
+          f"prepare={elapsed * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--variant", choices=["before", "after"])
+    parser.add_argument("--json", action="store_true", help="Print the variant's result as one JSON line")
+    args = parser.parse_args()
+    
+    if args.variant:
+        run_variant(args.variant, args.size_mb, args.json)
+        return
+    
+    for variant in ("before", "after"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory_per_upload", "--variant", variant, "--size-mb", str(args.size_mb)],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
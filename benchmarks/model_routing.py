@@ -0,0 +1,159 @@
+"""Latency, cost and escalation rate of model routing, offline against simulated models.
+
+A stand-in genai client answers each model with its own latency and quality:
+the fast model is quick and cheap but returns a broken report (one quadro, no
+type) for `--fast-failure-rate` of the documents, the default and strong models
+always answer well, the strong one slowest. Documents are blank-page PDFs with
+a spread of page counts, so the router sees what it would see in production.
+Costs use MODEL_PRICES, with 258 prompt tokens per page.
+
+Every routing mode extracts the same documents:
+    off          everything on MODEL_NAME
+    size         fast / default / strong by page count and size
+    speculative  the fast model first, escalating one tier when its report fails the check
+
+Run from the repository root:
+    python -m benchmarks.model_routing --documents 200
+    python -m benchmarks.model_routing --fast-failure-rate 0.4 --workers 16
+"""
+import argparse
+import io
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from benchmarks.report_index import report_text
+from pdf2train import SYSTEM_INSTRUCTIONS, GeminiClient, PdfDocument
+from pdf2train.config import MODEL_FAST, MODEL_NAME, MODEL_STRONG
+from pdf2train.context_cache import ContextCache
+from pdf2train.quota import build_quota_guard
+from pdf2train.routing import ModelRouter
+
+TOKENS_PER_PAGE = 258
+
+
+class _Chunk:
+    def __init__(self, text, finish_reason=None, usage=None):
+        part = type("Part", (), {"text": text})()
+        content = type("Content", (), {"parts": [part]})()
+        self.candidates = [type("Candidate", (), {"content": content, "finish_reason": finish_reason})()]
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _RoutedModels:
+    def __init__(self, client):
+        self._client = client
+    
+    def generate_content_stream(self, model, contents, config):
+        first_chunk_latency, seconds_per_kchar, failure_rate = self._client.profiles[model]
+        # The benchmark's document part is "pdf:<pages>:<seed>" text instead of the PDF itself
+        _, pages, seed = contents[0].parts[0].text.split(":")
+        pages, seed = int(pages), int(seed)
+        rng = random.Random(f"{model}:{seed}")
+        text = report_text(rng, seed)
+        if rng.random() < failure_rate:
+            # What a weaker model gets wrong: most quadros missing and no type on the rest
+            text = "\n".join(line for line in text.splitlines()[:8] if not line.startswith("Tipo"))
+        time.sleep(first_chunk_latency)
+        pieces = [text[start:start + 400] for start in range(0, len(text), 400)]
+        for index, piece in enumerate(pieces):
+            time.sleep(seconds_per_kchar * len(piece) / 1000)
+            usage = None
+            if index == len(pieces) - 1:
+                usage = type("Usage", (), {
+                    "prompt_token_count": pages * TOKENS_PER_PAGE + len(SYSTEM_INSTRUCTIONS) // 4,
+                    "candidates_token_count": len(text) // 4,
+                    "cached_content_token_count": 0,
+                })()
+            yield _Chunk(piece, "STOP" if usage else None, usage)
+
+
+class RoutedGenaiClient:
+    """genai client stand-in whose models differ in latency and in how often their report is broken."""
+    
+    def __init__(self, fast_failure_rate, speed=1.0):
+        self.profiles = {
+            # (first chunk seconds, seconds per 1000 output characters, share of broken reports)
+            MODEL_FAST: (0.3 / speed, 0.01 / speed, fast_failure_rate),
+            MODEL_NAME: (0.8 / speed, 0.02 / speed, 0.0),
+            MODEL_STRONG: (2.0 / speed, 0.05 / speed, 0.0),
+        }
+        self.models = _RoutedModels(self)
+
+
+class BenchmarkPdf(PdfDocument):
+    """Blank-page PDF that remembers its page count and seed, so the fake can answer it."""
+    
+    def __init__(self, pages, seed):
+        from pypdf import PdfWriter
+        
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=595, height=842)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        super().__init__(buffer.getbuffer())
+        self.pages = pages
+        self.seed = seed
+
+
+def run_mode(mode, documents, args):
+    client = RoutedGenaiClient(args.fast_failure_rate, args.speed)
+    router = ModelRouter(mode=mode)
+    gemini = GeminiClient(
+        None, None, client=client, context_cache=ContextCache(None, ttl=0), router=router,
+        quota_guard=build_quota_guard(requests_per_minute=0, max_concurrency=64, state_path=None),
+    )
+    
+    def document_part(document):
+        from google.genai import types
+        
+        return types.Part.from_text(f"pdf:{document.pages}:{document.seed}")
+    
+    gemini.document_part = document_part
+    
+    def extract(document):
+        metadata = {}
+        start = time.perf_counter()
+        "".join(gemini.process_pdf(document, SYSTEM_INSTRUCTIONS, metadata=metadata))
+        return time.perf_counter() - start, metadata.get("cost_usd", 0.0)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(extract, documents))
+    elapsed = time.perf_counter() - start
+    timings = sorted(seconds for seconds, _ in results)
+    cost = sum(cost for _, cost in results)
+    print(f"{mode:<12} {len(documents)} PDFs in {elapsed:.1f}s | per PDF p50={timings[len(timings) // 2]:.2f}s "
+          f"p95={timings[int(len(timings) * 0.95)]:.2f}s | cost US$ {cost:.4f} "
+          f"(US$ {cost / len(documents) * 1000:.2f} per 1000)")
+    for route, stats in sorted(router.stats().items()):
+        print(f"    {route:<20} requests={stats['requests']:<4} mean={stats['mean_seconds']:.2f}s "
+              f"cost=US$ {stats['cost_usd']:.4f} escalation_rate={stats['escalation_rate']:.0%} "
+              f"failed={stats['failed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--fast-failure-rate", type=float, default=0.2,
+                        help="Share of reports the fast model gets wrong")
+    parser.add_argument("--speed", type=float, default=10.0, help="Simulated latencies are divided by this")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent extractions")
+    parser.add_argument("--modes", nargs="+", default=["off", "size", "speculative"])
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    # Mostly short reports, some mid-sized and a few long ones
+    documents = [BenchmarkPdf(rng.choice([1, 2, 3, 4, 4, 6, 8, 12, 16, 24]), seed) for seed in range(args.documents)]
+    for mode in args.modes:
+        run_mode(mode, documents, args)
+
+
+if __name__ == "__main__":
+    main()
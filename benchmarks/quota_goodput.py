@@ -0,0 +1,80 @@
+"""Goodput under a simulated Vertex AI quota, with and without the quota guard.
+
+Many client threads call a FakeQuotaService for a fixed time. "naive" makes one
+attempt per request, as GeminiClient did before the guard; "guarded" runs every
+call through QuotaGuard. The client-side bucket is deliberately configured above
+the real quota, so the AIMD limit and retries have to absorb the 429s.
+
+Run from the repository root:
+    python -m benchmarks.quota_goodput --quota 300 --clients 32 --duration 20
+"""
+import argparse
+import threading
+import time
+
+from pdf2train.quota import AdaptiveConcurrency, CircuitBreaker, QuotaGuard, TokenBucket
+from benchmarks.fake_gemini import FakeQuotaService
+
+
+def run(mode, quota, client_rpm, clients, duration, drop_rate, latency):
+    service = FakeQuotaService(quota, latency=latency, drop_rate=drop_rate, seed=0)
+    guard = QuotaGuard(
+        TokenBucket(client_rpm, burst=5),
+        AdaptiveConcurrency(clients),
+        CircuitBreaker(failure_threshold=50, reset_timeout=5),
+        max_retries=10, retry_base=0.25, retry_max=5,
+    )
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    
+    def client():
+        while time.monotonic() < stop_at:
+            try:
+                if mode == "guarded":
+                    text = "".join(guard.stream(service.stream))
+                else:
+                    text = "".join(service.stream())
+                outcome = "ok" if text.count("\n") == service.chunks else "failed"
+            except Exception:
+                outcome = "failed"
+                if mode == "naive":
+                    # A user retrying by hand: pause before the next request
+                    time.sleep(latency)
+            with lock:
+                counts[outcome] += 1
+    
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    
+    goodput = counts["ok"] / elapsed * 60
+    stats = guard.stats() if mode == "guarded" else {}
+    print(f"{mode:<8} ok={counts['ok']:<5} failed={counts['failed']:<5} 429s={service.rejected:<5} "
+          f"drops={service.dropped:<4} goodput={goodput:.0f}/min ({goodput / quota:.0%} of quota)"
+          + (f" retries={stats['retries']} resumed={stats['resumed']} "
+             f"concurrency_limit={stats['concurrency_limit']}" if stats else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quota", type=float, default=300, help="Service quota, requests per minute")
+    parser.add_argument("--client-rpm", type=float, default=None,
+                        help="Client-side bucket rate (default: 1.5x the quota)")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--drop-rate", type=float, default=0.05, help="Share of streams cut with 503")
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    
+    client_rpm = args.client_rpm if args.client_rpm is not None else args.quota * 1.5
+    for mode in ("naive", "guarded"):
+        run(mode, args.quota, client_rpm, args.clients, args.duration, args.drop_rate, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Record real Gemini streams once, then replay them offline with their original timing.
+
+A cassette is a JSON-lines file with one recorded stream per line:
+    {"key": "...", "model": "...", "chunks": [{"at": 1.84, "text": "...", "finish_reason": null,
+                                               "usage": {"prompt_tokens": 1290, "output_tokens": 3}}]}
+`at` is the offset in seconds from the request to the chunk. The key hashes
+the model, the request contents (PDF bytes by digest) and the system
+instructions, so a replay answers the same request the same way.
+
+Record (needs Vertex AI credentials):
+    python -m benchmarks.replay record entrada/*.pdf --out benchmarks/cassettes/trendspot.jsonl
+    python -m benchmarks.replay record entrada/*.pdf --out benchmarks/cassettes/trendspot.jsonl --structured
+
+Replay:
+    GeminiClient(None, None, client=ReplayGenaiClient("benchmarks/cassettes/trendspot.jsonl"))
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+SYNTHETIC_CASSETTE = os.path.join(os.path.dirname(__file__), "cassettes", "synthetic.jsonl")
+
+
+def _part_fingerprint(part):
+    inline_data = getattr(part, "inline_data", None)
+    if inline_data is not None and inline_data.data:
+        return "inline:" + hashlib.sha256(inline_data.data).hexdigest()
+    file_data = getattr(part, "file_data", None)
+    if file_data is not None and file_data.file_uri:
+        return "file:" + file_data.file_uri
+    return "text:" + (getattr(part, "text", None) or "")
+
+
+def request_key(model, contents, config):
+    """Stable key of a generate_content_stream request."""
+    fingerprint = {
+        "model": model,
+        "contents": [
+            [content.role] + [_part_fingerprint(part) for part in content.parts] for content in contents
+        ],
+        "system_instruction": [_part_fingerprint(part) for part in (config.system_instruction or [])],
+        "response_mime_type": getattr(config, "response_mime_type", None),
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded streams, loaded from and appended to a JSON-lines file."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self._by_key = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    if line.strip():
+                        self._index(json.loads(line))
+    
+    def _index(self, entry):
+        self.entries.append(entry)
+        self._by_key.setdefault(entry["key"], []).append(entry)
+    
+    def get(self, key):
+        entries = self._by_key.get(key)
+        return entries[-1] if entries else None
+    
+    def append(self, entry):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as cassette_file:
+                cassette_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index(entry)
+
+
+def _chunk_record(chunk, start):
+    candidate = chunk.candidates[0] if chunk.candidates else None
+    finish_reason = getattr(candidate, "finish_reason", None) if candidate is not None else None
+    usage = getattr(chunk, "usage_metadata", None)
+    has_text = bool(candidate is not None and candidate.content and candidate.content.parts)
+    return {
+        "at": round(time.perf_counter() - start, 4),
+        "text": chunk.text if has_text else None,
+        "finish_reason": getattr(finish_reason, "value", finish_reason),
+        "usage": {
+            "prompt_tokens": usage.prompt_token_count or 0,
+            "output_tokens": usage.candidates_token_count or 0,
+            "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+        } if usage is not None else None,
+    }
+
+
+class _RecordingModels:
+    def __init__(self, models, cassette):
+        self._models = models
+        self._cassette = cassette
+    
+    def generate_content_stream(self, model, contents, config):
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            chunks.append(_chunk_record(chunk, start))
+            yield chunk
+        # Only complete streams are recorded; a failed call leaves nothing behind
+        self._cassette.append({"key": request_key(model, contents, config), "model": model, "chunks": chunks})
+
+
+class RecordingGenaiClient:
+    """Wrap a real genai.Client, writing every completed stream to a cassette."""
+    
+    def __init__(self, client, path):
+        self.cassette = Cassette(path)
+        self.models = _RecordingModels(client.models, self.cassette)
+
+
+class _ReplayChunk:
+    """Stand-in for a streamed GenerateContentResponse rebuilt from a recording."""
+    
+    def __init__(self, record):
+        text = record["text"]
+        parts = [type("Part", (), {"text": text})()] if text is not None else []
+        content = type("Content", (), {"parts": parts})()
+        self.candidates = [type("Candidate", (), {"content": content, "finish_reason": record["finish_reason"]})()]
+        self.text = text
+        usage = record.get("usage")
+        self.usage_metadata = type("Usage", (), {
+            "prompt_token_count": usage["prompt_tokens"],
+            "candidates_token_count": usage["output_tokens"],
+            "cached_content_token_count": usage.get("cached_tokens", 0),
+        })() if usage else None
+
+
+class _ReplayModels:
+    def __init__(self, replay):
+        self._replay = replay
+    
+    def generate_content_stream(self, model, contents, config):
+        entry = self._replay.entry_for(model, contents, config)
+        start = time.perf_counter()
+        for record in entry["chunks"]:
+            delay = self._replay.offset(record) - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            yield _ReplayChunk(record)
+
+
+class _ReplayAsyncModels:
+    def __init__(self, replay):
+        self._replay = replay
+    
+    async def generate_content_stream(self, model, contents, config):
+        entry = self._replay.entry_for(model, contents, config)
+        start = time.perf_counter()
+        for record in entry["chunks"]:
+            delay = self._replay.offset(record) - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield _ReplayChunk(record)
+
+
+class ReplayGenaiClient:
+    """
+    Offline genai.Client that answers from a cassette.
+    
+    Args:
+        path (str): Cassette to replay
+        speed (float): Time scale; 2.0 replays twice as fast, 0 without any delay
+        match (str): "exact" answers only recorded requests (KeyError otherwise);
+            "any" cycles through every recording, for synthetic benchmark PDFs
+    """
+    
+    def __init__(self, path=SYNTHETIC_CASSETTE, speed=1.0, match="exact"):
+        self.cassette = Cassette(path)
+        if not self.cassette.entries:
+            raise ValueError(f"cassette {path} has no recordings")
+        self.speed = speed
+        self.match = match
+        self._cycle = itertools.cycle(self.cassette.entries)
+        self._lock = threading.Lock()
+        self.last_entry = None
+        # Sum of the served streams' durations, the no-overhead lower bound for benchmarks
+        self.replayed_seconds = 0.0
+        self.models = _ReplayModels(self)
+        self.aio = type("Aio", (), {})()
+        self.aio.models = _ReplayAsyncModels(self)
+    
+    def entry_for(self, model, contents, config):
+        if self.match == "any":
+            with self._lock:
+                entry = next(self._cycle)
+        else:
+            key = request_key(model, contents, config)
+            entry = self.cassette.get(key)
+            if entry is None:
+                raise KeyError(f"no recording for request {key[:12]} in {self.cassette.path}")
+        with self._lock:
+            self.last_entry = entry
+            self.replayed_seconds += self.recorded_duration(entry)
+        return entry
+    
+    def offset(self, record):
+        return record["at"] / self.speed if self.speed else 0.0
+    
+    def recorded_duration(self, entry):
+        """Seconds the recorded stream takes at the current replay speed."""
+        return self.offset(entry["chunks"][-1]) if entry["chunks"] else 0.0
+
+
+def record(args):
+    """Run real extractions through a recording client."""
+    from pdf2train import STRUCTURED_SYSTEM_INSTRUCTIONS, SYSTEM_INSTRUCTIONS, GeminiClient
+    from pdf2train.cli import collect_documents
+    from pdf2train.gemini import build_gemini_client
+    
+    documents = collect_documents(args.inputs)
+    if not documents:
+        sys.exit("Nenhum arquivo PDF encontrado.")
+    client = GeminiClient(None, None, client=RecordingGenaiClient(build_gemini_client(), args.out))
+    instructions = STRUCTURED_SYSTEM_INSTRUCTIONS if args.structured else SYSTEM_INSTRUCTIONS
+    for name, document in documents:
+        start = time.perf_counter()
+        text = "".join(client.process_pdf(document, instructions, args.structured))
+        print(f"{name}: {len(text)} chars in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record real Gemini streams into a cassette")
+    record_parser.add_argument("inputs", nargs="+", help="PDF files, globs or directories")
+    record_parser.add_argument("--out", required=True, help="Cassette to append to")
+    record_parser.add_argument("--structured", action="store_true")
+    record_parser.set_defaults(handler=record)
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
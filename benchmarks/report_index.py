@@ -0,0 +1,154 @@
+"""Report search index: build time, query latency at 100k reports, and rebuild from a bucket.
+
+Synthetic reports follow the free-text Nome/Categoria/quadros format with ten
+quadros each, spread over two years, eight categories and six quadro types.
+Every query runs against the full index; the rebuild lists and fetches reports
+from an in-memory bucket that sleeps `--fetch-latency` per download, the way a
+Cloud Storage round trip would.
+
+Run from the repository root:
+    python -m benchmarks.report_index --reports 100000
+    python -m benchmarks.report_index --reports 10000 --rebuild-reports 2000 --workers 1 16
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from benchmarks.dedup_index import VOCABULARY
+from benchmarks.fake_gemini import FakeStorageClient
+from pdf2train.search import ReportIndex
+from pdf2train.storage import StorageManager
+
+CATEGORIES = ["Beleza", "Alimentação", "Moda", "Casa e Decoração", "Tecnologia", "Bem-estar", "Viagem", "Esportes"]
+TYPES = ["Áudio", "Produto", "Hashtag", "Formato", "Comportamento", "Estética"]
+FIRST_DAY = datetime.date(2024, 10, 1)
+DAYS = 730
+
+
+def report_text(rng, number):
+    day = FIRST_DAY + datetime.timedelta(days=rng.randrange(DAYS))
+    separator = "*" * 47
+    lines = [
+        f"Nome : Trendspot do dia {day:%d/%m/%Y}",
+        f"Categoria : {rng.choice(CATEGORIES)}",
+        "Link do relatório : Insira o link aqui",
+        separator,
+    ]
+    for quadro in range(10):
+        if quadro in (0, 2):
+            lines.append("Com Potencial de Crescimento:" if quadro == 0 else "Em Destaque:")
+        lines += [
+            " ".join(rng.choice(VOCABULARY) for _ in range(6)) + f" {number}",
+            " ".join(rng.choice(VOCABULARY) for _ in range(40)),
+            f"Tipo : {rng.choice(TYPES)}",
+            "Link : Insira o link aqui",
+            separator,
+        ]
+    lines.append("Para Aproveitar Agora: " + " ".join(rng.choice(VOCABULARY) for _ in range(30)))
+    return "\n".join(lines)
+
+
+def timed(function, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return result, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def queries(index, runs):
+    last_month = FIRST_DAY + datetime.timedelta(days=DAYS - 30)
+    cases = {
+        "category": dict(category="Beleza"),
+        "category+type+month": dict(category="Beleza", quadro_type="audio", date_from=last_month),
+        "type": dict(quadro_type="Áudio"),
+        "text (common word)": dict(text="tendência"),
+        "text (two words)": dict(text="criadores sustentável"),
+        "text+category+type": dict(text="café jovens", category="alimentacao", quadro_type="Produto"),
+        "date range": dict(date_from=last_month),
+    }
+    for label, filters in cases.items():
+        result, p50, p95 = timed(lambda: index.search(**filters), runs)
+        print(f"  {label:<22} total={result.total:<7} p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+    
+    def facets():
+        index._facets = None
+        return index.facets()
+    
+    _, p50, p95 = timed(facets, runs)
+    print(f"  {'facets (uncached)':<22} p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+
+
+def build(reports, runs):
+    rng = random.Random(reports)
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = ReportIndex(os.path.join(index_dir, "reports.sqlite3"))
+        start = time.perf_counter()
+        batch = []
+        for number in range(reports):
+            batch.append(("bucket", f"trendspot/report-{number}.txt", report_text(rng, number), None))
+            if len(batch) == 1000:
+                index.add_many(batch)
+                batch = []
+        index.add_many(batch)
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+        print(f"reports={reports} build={elapsed:.1f}s ({reports / elapsed:.0f}/s) index={size / 1024 ** 2:.0f}MB")
+        
+        # What every save pays: one report indexed in its own transaction
+        _, p50, p95 = timed(
+            lambda: index.add("bucket", "trendspot/saved.txt", report_text(rng, reports)), runs
+        )
+        print(f"  {'add on save':<22} p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms")
+        queries(index, runs)
+
+
+def rebuild(reports, workers, fetch_latency):
+    rng = random.Random(reports)
+    client = FakeStorageClient(latency=fetch_latency)
+    bucket = client.bucket("bucket")
+    for number in range(reports):
+        data = report_text(rng, number).encode("utf-8")
+        bucket.objects[f"trendspot/report-{number}.txt"] = (
+            1, {"sha256": hashlib.sha256(data).hexdigest()}, gzip.compress(data, mtime=0)
+        )
+    storage_manager = StorageManager(None, storage_client=client)
+    for max_workers in workers:
+        with tempfile.TemporaryDirectory() as index_dir:
+            index = ReportIndex(os.path.join(index_dir, "reports.sqlite3"))
+            start = time.perf_counter()
+            counts = index.rebuild(storage_manager, "bucket", "trendspot/", max_workers=max_workers)
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            again = index.rebuild(storage_manager, "bucket", "trendspot/", max_workers=max_workers)
+            print(f"rebuild reports={reports} workers={max_workers:<3} {elapsed:.1f}s {counts} | "
+                  f"second run {time.perf_counter() - start:.2f}s unchanged={again['unchanged']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, nargs="+", default=[100000])
+    parser.add_argument("--runs", type=int, default=20, help="Repetitions of each query")
+    parser.add_argument("--rebuild-reports", type=int, default=2000, help="Reports in the bucket (0 = skip)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 16], help="Rebuild download workers")
+    parser.add_argument("--fetch-latency", type=float, default=0.02, help="Seconds per simulated download")
+    args = parser.parse_args()
+    
+    for reports in args.reports:
+        build(reports, args.runs)
+    if args.rebuild_reports:
+        rebuild(args.rebuild_reports, args.workers, args.fetch_latency)
+
+
+if __name__ == "__main__":
+    main()
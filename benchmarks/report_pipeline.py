@@ -0,0 +1,192 @@
+"""Post-processing of streamed free-text reports: join-then-parse per sink vs the streaming report pipeline.
+
+Each synthetic report arrives as Gemini-sized chunks and is saved to an
+in-memory bucket, recorded in a fresh search index and written as one JSONL
+line per quadro.
+
+"before" is the flow without the pipeline: the chunks are joined, the raw text
+is uploaded and indexed (the index parses it), and the JSONL export parses it
+again. "after" feeds every chunk to a ReportPipeline as it arrives and fans the
+normalized report out to a StorageSink, an IndexSink and a JsonlSink.
+
+Both are timed per report, with the sinks and without them (post-processing
+only: the two parses before, the pipeline's stages after). Peak traced memory
+is measured on one long report (`--long-quadros` quadros) while it streams in
+and is saved. Both variants end
+up holding the whole report to upload it, so the pipeline is also measured
+chunk by chunk: the most memory a single chunk needs on top of what is
+already held, which should not grow with the report.
+
+Run from the repository root:
+    python -m benchmarks.report_pipeline --reports 2000
+    python -m benchmarks.report_pipeline --reports 500 --long-quadros 5000 --chunk-chars 80
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from benchmarks.dedup_index import VOCABULARY
+from benchmarks.fake_gemini import FakeStorageClient
+from benchmarks.report_index import CATEGORIES, DAYS, FIRST_DAY, TYPES
+from pdf2train.naming import ReportNameGenerator
+from pdf2train.pipeline import IndexSink, JsonlSink, ReportPipeline, StorageSink
+from pdf2train.search import ReportIndex, parse_report
+from pdf2train.storage import StorageManager
+
+BUCKET = "pdf2train-bench"
+MONTHS = ["janeiro", "fevereiro", "março", "abril", "maio", "junho",
+          "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+
+
+def report_text(rng, number, quadros):
+    day = FIRST_DAY + datetime.timedelta(days=rng.randrange(DAYS))
+    separator = "*" * 47
+    # Dates the way the model writes them, some of them in markdown bold despite the instructions
+    written_date = rng.choice([f"{day:%d/%m/%Y}", f"{day.day} de {MONTHS[day.month - 1]} de {day.year}"])
+    lines = [
+        rng.choice(["Nome : Trendspot do dia {}", "**Nome : Trendspot do dia {}**"]).format(written_date),
+        f"Categoria : {rng.choice(CATEGORIES)}",
+        "Link do relatório : Insira o link aqui",
+        separator,
+    ]
+    for quadro in range(quadros):
+        if quadro in (0, 2):
+            lines.append("Com Potencial de Crescimento:" if quadro == 0 else "Em Destaque:")
+        lines += [
+            " ".join(rng.choice(VOCABULARY) for _ in range(6)) + f" {number}",
+            " ".join(rng.choice(VOCABULARY) for _ in range(40)),
+            f"Tipo : {rng.choice(TYPES)}",
+            "Link : Insira o link aqui",
+            separator,
+        ]
+    lines.append("Para Aproveitar Agora: " + " ".join(rng.choice(VOCABULARY) for _ in range(30)))
+    return "\n".join(lines)
+
+
+def stream(text, chunk_chars):
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars]
+
+
+class Before:
+    """Join the chunks, upload and index the raw text, then parse it again for the JSONL export."""
+    
+    def __init__(self, directory, sinks=True):
+        self.sinks = sinks
+        self.storage_manager = StorageManager(
+            None, storage_client=FakeStorageClient(), report_index=ReportIndex(os.path.join(directory, "before.db"))
+        )
+        self.jsonl_path = os.path.join(directory, "before.jsonl")
+    
+    def handle(self, chunks):
+        response = "".join(chunks)
+        name = ReportNameGenerator.suggest_name(response)
+        if not self.sinks:
+            # What the index and the JSONL export each parse
+            parse_report(response)
+            parse_report(response)
+            return
+        self.storage_manager.upload_report(BUCKET, f"trendspot/{name}.txt", response)
+        report = parse_report(response)
+        with open(self.jsonl_path, "a", encoding="utf-8") as output:
+            for position, quadro in enumerate(report["quadros"]):
+                output.write(json.dumps(dict(quadro, report=name, position=position), ensure_ascii=False) + "\n")
+
+
+class After:
+    """Stream the chunks through a ReportPipeline fanning out to storage, the index and JSONL."""
+    
+    def __init__(self, directory, sinks=True):
+        storage_manager = StorageManager(None, storage_client=FakeStorageClient())
+        self.pipeline = ReportPipeline(sinks=[
+            StorageSink(storage_manager, BUCKET),
+            IndexSink(ReportIndex(os.path.join(directory, "after.db")), BUCKET),
+            JsonlSink(os.path.join(directory, "after.jsonl")),
+        ] if sinks else [])
+    
+    def handle(self, chunks):
+        run = self.pipeline.start()
+        for chunk in chunks:
+            run.feed(chunk)
+        return run.finish()
+
+
+def throughput(variant, texts, chunk_chars):
+    for text in texts[:50]:
+        variant.handle(stream(text, chunk_chars))
+    timings = []
+    start = time.perf_counter()
+    for text in texts:
+        report_start = time.perf_counter()
+        variant.handle(stream(text, chunk_chars))
+        timings.append(time.perf_counter() - report_start)
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    return len(texts) / elapsed, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def peak_memory(variant, text, chunk_chars):
+    tracemalloc.start()
+    variant.handle(stream(text, chunk_chars))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def chunk_memory(pipeline, text, chunk_chars):
+    run = pipeline.start()
+    largest = 0
+    tracemalloc.start()
+    for chunk in stream(text, chunk_chars):
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run.feed(chunk)
+        largest = max(largest, tracemalloc.get_traced_memory()[1] - held)
+    tracemalloc.stop()
+    return largest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=2000)
+    parser.add_argument("--quadros", type=int, default=10, help="Quadros per report")
+    parser.add_argument("--long-quadros", type=int, default=2000, help="Quadros of the report whose memory is traced")
+    parser.add_argument("--chunk-chars", type=int, default=120, help="Characters per streamed chunk")
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    texts = [report_text(rng, number, args.quadros) for number in range(args.reports)]
+    long_text = report_text(rng, args.reports, args.long_quadros)
+    directory = tempfile.mkdtemp(prefix="pdf2train_pipeline_")
+    try:
+        for name, variant in (("before", Before(directory)), ("after", After(directory))):
+            rate, p50, p95 = throughput(variant, texts, args.chunk_chars)
+            peak = peak_memory(variant, long_text, args.chunk_chars)
+            print(f"{name:<7} {rate:.0f} reports/s | per report p50={p50 * 1000:.2f}ms p95={p95 * 1000:.2f}ms | "
+                  f"peak traced {peak / 1024:.0f} KiB for a {len(long_text) / 1024:.0f} KiB report")
+        for name, variant in (("before", Before(directory, sinks=False)), ("after", After(directory, sinks=False))):
+            rate, p50, _ = throughput(variant, texts, args.chunk_chars)
+            print(f"{name:<7} post-processing only: {rate:.0f} reports/s, p50={p50 * 1000:.3f}ms")
+        pipeline = After(directory).pipeline
+        for quadros in (args.quadros, args.long_quadros):
+            text = report_text(rng, args.reports, quadros)
+            print(f"after   largest per-chunk working set {chunk_memory(pipeline, text, args.chunk_chars) / 1024:.1f} KiB "
+                  f"for a {quadros}-quadro report")
+        result = pipeline.process(stream(texts[0], args.chunk_chars))
+        print(f"normalized: {result.text.splitlines()[0]!r}, link={result.report['report_link']!r}, "
+              f"problems={result.problems}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""RSS with N concurrent sessions: payloads kept in session state vs handles into the session store.
+
+Every simulated session uploads a PDF, gets a response and a batch of smaller
+responses, then reruns the page a few times: it opens the PDF, hashes it for the
+extraction cache key and reads the response back, the way app_v2.py does on
+each rerun. "before" keeps the upload, the response and the batch results in
+the session's state dict; "after" keeps Payload handles and reads through a
+SessionStore. Sessions run on a thread pool and none of them ever ends, like
+analysts leaving tabs open.
+
+Streamlit's file uploader holds its own copy of a file while the widget shows
+it; that copy is the same in both variants and is not modelled, so the upload
+is released as soon as the session has stored it.
+
+Each variant runs in its own subprocess because ru_maxrss only ever grows.
+
+Run from the repository root:
+    python -m benchmarks.session_memory --sessions 200 --pdf-mb 5
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+
+from benchmarks.dedup_index import VOCABULARY
+
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def response_text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def run_variant(variant, args):
+    from pdf2train import BatchResult, PdfDocument
+    from pdf2train.session import SessionStore
+    
+    store_dir = tempfile.mkdtemp(prefix="pdf2train_sessions_")
+    store = SessionStore(store_dir)
+    sessions = [{} for _ in range(args.sessions)]
+    baseline = rss_mb()
+    
+    def upload(number):
+        rng = random.Random(number)
+        state = sessions[number]
+        # Stand-in for Streamlit's UploadedFile, which is a BytesIO subclass
+        uploaded_file = io.BytesIO(b"%PDF-1.4\n" + rng.randbytes(args.pdf_mb * 1024 * 1024))
+        response = response_text(rng, args.response_words)
+        batch = [
+            BatchResult(f"lote-{index}.pdf", response_text(rng, args.response_words // 4), 1, 1.0)
+            for index in range(args.batch)
+        ]
+        if variant == "before":
+            state.update(uploaded_file=uploaded_file, response=response, batch_results=batch)
+            return
+        state["session_id"] = session_id = store.new_session()
+        state["uploaded_file"] = store.put(session_id, uploaded_file.getbuffer(), "pdf", name="upload.pdf")
+        state["response"] = store.put(session_id, response, "text")
+        state["batch_results"] = [
+            BatchResult(result.name, store.put(session_id, result.response, "text"), 1, 1.0) for result in batch
+        ]
+    
+    def rerun(number):
+        state = sessions[number]
+        start = time.perf_counter()
+        if variant == "before":
+            document = PdfDocument.from_upload(state["uploaded_file"])
+            response = state["response"]
+        else:
+            document = store.open_document(state["uploaded_file"])
+            response = store.get(state["session_id"], state["response"])
+        hashlib.sha256(document.data).hexdigest()
+        assert response
+        del document
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(upload, range(args.sessions)))
+        numbers = [number for _ in range(args.reruns) for number in range(args.sessions)]
+        random.Random(0).shuffle(numbers)
+        timings = sorted(executor.map(rerun, numbers))
+    elapsed = time.perf_counter() - start
+    
+    result = {
+        "variant": variant,
+        "sessions": args.sessions,
+        "rss_delta_mb": round(rss_mb() - baseline, 1),
+        "peak_rss_delta_mb": round(peak_rss_mb() - baseline, 1),
+        "rerun_p50_ms": round(timings[len(timings) // 2] * 1000, 2),
+        "rerun_p95_ms": round(timings[int(len(timings) * 0.95)] * 1000, 2),
+        "seconds": round(elapsed, 1),
+    }
+    if variant == "after":
+        result["store"] = store.stats()
+        result["disk_mb"] = round(
+            sum(entry.stat().st_size for entry in os.scandir(store_dir)) / (1024 * 1024), 1
+        )
+    shutil.rmtree(store_dir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--pdf-mb", type=int, default=5)
+    parser.add_argument("--response-words", type=int, default=4000, help="Words in each session's response")
+    parser.add_argument("--batch", type=int, default=10, help="Batch results kept by each session")
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns per session")
+    parser.add_argument("--workers", type=int, default=16, help="Sessions served at the same time")
+    parser.add_argument("--variant", choices=["before", "after"])
+    args = parser.parse_args()
+    
+    if args.variant:
+        run_variant(args.variant, args)
+        return
+    
+    for variant in ("before", "after"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.session_memory", "--variant", variant] + sys.argv[1:], check=True
+        )
+
+
+if __name__ == "__main__":
+    main()
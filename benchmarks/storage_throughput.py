@@ -0,0 +1,59 @@
+"""Upload throughput of StorageManager against a local fake-GCS emulator.
+
+Start the emulator and point the SDK at it, then run from the repository root:
+    docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http
+    STORAGE_EMULATOR_HOST=http://localhost:4443 python -m benchmarks.storage_throughput --reports 1000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+from pdf2train import PROJECT_ID, StorageManager
+from pdf2train.storage import build_storage_client
+
+
+def report_content(index):
+    return (
+        f"Nome : Trendspot do dia {index % 28 + 1:02d}/01/2025\n"
+        "Categoria : Beleza\n"
+        + "*" * 47 + "\n"
+        + f"Quadro {index}\nDescrição curta do quadro {index}.\nTipo : Áudio\nLink : Insira o link aqui\n"
+    )
+
+
+def timed(label, count, upload):
+    start = time.monotonic()
+    statuses = upload()
+    elapsed = time.monotonic() - start
+    summary = ", ".join(f"{status}={statuses.count(status)}" for status in sorted(set(statuses), key=str))
+    print(f"{label:<22} {count} reports in {elapsed:.2f}s = {count / elapsed:.0f} reports/s ({summary})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    
+    if not os.getenv("STORAGE_EMULATOR_HOST"):
+        sys.exit("STORAGE_EMULATOR_HOST is not set; refusing to benchmark against real Cloud Storage.")
+    
+    client = build_storage_client()
+    bucket_name = f"pdf2train-bench-{uuid.uuid4().hex[:8]}"
+    client.create_bucket(bucket_name)
+    manager = StorageManager(PROJECT_ID, storage_client=client)
+    reports = [(f"trendspot/report_{i}.txt", report_content(i)) for i in range(args.reports)]
+    sequential = [(f"sequential/report_{i}.txt", content) for i, (_, content) in enumerate(reports)]
+    
+    timed("sequential", args.reports,
+          lambda: [manager.upload_report(bucket_name, path, content) for path, content in sequential])
+    timed(f"parallel x{args.workers}", args.reports,
+          lambda: [status for _, status, _ in manager.save_reports(bucket_name, reports, args.workers)])
+    timed("parallel re-save", args.reports,
+          lambda: [status for _, status, _ in manager.save_reports(bucket_name, reports, args.workers)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Offline regression suite: recorded Gemini streams replayed through the real code paths.
+
+Scenarios:
+    single_pdf  GeminiClient.process_pdf over replayed streams; "overhead" is the time
+                our code adds on top of the recorded stream
+    batch       BatchProcessor throughput, as a share of the ideal for the replayed streams
+    memory      Peak RSS to prepare one upload for Gemini (benchmarks.memory_per_upload)
+    ui          Pdf2TrainApp rerun cost under Streamlit's AppTest: cold run, idle reruns
+                and reruns with a finished report on screen
+
+Every metric listed in benchmarks/thresholds.json is checked against its limit;
+with --baseline, metrics that got worse than a previous --json result by more
+than --tolerance fail too. The exit status is 1 on any failure, so a change to
+app_v2.py can be judged offline. The bundled cassette is synthetic; record a
+real one with `python -m benchmarks.replay record` for representative timings.
+
+Run from the repository root:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only single_pdf ui --cassette benchmarks/cassettes/trendspot.jsonl
+    python -m benchmarks.suite --json before.json        # before the change
+    python -m benchmarks.suite --baseline before.json    # after it
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# Keep the suite off the host's real job queue, cache, metrics and stderr
+_WORKDIR = tempfile.mkdtemp(prefix="pdf2train_bench_")
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+os.environ.setdefault("PDF2TRAIN_JOB_WORKERS", "0")
+os.environ.setdefault("PDF2TRAIN_JOBS_DIR", os.path.join(_WORKDIR, "jobs"))
+os.environ.setdefault("PDF2TRAIN_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("PDF2TRAIN_SESSION_DIR", os.path.join(_WORKDIR, "sessions"))
+os.environ.setdefault("PDF2TRAIN_QUOTA_STATE_PATH", os.path.join(_WORKDIR, "quota.json"))
+
+from benchmarks.fake_gemini import FakeStorageClient
+from benchmarks.replay import SYNTHETIC_CASSETTE, ReplayGenaiClient
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(os.path.dirname(BENCHMARKS_DIR), "app_v2.py")
+THRESHOLDS_PATH = os.path.join(BENCHMARKS_DIR, "thresholds.json")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def fake_pdf(size_bytes):
+    from pdf2train import PdfDocument
+    
+    return PdfDocument(b"%PDF-1.4\n" + os.urandom(size_bytes))
+
+
+def replay_client(args):
+    """GeminiClient on the cassette, with a guard that never throttles: the suite measures our code, not the quota."""
+    from pdf2train import GeminiClient
+    from pdf2train.quota import build_quota_guard
+    
+    replay = ReplayGenaiClient(args.cassette, speed=args.speed, match="any")
+    guard = build_quota_guard(requests_per_minute=0, max_concurrency=64, state_path=None)
+    return replay, GeminiClient(None, None, client=replay, quota_guard=guard)
+
+
+def single_pdf(args):
+    from pdf2train import SYSTEM_INSTRUCTIONS
+    
+    replay, client = replay_client(args)
+    document = fake_pdf(args.size_mb * 1024 * 1024)
+    # The first call imports the genai SDK, a one-off cost of the process rather than of each request
+    "".join(client.process_pdf(document, SYSTEM_INSTRUCTIONS))
+    totals, overheads, first_chunk_overheads = [], [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        first_chunk = None
+        for _ in client.process_pdf(document, SYSTEM_INSTRUCTIONS):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+        total = time.perf_counter() - start
+        entry = replay.last_entry
+        totals.append(total)
+        overheads.append(total - replay.recorded_duration(entry))
+        first_chunk_overheads.append((first_chunk or total) - replay.offset(entry["chunks"][0]))
+    return {
+        "total_p50_s": percentile(totals, 0.5),
+        "total_p95_s": percentile(totals, 0.95),
+        "overhead_p50_ms": percentile(overheads, 0.5) * 1000,
+        "overhead_p95_ms": percentile(overheads, 0.95) * 1000,
+        "first_chunk_overhead_p95_ms": percentile(first_chunk_overheads, 0.95) * 1000,
+    }
+
+
+def batch(args):
+    from pdf2train import SYSTEM_INSTRUCTIONS, BatchProcessor
+    
+    replay, client = replay_client(args)
+    processor = BatchProcessor(client, SYSTEM_INSTRUCTIONS, max_workers=args.workers,
+                               requests_per_minute=0, max_retries=0)
+    documents = [(f"doc_{index}.pdf", fake_pdf(64 * 1024)) for index in range(args.files)]
+    
+    start = time.perf_counter()
+    results = list(processor.process(documents))
+    elapsed = time.perf_counter() - start
+    
+    # With perfect packing the workers would finish the replayed streams in this time
+    ideal = replay.replayed_seconds / args.workers
+    return {
+        "files_per_s": len(documents) / elapsed,
+        "efficiency": ideal / elapsed,
+        "failed": sum(1 for result in results if not result.ok),
+    }
+
+
+def memory(args):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.memory_per_upload", "--variant", "after",
+         "--size-mb", str(args.size_mb), "--json"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return {
+        "peak_rss_delta_mb": result["peak_rss_delta_mb"],
+        # Copies of the upload held at once; independent of --size-mb
+        "peak_rss_per_upload_mb": result["peak_rss_delta_mb"] / args.size_mb,
+        "prepare_ms": result["prepare_ms"],
+    }
+
+
+def ui(args):
+    from streamlit.testing.v1 import AppTest
+    
+    from pdf2train.clients import get_client_registry
+    from pdf2train.jobs import get_job_store
+    
+    # AppTest runs the script in this process, so the app picks these clients up from the registry
+    registry = get_client_registry()
+    registry.register("gemini", lambda: ReplayGenaiClient(args.cassette, speed=args.speed, match="any"))
+    registry.register("storage", FakeStorageClient)
+    
+    def timed_run(app):
+        start = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - start
+        if app.exception:
+            raise RuntimeError(f"app_v2.py raised: {app.exception[0].message}")
+        return elapsed * 1000
+    
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    cold_run = timed_run(app)
+    idle = [timed_run(app) for _ in range(args.reruns)]
+    
+    # A refreshed page attached to a finished job keeps the report editor on screen
+    store = get_job_store()
+    entry = ReplayGenaiClient(args.cassette).cassette.entries[0]
+    response = "".join(record["text"] or "" for record in entry["chunks"])
+    job = store.submit("benchmark.pdf", fake_pdf(64 * 1024), f"benchmark-{uuid.uuid4().hex}")
+    store.claim("benchmarks.suite")
+    store.finish(job.id, "benchmarks.suite", response)
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.query_params["job"] = job.id
+    timed_run(app)
+    with_report = [timed_run(app) for _ in range(args.reruns)]
+    
+    return {
+        "cold_run_ms": cold_run,
+        "idle_rerun_p50_ms": percentile(idle, 0.5),
+        "idle_rerun_p95_ms": percentile(idle, 0.95),
+        "report_rerun_p95_ms": percentile(with_report, 0.95),
+    }
+
+
+SCENARIOS = {"single_pdf": single_pdf, "batch": batch, "memory": memory, "ui": ui}
+
+
+def check(results, thresholds, baseline, tolerance):
+    """Print every metric against its limit and baseline; returns the number of failures."""
+    failures = 0
+    for scenario, metrics in results.items():
+        if "error" in metrics:
+            print(f"{scenario:<12} ERROR {metrics['error']}")
+            failures += 1
+            continue
+        for metric, value in metrics.items():
+            name = f"{scenario}.{metric}"
+            limit = thresholds.get(name, {})
+            notes = []
+            failed = False
+            if "max" in limit:
+                notes.append(f"max {limit['max']}")
+                failed |= value > limit["max"]
+            if "min" in limit:
+                notes.append(f"min {limit['min']}")
+                failed |= value < limit["min"]
+            previous = baseline.get(scenario, {}).get(metric)
+            if previous is not None and limit:
+                notes.append(f"baseline {previous:.2f}")
+                if "max" in limit:
+                    failed |= value > previous * (1 + tolerance)
+                else:
+                    failed |= value < previous * (1 - tolerance)
+            status = ("FAIL" if failed else "PASS") if limit else ""
+            failures += failed
+            print(f"{name:<40} {value:>10.2f}  {status:<4}  {', '.join(notes)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--cassette", default=SYNTHETIC_CASSETTE)
+    parser.add_argument("--speed", type=float, default=4.0, help="Replay time scale (1.0 = recorded timing)")
+    parser.add_argument("--runs", type=int, default=10, help="Extractions for single_pdf")
+    parser.add_argument("--size-mb", type=int, default=5, help="Synthetic PDF size for single_pdf and memory")
+    parser.add_argument("--files", type=int, default=16, help="Files for batch")
+    parser.add_argument("--workers", type=int, default=4, help="Batch workers")
+    parser.add_argument("--reruns", type=int, default=20, help="Reruns per ui measurement")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--baseline", help="Results of a previous --json run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against --baseline")
+    parser.add_argument("--json", help="Write the results here")
+    args = parser.parse_args()
+    
+    results = {}
+    for name in args.only:
+        start = time.perf_counter()
+        try:
+            results[name] = SCENARIOS[name](args)
+        except Exception as exc:
+            results[name] = {"error": f"{type(exc).__name__}: {exc}"}
+        print(f"# {name} took {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    
+    with open(args.thresholds, "r", encoding="utf-8") as thresholds_file:
+        thresholds = json.load(thresholds_file)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    failures = check(results, thresholds, baseline, args.tolerance)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Trendspot PDF extraction core, usable without Streamlit.
+
+Names are resolved lazily, so `import pdf2train` stays cheap and the Google
+SDKs, pydantic and pypdf are only imported by the code paths that need them.
+"""
+import importlib
+
+_EXPORTS = {
+    "BatchProcessor": "batch",
+    "BatchResult": "batch",
+    "RateLimiter": "batch",
+    "ExtractionCache": "cache",
+    "get_extraction_cache": "cache",
+    "ClientRegistry": "clients",
+    "get_client_registry": "clients",
+    "ContextCache": "context_cache",
+    "get_context_cache": "context_cache",
+    "DuplicateIndex": "dedup",
+    "Fingerprint": "dedup",
+    "get_duplicate_index": "dedup",
+    "PdfDocument": "documents",
+    "PdfProcessor": "documents",
+    "ThumbnailService": "documents",
+    "get_thumbnail_service": "documents",
+    "GeminiClient": "gemini",
+    "Job": "jobs",
+    "JobStore": "jobs",
+    "JobWorker": "jobs",
+    "WorkerPool": "jobs",
+    "get_job_store": "jobs",
+    "get_worker_pool": "jobs",
+    "StreamMetrics": "metrics",
+    "ReportNameGenerator": "naming",
+    "PageSplitExtractor": "pages",
+    "PageTruncatedError": "pages",
+    "DirectorySink": "pipeline",
+    "IndexSink": "pipeline",
+    "JsonlSink": "pipeline",
+    "PipelineResult": "pipeline",
+    "ReportEvent": "pipeline",
+    "ReportPipeline": "pipeline",
+    "StorageSink": "pipeline",
+    "CircuitOpenError": "quota",
+    "QuotaGuard": "quota",
+    "get_quota_guard": "quota",
+    "ModelRouter": "routing",
+    "Route": "routing",
+    "check_extraction": "routing",
+    "get_model_router": "routing",
+    "Quadro": "schema",
+    "StructuredStreamParser": "schema",
+    "TrendspotReport": "schema",
+    "render_report": "schema",
+    "ReportIndex": "search",
+    "get_report_index": "search",
+    "parse_report": "search",
+    "Payload": "session",
+    "SessionStore": "session",
+    "get_session_store": "session",
+    "StorageManager": "storage",
+    "Telemetry": "telemetry",
+    "get_telemetry": "telemetry",
+    "render_metrics": "telemetry",
+    "span": "telemetry",
+    "Warmup": "warmup",
+    "get_warmup": "warmup",
+    "BUCKET_NAME": "config",
+    "LOCATION": "config",
+    "MODEL_NAME": "config",
+    "PROJECT_ID": "config",
+    "REPORTS_FOLDER": "config",
+    "STRUCTURED_SYSTEM_INSTRUCTIONS": "config",
+    "SYSTEM_INSTRUCTIONS": "config",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{module}", __name__), name)
+
+
+def __dir__():
+    return __all__
@@ -0,0 +1,199 @@
+"""Concurrent extraction of many PDFs."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from .cache import ExtractionCache
+from .config import (
+    BATCH_MAX_RETRIES,
+    BATCH_MAX_WORKERS,
+    BATCH_REQUESTS_PER_MINUTE,
+    BATCH_RETRY_BACKOFF,
+    DEDUP_AUTO_REUSE,
+)
+from .dedup import DuplicateIndex
+from .metrics import StreamMetrics
+from .quota import CircuitOpenError, classify_error
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces request starts evenly over time."""
+    
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until the caller is allowed to start a request."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of extracting a single PDF in a batch."""
+    
+    name: str
+    response: str
+    attempts: int
+    elapsed: float
+    cached: bool = False
+    error: str = None
+    time_to_first_chunk: float = None
+    # Name of an earlier document this one nearly duplicates; its extraction was reused if `cached`
+    duplicate_of: str = None
+    # Post-processed report, when the batch runs a report pipeline; `response` is then its text
+    report: object = None
+    # The response hit max_output_tokens; it is kept, not cached, and the result is an error
+    truncated: bool = False
+    
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class BatchProcessor:
+    """Run PDF extractions across many files through a bounded worker pool."""
+    
+    def __init__(self, gemini_client, system_instructions, max_workers=BATCH_MAX_WORKERS,
+                 requests_per_minute=BATCH_REQUESTS_PER_MINUTE, max_retries=BATCH_MAX_RETRIES,
+                 retry_backoff=BATCH_RETRY_BACKOFF, cache=None, structured=False, rate_limiter=None,
+                 duplicates=None, pipeline=None, reuse_duplicates=DEDUP_AUTO_REUSE):
+        self.gemini_client = gemini_client
+        self.system_instructions = system_instructions
+        self.structured = structured
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.cache = cache
+        # Near duplicates are answered from the cache, so they are only looked up alongside it
+        self.duplicates = duplicates if cache is not None else None
+        self.reuse_duplicates = reuse_duplicates
+        self.variant = DuplicateIndex.variant(self.gemini_client.model_key, system_instructions)
+        # Free-text responses are post-processed as they stream; the cache keeps the raw response
+        self.pipeline = pipeline if not structured else None
+    
+    def _finish(self, result, run=None):
+        """Post-process a successful result, streamed through `run` or, if answered without streaming, whole."""
+        if self.pipeline is None or not result.ok:
+            return result
+        report = run.finish() if run is not None else self.pipeline.process([result.response])
+        result.response = report.text
+        result.report = report
+        return result
+    
+    def _is_valid(self, response):
+        """Whether a response may be cached: structured ones must follow the report schema."""
+        if not self.structured:
+            return True
+        from pydantic import ValidationError
+        
+        from .schema import TrendspotReport
+        
+        try:
+            TrendspotReport.model_validate_json(response)
+        except ValidationError:
+            return False
+        return True
+    
+    def extract(self, name, document):
+        """
+        Extract one document, retrying failed attempts with exponential backoff.
+        
+        Quota and availability errors are retried by the client's quota guard,
+        so one that reaches this point, or an open circuit, is not retried.
+        
+        With a cache, an identical document is answered from it. With a
+        duplicate index too, a near duplicate of an extracted document is
+        extracted anyway and the match named in `duplicate_of`; with
+        `reuse_duplicates`, a text-layer match is answered from the cache.
+        
+        A response cut off at the token limit is returned as a truncated error
+        and neither cached nor indexed.
+        """
+        start = time.monotonic()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ExtractionCache.make_key(document.data, self.gemini_client.model_key, self.system_instructions)
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                return self._finish(BatchResult(name, cached_response, 0, time.monotonic() - start, cached=True))
+        duplicate_of = None
+        if self.duplicates is not None:
+            match, duplicate_response = self.duplicates.lookup(document, self.variant, self.cache, exclude=cache_key)
+            if match is not None and self.reuse_duplicates and match.kind == "text":
+                return self._finish(BatchResult(name, duplicate_response, 0, time.monotonic() - start, cached=True,
+                                                duplicate_of=match.name))
+            duplicate_of = match.name if match is not None else None
+        
+        from .gemini import GeminiClient
+        
+        response = ""
+        error = None
+        truncated = False
+        time_to_first_chunk = None
+        attempt = 0
+        while attempt <= self.max_retries:
+            attempt += 1
+            self.rate_limiter.acquire()
+            chunks = []
+            metrics = StreamMetrics()
+            # A retried attempt streams again from the start, so it gets a fresh run
+            run = self.pipeline.start() if self.pipeline is not None else None
+            metadata = {}
+            try:
+                for chunk in self.gemini_client.process_pdf(document, self.system_instructions, self.structured,
+                                                            metadata):
+                    metrics.record(chunk)
+                    chunks.append(chunk)
+                    if run is not None:
+                        run.feed(chunk)
+                response = "".join(chunks)
+                time_to_first_chunk = metrics.time_to_first_chunk
+                # Another attempt would stop at the same token limit
+                truncated = GeminiClient.is_truncated(metadata)
+                error = "A resposta atingiu o limite de tokens e está incompleta." if truncated else None
+                break
+            except Exception as exc:
+                # Keep whatever was streamed so the caller still gets a partial result
+                partial = "".join(chunks)
+                if len(partial) >= len(response):
+                    response = partial
+                error = f"{type(exc).__name__}: {exc}"
+                if isinstance(exc, CircuitOpenError) or classify_error(exc) is not None:
+                    break
+                if attempt <= self.max_retries:
+                    time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+        
+        if error is None and cache_key is not None and response and self._is_valid(response):
+            self.cache.put(cache_key, response)
+            if self.duplicates is not None:
+                self.duplicates.add(cache_key, name, self.duplicates.fingerprint(document), self.variant)
+        return self._finish(BatchResult(name, response, attempt, time.monotonic() - start, error=error,
+                                        time_to_first_chunk=time_to_first_chunk, duplicate_of=duplicate_of,
+                                        truncated=truncated), run)
+    
+    def process(self, documents):
+        """
+        Extract every document and yield results as soon as each one finishes.
+        
+        Args:
+            documents (list): (name, PdfDocument) pairs
+            
+        Yields:
+            BatchResult: Result of each document, in completion order
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.extract, name, document) for name, document in documents]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,131 @@
+"""Content-addressed cache of model extractions."""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .config import CACHE_DIR, CACHE_MAX_DISK_BYTES, CACHE_MAX_MEMORY_ENTRIES
+from .telemetry import get_telemetry
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class ExtractionCache:
+    """Two-tier (in-process LRU + on-disk) cache of model extractions."""
+    
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_entries=CACHE_MAX_MEMORY_ENTRIES,
+                 max_disk_bytes=CACHE_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(pdf_data, model_name, system_instructions):
+        """Build a content-addressed key from the PDF bytes and the model setup."""
+        digest = hashlib.sha256()
+        digest.update(pdf_data)
+        digest.update(b"\0" + model_name.encode("utf-8"))
+        digest.update(b"\0" + system_instructions.encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+    
+    def _remember(self, key, value):
+        """Insert into the memory tier, evicting the least recently used entry."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+    
+    def get(self, key):
+        """Return the cached extraction for `key`, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                get_telemetry().inc("pdf2train_cache_requests_total", result="memory_hit")
+                return self._memory[key]
+        
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as cached:
+                value = cached.read()
+            # Refresh mtime so disk eviction stays least-recently-used
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            get_telemetry().inc("pdf2train_cache_requests_total", result="miss")
+            return None
+        
+        with self._lock:
+            self._remember(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+        get_telemetry().inc("pdf2train_cache_requests_total", result="disk_hit")
+        return value
+    
+    def put(self, key, value):
+        """Store an extraction in both tiers."""
+        with self._lock:
+            self._remember(key, value)
+        
+        path = self._disk_path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                temp_file.write(value)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict_disk()
+    
+    def _evict_disk(self):
+        """Delete the oldest cached files until the disk tier fits its budget."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file() or not entry.name.endswith(".txt"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    
+    def stats(self):
+        """Return hit/miss counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+
+def get_extraction_cache():
+    """Process-wide extraction cache shared by every session."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
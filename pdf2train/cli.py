@@ -0,0 +1,335 @@
+"""Command line entry point.
+
+Usage:
+    python -m pdf2train extract relatorios/ "entrada/*.pdf" --structured > relatorios.jsonl
+    python -m pdf2train extract relatorios/ --upload
+    python -m pdf2train extract relatorios/ --output-dir saida/ --jsonl quadros.jsonl
+    python -m pdf2train extract relatorios/ --mode hybrid
+    python -m pdf2train extract relatorios/ --routing speculative
+    python -m pdf2train serve --port 8080
+    python -m pdf2train app --port 8501
+    python -m pdf2train worker --workers 4
+    python -m pdf2train metrics --port 9100
+    python -m pdf2train reindex --workers 32
+    python -m pdf2train reindex --migrate-names
+    python -m pdf2train search "cabelo cacheado" --category Beleza --type Áudio --since 2026-09-01
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+from .config import (
+    BATCH_MAX_RETRIES,
+    BATCH_MAX_WORKERS,
+    BATCH_REQUESTS_PER_MINUTE,
+    BUCKET_NAME,
+    DEDUP_AUTO_REUSE,
+    EXTRACTION_MODE,
+    JOB_WORKERS,
+    METRICS_PORT,
+    MODEL_ROUTING,
+    REPORT_INDEX_FETCH_WORKERS,
+    REPORTS_FOLDER,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_QUEUE_SIZE,
+    STREAMLIT_PORT,
+)
+
+
+def collect_documents(patterns):
+    """Expand file names, globs and directories into (name, PdfDocument) pairs."""
+    from .documents import PdfDocument
+    
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(sorted(glob.glob(os.path.join(pattern, "*.pdf"))))
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+    return [(os.path.basename(path), PdfDocument.from_path(path)) for path in paths]
+
+
+def extract(args):
+    """Extract every matched PDF, streaming one JSON line per finished file."""
+    from pydantic import ValidationError
+    
+    from .batch import BatchProcessor
+    from .cache import ExtractionCache
+    from .clients import get_client_registry
+    from .config import STRUCTURED_SYSTEM_INSTRUCTIONS, SYSTEM_INSTRUCTIONS
+    from .dedup import get_duplicate_index
+    from .gemini import GeminiClient
+    from .pipeline import DirectorySink, IndexSink, JsonlSink, ReportPipeline, StorageSink
+    from .routing import ModelRouter
+    from .schema import render_report
+    from .search import get_report_index
+    from .storage import StorageManager
+    
+    documents = collect_documents(args.inputs)
+    if not documents:
+        print("Nenhum arquivo PDF encontrado.", file=sys.stderr)
+        return 1
+    
+    if args.jsonl and args.structured:
+        print("--jsonl vale somente para a extração em texto livre.", file=sys.stderr)
+        return 1
+    
+    registry = get_client_registry()
+    # Free-text reports are saved by the pipeline's sinks, which index them from the fields already parsed
+    storage_manager = StorageManager(
+        None, storage_client=registry.get("storage"),
+        report_index=get_report_index() if args.upload and args.structured else None,
+    )
+    pipeline = None
+    if not args.structured:
+        sinks = [DirectorySink(args.output_dir)] if args.output_dir else []
+        if args.upload:
+            sinks += [StorageSink(storage_manager), IndexSink(get_report_index())]
+        if args.jsonl:
+            sinks.append(JsonlSink(args.jsonl))
+        pipeline = ReportPipeline(sinks=sinks)
+    gemini = GeminiClient(None, None, client=registry.get("gemini"), storage_manager=storage_manager,
+                          extraction_mode=args.mode, router=ModelRouter(mode=args.routing))
+    processor = BatchProcessor(
+        gemini,
+        STRUCTURED_SYSTEM_INSTRUCTIONS if args.structured else SYSTEM_INSTRUCTIONS,
+        max_workers=args.workers,
+        requests_per_minute=args.rpm,
+        max_retries=args.retries,
+        cache=None if args.no_cache else ExtractionCache(),
+        structured=args.structured,
+        duplicates=None if args.no_cache else get_duplicate_index(),
+        pipeline=pipeline,
+        reuse_duplicates=args.reuse_duplicates,
+    )
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    failures = 0
+    uploads = []
+    for done, result in enumerate(processor.process(documents), 1):
+        status = "ok" if result.ok else f"erro: {result.error}"
+        print(f"[{done}/{len(documents)}] {result.name} ({result.elapsed:.1f}s, "
+              f"{result.attempts} tentativas) {status}", file=sys.stderr)
+        record = {"name": result.name, "ok": result.ok, "cached": result.cached, "elapsed": round(result.elapsed, 3)}
+        if result.duplicate_of:
+            record["duplicate_of"] = result.duplicate_of
+        if result.truncated:
+            record["truncated"] = True
+        
+        if result.report is not None:
+            if result.report.problems:
+                record["problems"] = result.report.problems
+            if result.report.sink_errors:
+                record.update(ok=False, error="; ".join(
+                    f"{sink}: {error}" for sink, error in result.report.sink_errors.items()
+                ))
+            if args.output_dir or args.upload:
+                record["file"] = result.report.file_name
+            else:
+                record["response"] = result.response
+        elif result.ok:
+            try:
+                report_name, report_content, extension = render_report(result.response, args.structured)
+            except ValidationError as exc:
+                record.update(ok=False, error=f"JSON inválido ({exc.error_count()} erros)")
+        else:
+            record["error"] = result.error
+        
+        if not record["ok"]:
+            failures += 1
+        elif result.report is not None:
+            # Already written by the pipeline's sinks
+            pass
+        elif args.output_dir or args.upload:
+            file_name = f"{report_name}.{extension}"
+            record["file"] = file_name
+            if args.output_dir:
+                with open(os.path.join(args.output_dir, file_name), "w", encoding="utf-8") as output:
+                    output.write(report_content)
+            if args.upload:
+                uploads.append((f"{REPORTS_FOLDER}/{file_name}", report_content))
+        else:
+            record["response"] = report_content
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+    # The batch is over, so the cached instructions would only be billed for storage until their TTL ends
+    gemini.context_cache.close()
+    for route, route_stats in gemini.router.stats().items():
+        print(f"Rota {route}: {route_stats['requests']} extrações, {route_stats['mean_seconds']:.1f}s em média, "
+              f"US$ {route_stats['cost_usd']:.4f}, {route_stats['escalation_rate']:.0%} escaladas", file=sys.stderr)
+    
+    for file_path, status, error in storage_manager.save_reports(BUCKET_NAME, uploads):
+        if error is not None:
+            print(f"Falha ao salvar {file_path}: {error}", file=sys.stderr)
+            failures += 1
+        elif status == "conflict":
+            print(f"gs://{BUCKET_NAME}/{file_path} já existe com outro conteúdo e não foi substituído",
+                  file=sys.stderr)
+            failures += 1
+        else:
+            print(f"gs://{BUCKET_NAME}/{file_path} {status}", file=sys.stderr)
+    
+    return 1 if failures else 0
+
+
+def serve(args):
+    """Run the HTTP extraction service."""
+    from .server import run_server
+    
+    run_server(args.host, args.port, workers=args.workers, queue_size=args.queue_size)
+    return 0
+
+
+def app(args):
+    """Warm up, then run the Streamlit app in this process, so its first session finds everything warm."""
+    from .warmup import get_warmup
+    
+    warmup = get_warmup(app=True).start()
+    # Streamlit's own imports overlap with the warm-up; its port opens, and its health check answers, once warm
+    from streamlit.web import cli as streamlit_cli
+    
+    warmup.wait()
+    for step, error in warmup.errors.items():
+        print(f"pdf2train: aquecimento ({step}) falhou: {error}", file=sys.stderr, flush=True)
+    return streamlit_cli.main([
+        "run", args.script, "--server.address", args.host, "--server.port", str(args.port),
+        "--server.headless", "true",
+    ], prog_name="streamlit")
+
+
+def worker(args):
+    """Run extraction worker processes for the durable job queue."""
+    from .jobs import JobStore, WorkerPool
+    
+    store = JobStore()
+    pool = WorkerPool(workers=args.workers)
+    print(f"pdf2train: {args.workers} workers consumindo {store.db_path}", file=sys.stderr, flush=True)
+    try:
+        pool.supervise()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def metrics(args):
+    """Serve the Prometheus metrics of every pdf2train process on this host."""
+    from .telemetry import start_metrics_server
+    
+    server = start_metrics_server(args.host, args.port)
+    print(f"pdf2train metrics on http://{args.host}:{args.port}/metrics", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def reindex(args):
+    """Rebuild the local report search index from the reports saved in Cloud Storage."""
+    from .clients import get_client_registry
+    from .search import get_report_index
+    from .storage import StorageManager
+    
+    storage_manager = StorageManager(None, storage_client=get_client_registry().get("storage"))
+    failed = 0
+    if args.migrate_names:
+        renamed = storage_manager.migrate_report_names(args.bucket, args.prefix, max_workers=args.workers)
+        print(json.dumps({"names": renamed}), flush=True)
+        failed += renamed["failed"]
+    counts = get_report_index().rebuild(storage_manager, args.bucket, args.prefix, max_workers=args.workers)
+    print(json.dumps(counts), flush=True)
+    return 1 if failed or counts["failed"] else 0
+
+
+def search(args):
+    """Query the local report search index, one JSON line per matching report."""
+    from dataclasses import asdict
+    
+    from .search import get_report_index
+    
+    result = get_report_index().search(
+        args.text, category=args.category, quadro_type=args.type, date_from=args.since, date_to=args.until,
+        limit=args.limit,
+    )
+    for hit in result.hits:
+        print(json.dumps(asdict(hit), ensure_ascii=False))
+    print(f"{len(result.hits)} de {result.total} relatórios em {result.seconds * 1000:.0f}ms", file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="pdf2train", description="Trendspot PDF extraction without the Streamlit UI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    extract_parser = commands.add_parser("extract", help="Extract PDFs given as files, globs or directories")
+    extract_parser.add_argument("inputs", nargs="+", help="PDF files, globs or directories")
+    extract_parser.add_argument("--output-dir", help="Write each extraction to this directory")
+    extract_parser.add_argument("--upload", action="store_true", help="Save each extraction to Cloud Storage")
+    extract_parser.add_argument("--jsonl", help="Append one JSON line per quadro of each free-text extraction")
+    extract_parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help="Concurrent extractions")
+    extract_parser.add_argument("--rpm", type=float, default=BATCH_REQUESTS_PER_MINUTE,
+                                help="Max requests per minute on top of the shared Gemini quota (0 = no extra limit)")
+    extract_parser.add_argument("--retries", type=int, default=BATCH_MAX_RETRIES,
+                                help="Retries per file of errors the Gemini quota guard does not already retry")
+    extract_parser.add_argument("--no-cache", action="store_true",
+                                help="Skip the extraction cache and near-duplicate detection")
+    extract_parser.add_argument("--reuse-duplicates", action="store_true", default=bool(DEDUP_AUTO_REUSE),
+                                help="Answer a near duplicate (by text layer) with its earlier extraction "
+                                     "instead of only naming it in duplicate_of")
+    extract_parser.add_argument("--structured", action="store_true",
+                                help="Extract validated JSON records instead of free text")
+    extract_parser.add_argument("--mode", choices=["pdf", "hybrid"], default=EXTRACTION_MODE,
+                                help="Send the PDF, or its text layer plus image crops")
+    extract_parser.add_argument("--routing", choices=["off", "size", "speculative"], default=MODEL_ROUTING,
+                                help="Pick the model per PDF, and optionally try a fast model first")
+    extract_parser.set_defaults(handler=extract)
+    
+    serve_parser = commands.add_parser("serve", help="Run the HTTP extraction service")
+    serve_parser.add_argument("--host", default=SERVER_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    serve_parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help="Concurrent extractions")
+    serve_parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE, help="Max queued requests")
+    serve_parser.set_defaults(handler=serve)
+    
+    app_parser = commands.add_parser("app", help="Run the Streamlit app, warmed up before it takes traffic")
+    app_parser.add_argument("--host", default=SERVER_HOST)
+    app_parser.add_argument("--port", type=int, default=STREAMLIT_PORT)
+    app_parser.add_argument("--script", default="app_v2.py", help="Streamlit script to run")
+    app_parser.set_defaults(handler=app)
+    
+    worker_parser = commands.add_parser("worker", help="Consume the durable extraction job queue")
+    worker_parser.add_argument("--workers", type=int, default=max(1, JOB_WORKERS), help="Worker processes")
+    worker_parser.set_defaults(handler=worker)
+    
+    metrics_parser = commands.add_parser("metrics", help="Serve Prometheus metrics of the app, workers and service")
+    metrics_parser.add_argument("--host", default=SERVER_HOST)
+    metrics_parser.add_argument("--port", type=int, default=METRICS_PORT or 9100)
+    metrics_parser.set_defaults(handler=metrics)
+    
+    reindex_parser = commands.add_parser("reindex", help="Rebuild the report search index from Cloud Storage")
+    reindex_parser.add_argument("--bucket", default=BUCKET_NAME)
+    reindex_parser.add_argument("--prefix", default=f"{REPORTS_FOLDER}/")
+    reindex_parser.add_argument("--workers", type=int, default=REPORT_INDEX_FETCH_WORKERS, help="Parallel downloads")
+    reindex_parser.add_argument("--migrate-names", action="store_true",
+                                help="First move reports saved under the names suggested before accents were "
+                                     "transliterated to their current names")
+    reindex_parser.set_defaults(handler=reindex)
+    
+    search_parser = commands.add_parser("search", help="Search the saved reports through the local index")
+    search_parser.add_argument("text", nargs="?", help="Words to find in quadro titles and descriptions")
+    search_parser.add_argument("--category", help="Report category, e.g. Beleza")
+    search_parser.add_argument("--type", help="Quadro type, e.g. Áudio")
+    search_parser.add_argument("--since", help="First report date (YYYY-MM-DD)")
+    search_parser.add_argument("--until", help="Last report date (YYYY-MM-DD)")
+    search_parser.add_argument("--limit", type=int, default=50)
+    search_parser.set_defaults(handler=search)
+    
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,114 @@
+"""Process-wide registry of SDK clients shared by every session, job and request."""
+import threading
+import time
+
+from .config import BUCKET_NAME, CLIENT_HEALTH_CHECK_INTERVAL, CLIENT_MAX_AGE
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class ClientRegistry:
+    """Thread-safe registry of SDK clients built lazily and shared by every session."""
+    
+    def __init__(self, max_age=CLIENT_MAX_AGE, health_check_interval=CLIENT_HEALTH_CHECK_INTERVAL):
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self._factories = {}
+        self._entries = {}
+        self._stats = {}
+        self._locks = {}
+    
+    def register(self, name, factory, health_check=None):
+        """Register how to build the client `name` and, optionally, how to check it."""
+        self._factories[name] = (factory, health_check)
+        self._locks[name] = threading.Lock()
+        self._stats[name] = {"builds": 0, "reuses": 0, "build_seconds": 0.0, "last_build_seconds": 0.0,
+                             "failed_health_checks": 0}
+    
+    def _is_fresh(self, entry, now):
+        """Whether a built client is young enough to be handed out."""
+        return now - entry["created"] <= self.max_age
+    
+    def _schedule_health_check(self, name, entry, now):
+        """
+        Start the health check of `entry` on a background thread if one is due.
+        
+        Called under the lock of `name`; the check itself runs outside it, so
+        a slow probe never holds up the requests that share the client. An
+        unhealthy client is dropped and the next `get` rebuilds it.
+        """
+        _, health_check = self._factories[name]
+        if health_check is None or entry["checking"] or now - entry["checked"] < self.health_check_interval:
+            return
+        entry["checked"] = now
+        entry["checking"] = True
+        
+        def check():
+            try:
+                healthy = bool(health_check(entry["client"]))
+            except Exception:
+                healthy = False
+            with self._locks[name]:
+                entry["checking"] = False
+                if not healthy:
+                    self._stats[name]["failed_health_checks"] += 1
+                    if self._entries.get(name) is entry:
+                        del self._entries[name]
+        
+        threading.Thread(target=check, name=f"pdf2train-health-{name}", daemon=True).start()
+    
+    def get(self, name):
+        """Return the shared client `name`, building or rebuilding it when needed."""
+        with self._locks[name]:
+            now = time.monotonic()
+            entry = self._entries.get(name)
+            stats = self._stats[name]
+            if entry is not None and self._is_fresh(entry, now):
+                self._schedule_health_check(name, entry, now)
+                stats["reuses"] += 1
+                return entry["client"]
+            
+            factory, _ = self._factories[name]
+            start = time.perf_counter()
+            client = factory()
+            elapsed = time.perf_counter() - start
+            
+            self._entries[name] = {"client": client, "created": now, "checked": now, "checking": False}
+            stats["builds"] += 1
+            stats["build_seconds"] += elapsed
+            stats["last_build_seconds"] = elapsed
+            return client
+    
+    def invalidate(self, name):
+        """Drop the client `name` so the next `get` rebuilds it."""
+        with self._locks[name]:
+            self._entries.pop(name, None)
+    
+    def stats(self):
+        """Return build/reuse counters per client."""
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+def get_client_registry():
+    """
+    Process-wide client registry shared by every session and rerun.
+    
+    Streamlit re-executes the app script on each rerun but keeps imported
+    modules, so a module-level instance outlives reruns.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from .gemini import build_gemini_client
+            from .storage import build_storage_client
+            
+            registry = ClientRegistry()
+            registry.register("gemini", build_gemini_client)
+            registry.register(
+                "storage",
+                build_storage_client,
+                health_check=lambda client: client.bucket(BUCKET_NAME).exists(),
+            )
+            _registry = registry
+        return _registry
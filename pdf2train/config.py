@@ -0,0 +1,255 @@
+"""Settings and model instructions shared by the app, the CLI and the HTTP service."""
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Constants
+PROJECT_ID = "orbit-web-apps"
+LOCATION = "us-central1"
+MODEL_NAME = "gemini-2.0-flash-exp"
+BUCKET_NAME = "orbit-reports-repository"
+REPORTS_FOLDER = "trendspot"
+
+# PDFs larger than this are staged in Cloud Storage and sent by URI instead of inline bytes. Each request
+# deletes its staged copy when it ends; only a process killed mid-request leaves one behind under STAGING_FOLDER
+INLINE_PDF_MAX_BYTES = int(os.getenv("PDF2TRAIN_INLINE_PDF_MAX_BYTES", str(7 * 1024 * 1024)))
+STAGING_FOLDER = "pdf2train-staging"
+
+# Shared client settings
+HTTP_POOL_SIZE = int(os.getenv("PDF2TRAIN_HTTP_POOL_SIZE", "32"))
+CLIENT_MAX_AGE = float(os.getenv("PDF2TRAIN_CLIENT_MAX_AGE", "3600"))
+CLIENT_HEALTH_CHECK_INTERVAL = float(os.getenv("PDF2TRAIN_CLIENT_HEALTH_CHECK_INTERVAL", "300"))
+
+# Report upload settings
+UPLOAD_MAX_WORKERS = int(os.getenv("PDF2TRAIN_UPLOAD_MAX_WORKERS", "16"))
+UPLOAD_TIMEOUT = float(os.getenv("PDF2TRAIN_UPLOAD_TIMEOUT", "60"))
+SAVE_MESSAGES = {
+    "created": "Relatório Salvo !!",
+    "updated": "Relatório Atualizado !!",
+    "unchanged": "Relatório já estava salvo.",
+    "conflict": "Já existe outro relatório com este nome. Escolha outro nome ou marque a opção de substituir.",
+}
+
+# Page-split extraction settings
+PAGES_PER_SHARD = int(os.getenv("PDF2TRAIN_PAGES_PER_SHARD", "4"))
+
+# Request mode: "pdf" sends the PDF itself; "hybrid" sends its text layer plus JPEG crops of what
+# the text cannot stand in for, and falls back to the PDF when the text layer is too thin
+EXTRACTION_MODE = os.getenv("PDF2TRAIN_EXTRACTION_MODE", "pdf")
+HYBRID_MIN_WORDS = int(os.getenv("PDF2TRAIN_HYBRID_MIN_WORDS", "80"))
+HYBRID_MAX_CROPS = int(os.getenv("PDF2TRAIN_HYBRID_MAX_CROPS", "4"))
+HYBRID_CROP_DPI = int(os.getenv("PDF2TRAIN_HYBRID_CROP_DPI", "100"))
+
+# Model routing settings
+# "off" sends every document to MODEL_NAME; "size" picks the model from the document's page count and size;
+# "speculative" also tries MODEL_FAST first and escalates when its output is not a usable Trendspot report
+MODEL_ROUTING = os.getenv("PDF2TRAIN_MODEL_ROUTING", "off")
+MODEL_FAST = os.getenv("PDF2TRAIN_MODEL_FAST", "gemini-2.0-flash-lite")
+MODEL_STRONG = os.getenv("PDF2TRAIN_MODEL_STRONG", "gemini-2.5-pro")
+# Documents within both limits go to MODEL_FAST
+ROUTE_FAST_MAX_PAGES = int(os.getenv("PDF2TRAIN_ROUTE_FAST_MAX_PAGES", "4"))
+ROUTE_FAST_MAX_BYTES = int(os.getenv("PDF2TRAIN_ROUTE_FAST_MAX_BYTES", str(2 * 1024 * 1024)))
+# Documents past either limit go to MODEL_STRONG
+ROUTE_STRONG_MIN_PAGES = int(os.getenv("PDF2TRAIN_ROUTE_STRONG_MIN_PAGES", "20"))
+ROUTE_STRONG_MIN_BYTES = int(os.getenv("PDF2TRAIN_ROUTE_STRONG_MIN_BYTES", str(20 * 1024 * 1024)))
+# A speculative response with fewer quadros than this is escalated
+ROUTE_MIN_QUADROS = int(os.getenv("PDF2TRAIN_ROUTE_MIN_QUADROS", "3"))
+
+# Async streaming settings
+GEMINI_STREAM_TIMEOUT = float(os.getenv("PDF2TRAIN_GEMINI_STREAM_TIMEOUT", "300"))
+
+# Context cache settings
+# Seconds a server-side cached content of the system instructions lives without use (0 = never cache)
+CONTEXT_CACHE_TTL = float(os.getenv("PDF2TRAIN_CONTEXT_CACHE_TTL", "3600"))
+# The model rejects cached contents smaller than this, so shorter instructions are always sent inline
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("PDF2TRAIN_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+# Seconds to send the instructions inline after creating a cached content failed
+CONTEXT_CACHE_RETRY = float(os.getenv("PDF2TRAIN_CONTEXT_CACHE_RETRY", "600"))
+
+# Minimum seconds between UI refreshes while a response is streaming
+STREAM_RENDER_INTERVAL = float(os.getenv("PDF2TRAIN_STREAM_RENDER_INTERVAL", "0.25"))
+
+# Thumbnail settings
+THUMBNAIL_MAX_SIZE = int(os.getenv("PDF2TRAIN_THUMBNAIL_MAX_SIZE", "320"))
+THUMBNAIL_DPI = int(os.getenv("PDF2TRAIN_THUMBNAIL_DPI", "50"))
+THUMBNAIL_WORKERS = int(os.getenv("PDF2TRAIN_THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_CACHE_ENTRIES = int(os.getenv("PDF2TRAIN_THUMBNAIL_CACHE_ENTRIES", "128"))
+THUMBNAIL_TIMEOUT = float(os.getenv("PDF2TRAIN_THUMBNAIL_TIMEOUT", "30"))
+
+# Session state settings
+# Uploads, responses and other large session payloads are kept here by content hash; session state only
+# holds their handles
+SESSION_DIR = os.getenv("PDF2TRAIN_SESSION_DIR", os.path.join(tempfile.gettempdir(), "pdf2train_sessions"))
+# Bytes of payloads read back that stay in memory, per session and for all sessions together
+SESSION_MEMORY_BYTES = int(os.getenv("PDF2TRAIN_SESSION_MEMORY_BYTES", str(4 * 1024 * 1024)))
+SESSION_GLOBAL_MEMORY_BYTES = int(os.getenv("PDF2TRAIN_SESSION_GLOBAL_MEMORY_BYTES", str(128 * 1024 * 1024)))
+SESSION_MAX_DISK_BYTES = int(os.getenv("PDF2TRAIN_SESSION_MAX_DISK_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+# Extraction cache settings
+CACHE_DIR = os.getenv("PDF2TRAIN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pdf2train_cache"))
+CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("PDF2TRAIN_CACHE_MAX_MEMORY_ENTRIES", "64"))
+CACHE_MAX_DISK_BYTES = int(os.getenv("PDF2TRAIN_CACHE_MAX_DISK_BYTES", str(256 * 1024 * 1024)))
+
+# Near-duplicate detection settings
+DEDUP_INDEX_PATH = os.getenv("PDF2TRAIN_DEDUP_INDEX_PATH", os.path.join(CACHE_DIR, "dedup.sqlite3"))
+# Fingerprints at most this many bits apart (of 64) are near duplicates; up to 7 is found exhaustively,
+# a negative value turns detection off
+DEDUP_MAX_DISTANCE = int(os.getenv("PDF2TRAIN_DEDUP_MAX_DISTANCE", "7"))
+DEDUP_MAX_PAGES = int(os.getenv("PDF2TRAIN_DEDUP_MAX_PAGES", "8"))
+# Below this many words the text layer is too thin to compare, so the first page image is hashed instead
+DEDUP_MIN_WORDS = int(os.getenv("PDF2TRAIN_DEDUP_MIN_WORDS", "50"))
+# Whether batches, the CLI and the HTTP service answer a near duplicate with its earlier extraction (0 = off:
+# they extract it and only name the match in `duplicate_of`). Page-image matches are never reused unasked,
+# as templated reports share a first page
+DEDUP_AUTO_REUSE = int(os.getenv("PDF2TRAIN_DEDUP_AUTO_REUSE", "0"))
+
+# Report search index settings
+REPORT_INDEX_PATH = os.getenv("PDF2TRAIN_REPORT_INDEX_PATH", os.path.join(CACHE_DIR, "reports.sqlite3"))
+REPORT_INDEX_FETCH_WORKERS = int(os.getenv("PDF2TRAIN_REPORT_INDEX_FETCH_WORKERS", "16"))
+
+# Report post-processing settings
+# Link filled in for a report whose "Link do relatório" is a placeholder, formatted with the report's ISO
+# {date} and its {category} as a slug, e.g. "https://example.com/trendspot/{category}/{date}"; empty keeps
+# the placeholder
+REPORT_LINK_TEMPLATE = os.getenv("PDF2TRAIN_REPORT_LINK_TEMPLATE", "")
+# A report with fewer quadros than this is flagged for review
+REPORT_MIN_QUADROS = int(os.getenv("PDF2TRAIN_REPORT_MIN_QUADROS", "1"))
+
+# HTTP service settings
+SERVER_HOST = os.getenv("PDF2TRAIN_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PDF2TRAIN_SERVER_PORT", "8080"))
+SERVER_QUEUE_SIZE = int(os.getenv("PDF2TRAIN_SERVER_QUEUE_SIZE", "100"))
+SERVER_MAX_UPLOAD_BYTES = int(os.getenv("PDF2TRAIN_SERVER_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+SERVER_MAX_JOBS = int(os.getenv("PDF2TRAIN_SERVER_MAX_JOBS", "1000"))
+
+# Startup settings
+# Before taking traffic, import the SDKs, build the shared clients and open the local stores (0 = off)
+STARTUP_WARMUP = int(os.getenv("PDF2TRAIN_STARTUP_WARMUP", "1"))
+# Also send one request to Cloud Storage and one to Gemini, so auth and TLS are done on boot (0 = off)
+STARTUP_CONNECT = int(os.getenv("PDF2TRAIN_STARTUP_CONNECT", "1"))
+STREAMLIT_PORT = int(os.getenv("PDF2TRAIN_STREAMLIT_PORT", "8501"))
+
+# Durable job queue settings
+JOBS_DIR = os.getenv("PDF2TRAIN_JOBS_DIR", os.path.join(tempfile.gettempdir(), "pdf2train_jobs"))
+JOBS_DB_PATH = os.path.join(JOBS_DIR, "jobs.sqlite3")
+# Worker processes started by the Streamlit app; 0 leaves the queue to `python -m pdf2train worker`,
+# or to the app itself when a job waits JOB_CLAIM_TIMEOUT and no worker has sent a heartbeat for as long
+JOB_WORKERS = int(os.getenv("PDF2TRAIN_JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("PDF2TRAIN_JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("PDF2TRAIN_JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("PDF2TRAIN_JOB_POLL_INTERVAL", "0.5"))
+JOB_PARTIAL_FLUSH_INTERVAL = float(os.getenv("PDF2TRAIN_JOB_PARTIAL_FLUSH_INTERVAL", "0.5"))
+JOB_RETENTION = float(os.getenv("PDF2TRAIN_JOB_RETENTION", str(24 * 3600)))
+# Seconds a runnable job may wait unclaimed, with no live worker, before the app runs it in its own process
+JOB_CLAIM_TIMEOUT = float(os.getenv("PDF2TRAIN_JOB_CLAIM_TIMEOUT", "15"))
+# Seconds between the heartbeats a worker sends while it consumes the queue; keep it well under JOB_CLAIM_TIMEOUT
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("PDF2TRAIN_JOB_HEARTBEAT_INTERVAL", "5"))
+
+# Gemini quota protection, shared by every session and worker process on the host
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("PDF2TRAIN_GEMINI_REQUESTS_PER_MINUTE", "120"))
+GEMINI_BURST = int(os.getenv("PDF2TRAIN_GEMINI_BURST", "10"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("PDF2TRAIN_GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_MAX_RETRIES = int(os.getenv("PDF2TRAIN_GEMINI_MAX_RETRIES", "5"))
+GEMINI_RETRY_BASE = float(os.getenv("PDF2TRAIN_GEMINI_RETRY_BASE", "1.0"))
+GEMINI_RETRY_MAX = float(os.getenv("PDF2TRAIN_GEMINI_RETRY_MAX", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("PDF2TRAIN_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("PDF2TRAIN_CIRCUIT_RESET_TIMEOUT", "30"))
+QUOTA_STATE_PATH = os.getenv(
+    "PDF2TRAIN_QUOTA_STATE_PATH", os.path.join(tempfile.gettempdir(), "pdf2train_quota.json")
+)
+
+# Telemetry settings
+# Span exporters: "json" (one JSON line per span on stderr), "none" or "package.module:factory", comma separated.
+# Off by default: span durations are in the Prometheus metrics either way
+SPAN_EXPORTERS = os.getenv("PDF2TRAIN_SPAN_EXPORTERS", "none")
+METRICS_DIR = os.getenv("PDF2TRAIN_METRICS_DIR", os.path.join(tempfile.gettempdir(), "pdf2train_metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("PDF2TRAIN_METRICS_FLUSH_INTERVAL", "5"))
+# Seconds without a flush after which a process's snapshot counts as left by an exited process and is retired
+METRICS_STALE_AFTER = float(os.getenv("PDF2TRAIN_METRICS_STALE_AFTER", "600"))
+# When set, the Streamlit app also serves /metrics on this port (0 = off; see `python -m pdf2train metrics`)
+METRICS_PORT = int(os.getenv("PDF2TRAIN_METRICS_PORT", "0"))
+# USD per million (prompt, output) tokens, used to estimate cost per model
+MODEL_PRICES = {
+    MODEL_FAST: (
+        float(os.getenv("PDF2TRAIN_GEMINI_FAST_PRICE_INPUT", "0.075")),
+        float(os.getenv("PDF2TRAIN_GEMINI_FAST_PRICE_OUTPUT", "0.30")),
+    ),
+    MODEL_STRONG: (
+        float(os.getenv("PDF2TRAIN_GEMINI_STRONG_PRICE_INPUT", "1.25")),
+        float(os.getenv("PDF2TRAIN_GEMINI_STRONG_PRICE_OUTPUT", "10.00")),
+    ),
+    MODEL_NAME: (
+        float(os.getenv("PDF2TRAIN_GEMINI_PRICE_INPUT", "0.10")),
+        float(os.getenv("PDF2TRAIN_GEMINI_PRICE_OUTPUT", "0.40")),
+    ),
+}
+# Share of the input price billed for prompt tokens served from a cached content
+CACHED_INPUT_PRICE_FACTOR = float(os.getenv("PDF2TRAIN_GEMINI_CACHED_INPUT_PRICE_FACTOR", "0.25"))
+
+# Batch processing settings
+BATCH_MAX_WORKERS = int(os.getenv("PDF2TRAIN_BATCH_MAX_WORKERS", "4"))
+# Model calls are already paced and retried by the shared quota guard (GEMINI_* settings above), so by
+# default batches add neither; batch retries never repeat the 429s, 5xx or open circuits the guard gave up on
+BATCH_REQUESTS_PER_MINUTE = float(os.getenv("PDF2TRAIN_BATCH_REQUESTS_PER_MINUTE", "0"))
+BATCH_MAX_RETRIES = int(os.getenv("PDF2TRAIN_BATCH_MAX_RETRIES", "0"))
+BATCH_RETRY_BACKOFF = float(os.getenv("PDF2TRAIN_BATCH_RETRY_BACKOFF", "2.0"))
+
+# System instructions for the AI model
+SYSTEM_INSTRUCTIONS = """O usuário irá anexar um arquivo pdf de um relatório chamado trendspot.
+Extraia as informações dos relatórios no seguinte formato:
+Nome : Trendspot do dia "data que aparece no inicio do arquivo"
+Categoria : "categoria que aparece logo abaixo da data", podendo ser "Beleza", "Alimentação" ou outro
+Link do relatório : "link para o relatório no site do trendspot"
+****************************************************************
+Com Potencial de Crescimento: Os 2 primeiros quadros do relatório (Os que estão dentro da área com findo cinza escuro)
+Em Destaque: Os demais quadros
+Para Aproveitar Agora: Informações na área em cinza escuro na parte inferior do relatório.
+
+Observações:
+Para cada quadro extraia o título e a descrição, além do tipo, que aparece na parte inferior do quadro ("Áudio", "Produto"...)
+Para deixe uma linha com a informação "Link : Insira o link aqui"
+Retorne somente o que está sendo pedido, nenhuma informação a mais.
+Não retorne no formato MArkdown
+Separe cada informação com uma linha e com ***********************************************
+"""
+
+# User prompt of a hybrid request, which carries the report as text instead of the PDF
+HYBRID_PROMPT = """Avalie o relatório abaixo, extraído da camada de texto do PDF.
+Cada bloco está marcado com a página e a posição: "[Área escura, topo]" são os quadros dentro da área
+cinza escuro do início (Com Potencial de Crescimento), "[Área escura, rodapé]" é a faixa cinza escuro
+da parte inferior (Para Aproveitar Agora) e "[Bloco]" são os demais quadros e textos.
+As imagens anexadas são recortes de partes do relatório sem texto."""
+
+# System instructions for structured (JSON) extraction
+STRUCTURED_SYSTEM_INSTRUCTIONS = """O usuário irá anexar um arquivo pdf de um relatório chamado trendspot.
+Extraia as informações do relatório no esquema JSON fornecido:
+report_date: data que aparece no inicio do arquivo
+category: categoria que aparece logo abaixo da data, podendo ser "Beleza", "Alimentação" ou outro
+report_link: link para o relatório no site do trendspot, ou "" se não houver
+quadros: todos os quadros do relatório, na ordem em que aparecem. Para cada quadro:
+  section: "Com Potencial de Crescimento" para os 2 primeiros quadros (os que estão dentro da área com fundo cinza escuro) e "Em Destaque" para os demais
+  title: título do quadro
+  description: descrição do quadro
+  type: tipo que aparece na parte inferior do quadro ("Áudio", "Produto"...)
+  link: ""
+para_aproveitar_agora: informações na área em cinza escuro na parte inferior do relatório
+Retorne somente o que está sendo pedido, nenhuma informação a mais.
+"""
+
+# Sent after the partial answer when a free-text stream is resumed after an error
+RESUME_PROMPT = (
+    "A resposta anterior foi interrompida. Continue exatamente de onde ela parou, "
+    "sem repetir nada do que já foi escrito."
+)
+
+# Appended to the structured instructions when a PDF is extracted in page ranges
+SHARD_INSTRUCTIONS = """
+Este arquivo contém somente as páginas {first_page} a {last_page} de um relatório maior.
+Extraia apenas os quadros presentes nestas páginas. Use "Com Potencial de Crescimento" somente
+para quadros que estão dentro da área com fundo cinza escuro; os demais são "Em Destaque".
+Se a data, a categoria, o link ou a área "Para Aproveitar Agora" não aparecerem nestas páginas, retorne "".
+"""
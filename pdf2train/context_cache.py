@@ -0,0 +1,174 @@
+"""Server-side context caching of the system instructions shared by every request.
+
+Every extraction starts with the same system instructions. Gemini can keep
+such a prefix as a cached content: requests then reference it by name, and
+its tokens are billed at a discount instead of being sent and processed
+again. A cached content lives until its TTL runs out, so the handle is
+refreshed while it is in use and recreated once it has expired. Requests fall
+back to sending the instructions inline whenever there is no live handle.
+The model refuses to cache prefixes below a minimum size, so shorter
+instructions are never sent to the cache at all.
+"""
+import hashlib
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+from .config import CONTEXT_CACHE_MIN_TOKENS, CONTEXT_CACHE_RETRY, CONTEXT_CACHE_TTL, MODEL_NAME
+
+# Characters per token, to size the prefix without a count_tokens round trip
+_CHARS_PER_TOKEN = 4
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+@dataclass
+class CachedPrefix:
+    """A live cached content and when the server will drop it."""
+    
+    name: str
+    expires_at: float
+    tokens: int = None
+
+
+def is_cache_miss(exc):
+    """Whether a request failed because the cached content it referenced is gone."""
+    code = getattr(exc, "code", None)
+    return code in (400, 403, 404) and "cache" in str(exc).lower()
+
+
+class ContextCache:
+    """Cached contents of the system instructions, one per model and set of instructions, kept alive while used."""
+    
+    def __init__(self, client, model=MODEL_NAME, ttl=CONTEXT_CACHE_TTL, min_tokens=CONTEXT_CACHE_MIN_TOKENS,
+                 retry_after=CONTEXT_CACHE_RETRY):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+        self._entries = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.ttl > 0
+    
+    def cacheable(self, system_instructions):
+        """Whether the instructions are long enough for the model to accept them as a cached content."""
+        return self.enabled and len(system_instructions) // _CHARS_PER_TOKEN >= self.min_tokens
+    
+    @staticmethod
+    def _key(model, system_instructions):
+        return hashlib.sha256(f"{model}\0{system_instructions}".encode("utf-8")).hexdigest()
+    
+    def get(self, system_instructions, model=None):
+        """
+        Name of a live cached content holding `system_instructions` for `model`.
+        
+        Creates the cached content on first use and extends its TTL once less
+        than a fifth of it is left. A cached content only serves the model it
+        was created for, so each routed model gets its own.
+        
+        Returns:
+            str: Cached content name, or None to send the instructions inline
+        """
+        if not self.cacheable(system_instructions):
+            return None
+        model = model or self.model
+        key = self._key(model, system_instructions)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at - time.time() > self.ttl / 5:
+            return entry.name
+        
+        from .telemetry import get_telemetry
+        
+        # Concurrent requests wait for one creation instead of each creating a cached content
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at - now > self.ttl / 5:
+                return entry.name
+            if now - self._failures.get(key, float("-inf")) < self.retry_after:
+                return None
+            event = "refreshed"
+            try:
+                entry = self._refresh(entry) if entry is not None and entry.expires_at > now else None
+            except Exception:
+                # Expired or deleted meanwhile; a new one is created below
+                entry = None
+            try:
+                if entry is None:
+                    event = "created"
+                    entry = self._create(system_instructions, model)
+            except Exception:
+                self._entries.pop(key, None)
+                self._failures[key] = now
+                get_telemetry().inc("pdf2train_context_cache_events_total", event="failed")
+                return None
+            get_telemetry().inc("pdf2train_context_cache_events_total", event=event)
+            self._entries[key] = entry
+            self._failures.pop(key, None)
+            return entry.name
+    
+    def _create(self, system_instructions, model):
+        from google.genai import types
+        
+        from .telemetry import span
+        
+        with span("gemini.cache_create", model=model) as create_span:
+            cached = self.client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=types.Content(role="user", parts=[types.Part.from_text(system_instructions)]),
+                    display_name="pdf2train-system-instructions",
+                    ttl=f"{int(self.ttl)}s",
+                ),
+            )
+            tokens = getattr(getattr(cached, "usage_metadata", None), "total_token_count", None)
+            create_span.set(tokens=tokens)
+        return CachedPrefix(cached.name, time.time() + self.ttl, tokens)
+    
+    def _refresh(self, entry):
+        from google.genai import types
+        
+        self.client.caches.update(name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl)}s"))
+        return CachedPrefix(entry.name, time.time() + self.ttl, entry.tokens)
+    
+    def invalidate(self, name):
+        """Forget a cached content a request found missing, so the next one is created afresh."""
+        from .telemetry import get_telemetry
+        
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.name == name:
+                    del self._entries[key]
+        get_telemetry().inc("pdf2train_context_cache_events_total", event="expired")
+    
+    def close(self):
+        """Delete the cached contents created here rather than paying for their storage until the TTL ends."""
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                self.client.caches.delete(name=entry.name)
+            except Exception:
+                # Already expired; the TTL would have removed it anyway
+                pass
+    
+    def stats(self):
+        """Live cached contents and their seconds left."""
+        now = time.time()
+        return {entry.name: round(entry.expires_at - now) for entry in self._entries.values()}
+
+
+def get_context_cache(client):
+    """Context cache shared by every GeminiClient built on the same genai client."""
+    with _caches_lock:
+        cache = _caches.get(client)
+        if cache is None:
+            cache = _caches[client] = ContextCache(client)
+        return cache
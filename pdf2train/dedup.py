@@ -0,0 +1,286 @@
+"""Near-duplicate detection of PDFs before they reach the model.
+
+A document is fingerprinted by a 64-bit SimHash of its text layer or, for
+scanned PDFs without one, a difference hash of its first page image. Re-exports
+and re-uploads of the same report land within a few bits of each other, while
+unrelated reports differ in around half of them. The index splits every
+fingerprint into eight 8-bit bands and looks candidates up by band: two
+fingerprints at most seven bits apart always share a band, so a lookup is a
+handful of indexed queries however many reports are stored.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .config import (
+    DEDUP_INDEX_PATH,
+    DEDUP_MAX_DISTANCE,
+    DEDUP_MAX_PAGES,
+    DEDUP_MIN_WORDS,
+    THUMBNAIL_TIMEOUT,
+)
+
+_BITS = 64
+_BANDS = 8
+_BAND_BITS = _BITS // _BANDS
+_BAND_COLUMNS = [f"band{band}" for band in range(_BANDS)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    cache_key TEXT PRIMARY KEY,
+    variant TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    {bands},
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+{indexes}
+""".format(
+    bands=",\n    ".join(f"{column} INTEGER NOT NULL" for column in _BAND_COLUMNS),
+    indexes="\n".join(
+        f"CREATE INDEX IF NOT EXISTS fingerprints_{column} ON fingerprints (kind, variant, {column});"
+        for column in _BAND_COLUMNS
+    ),
+)
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """64-bit fingerprint; `kind` is "text" (SimHash) or "image" (dHash), which are never compared."""
+    
+    kind: str
+    value: int
+    
+    def distance(self, other):
+        return bin(self.value ^ other.value).count("1")
+
+
+@dataclass
+class DuplicateMatch:
+    """A previously extracted document close to the one being looked up."""
+    
+    cache_key: str
+    name: str
+    distance: int
+    # Kind of the fingerprints that matched, "text" or "image"
+    kind: str = "text"
+    
+    @property
+    def similarity(self):
+        return 1 - self.distance / _BITS
+
+
+def text_layer(document, max_pages=DEDUP_MAX_PAGES):
+    """Embedded text of the first `max_pages` pages, or "" if it cannot be read."""
+    from pypdf import PdfReader
+    
+    try:
+        reader = PdfReader(document.open())
+        return "\n".join(page.extract_text() or "" for page in reader.pages[:max_pages])
+    except Exception:
+        return ""
+
+
+def simhash(words, shingle_size=3):
+    """SimHash over overlapping word shingles, so edits only move the bits they touch."""
+    weights = [0] * _BITS
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(_BITS) if weights[bit] > 0)
+
+
+def image_hash(document):
+    """
+    Difference hash of the first page, rendered by poppler as a 9x8 grey image.
+    
+    Returns:
+        int: 64-bit hash, or None if poppler could not render the page
+    """
+    command = ["pdftoppm", "-f", "1", "-l", "1", "-singlefile", "-gray",
+               "-scale-to-x", "9", "-scale-to-y", "8", "-"]
+    try:
+        result = subprocess.run(
+            command, input=document.data, capture_output=True, timeout=THUMBNAIL_TIMEOUT, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    # Binary PGM: "P5", width, height and maxval separated by whitespace, then one byte per pixel
+    fields = result.stdout.split(maxsplit=4)
+    if len(fields) < 5 or fields[0] != b"P5" or fields[1:3] != [b"9", b"8"]:
+        return None
+    pixels = fields[4][:72]
+    if len(pixels) < 72:
+        return None
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            value = value << 1 | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return value
+
+
+def fingerprint(document, max_pages=DEDUP_MAX_PAGES, min_words=DEDUP_MIN_WORDS):
+    """
+    Fingerprint a PDF by its text layer, falling back to its first page image.
+    
+    Returns:
+        Fingerprint: The fingerprint, or None if the PDF has neither
+    """
+    words = re.findall(r"\w+", text_layer(document, max_pages).lower())
+    if len(words) >= min_words:
+        return Fingerprint("text", simhash(words))
+    value = image_hash(document)
+    return Fingerprint("image", value) if value is not None else None
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << _BITS) if value >= 1 << (_BITS - 1) else value
+
+
+def _bands(value):
+    return [value >> (band * _BAND_BITS) & ((1 << _BAND_BITS) - 1) for band in range(_BANDS)]
+
+
+class DuplicateIndex:
+    """SQLite index of the fingerprints of every extracted document."""
+    
+    def __init__(self, db_path=DEDUP_INDEX_PATH, max_distance=DEDUP_MAX_DISTANCE, memo_entries=128):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.memo_entries = memo_entries
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+    
+    @property
+    def enabled(self):
+        return self.max_distance >= 0
+    
+    @staticmethod
+    def variant(model_name, system_instructions):
+        """Extractions are only interchangeable for the same model and instructions."""
+        return hashlib.sha256(f"{model_name}\0{system_instructions}".encode("utf-8")).hexdigest()[:16]
+    
+    def _connection(self):
+        """One connection per thread; SQLite connections must not be shared across threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def fingerprint(self, document):
+        """Fingerprint `document`, remembering recent results by content hash across reruns."""
+        key = document.sha256()
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        
+        from .telemetry import span
+        
+        with span("dedup.fingerprint", document_bytes=document.size) as fingerprint_span:
+            result = fingerprint(document)
+            fingerprint_span.set(kind=result.kind if result is not None else None)
+        with self._memo_lock:
+            self._memo[key] = result
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+        return result
+    
+    def add(self, cache_key, name, fingerprint, variant):
+        """Record the fingerprint of a finished extraction."""
+        if fingerprint is None or not self.enabled:
+            return
+        columns = ["cache_key", "variant", "kind", "value"] + _BAND_COLUMNS + ["name", "created_at"]
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO fingerprints ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            (cache_key, variant, fingerprint.kind, _signed(fingerprint.value),
+             *_bands(fingerprint.value), name, time.time()),
+        )
+    
+    def find(self, fingerprint, variant, exclude=None):
+        """
+        Indexed extractions within `max_distance` bits of `fingerprint`.
+        
+        Args:
+            fingerprint (Fingerprint): Fingerprint of the new document
+            variant (str): `DuplicateIndex.variant` of the extraction setup
+            exclude (str): Cache key to ignore, usually the document's own
+        
+        Returns:
+            list: DuplicateMatch candidates, closest first
+        """
+        if fingerprint is None or not self.enabled:
+            return []
+        query = " UNION ".join(
+            f"SELECT cache_key, name, value FROM fingerprints WHERE kind = ? AND variant = ? AND {column} = ?"
+            for column in _BAND_COLUMNS
+        )
+        parameters = []
+        for band_value in _bands(fingerprint.value):
+            parameters += [fingerprint.kind, variant, band_value]
+        
+        matches = []
+        for cache_key, name, value in self._connection().execute(query, parameters):
+            distance = fingerprint.distance(Fingerprint(fingerprint.kind, value % (1 << _BITS)))
+            if distance <= self.max_distance and cache_key != exclude:
+                matches.append(DuplicateMatch(cache_key, name, distance, fingerprint.kind))
+        return sorted(matches, key=lambda match: match.distance)
+    
+    def remove(self, cache_key):
+        """Forget an extraction, e.g. once it is no longer cached."""
+        self._connection().execute("DELETE FROM fingerprints WHERE cache_key = ?", (cache_key,))
+    
+    def lookup(self, document, variant, cache, exclude=None):
+        """
+        Find a cached extraction of a near duplicate of `document`.
+        
+        Entries whose extraction has left `cache` are dropped on the way.
+        
+        Returns:
+            tuple: (DuplicateMatch, response), or (None, None)
+        """
+        from .telemetry import get_telemetry
+        
+        if not self.enabled:
+            return None, None
+        for match in self.find(self.fingerprint(document), variant, exclude):
+            response = cache.get(match.cache_key)
+            if response is not None:
+                get_telemetry().inc("pdf2train_dedup_lookups_total", result="hit")
+                return match, response
+            self.remove(match.cache_key)
+        get_telemetry().inc("pdf2train_dedup_lookups_total", result="miss")
+        return None, None
+    
+    def stats(self):
+        """Number of indexed extractions."""
+        return {"documents": self._connection().execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]}
+
+
+def get_duplicate_index():
+    """Process-wide near-duplicate index shared by every session and worker."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex()
+        return _index
@@ -0,0 +1,186 @@
+"""Zero-copy PDF handles and first-page thumbnails."""
+import hashlib
+import io
+import mmap
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .config import THUMBNAIL_CACHE_ENTRIES, THUMBNAIL_DPI, THUMBNAIL_MAX_SIZE, THUMBNAIL_TIMEOUT, THUMBNAIL_WORKERS
+
+_thumbnail_service = None
+_thumbnail_service_lock = threading.Lock()
+
+
+class _MemoryviewReader(io.RawIOBase):
+    """Raw stream over a memoryview, so uploads can read the PDF without copying it."""
+    
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+    
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self._view) - self._position)
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+
+class PdfDocument:
+    """Read-only handle over PDF bytes that avoids copying the upload."""
+    
+    def __init__(self, data, path=None):
+        self.data = memoryview(data)
+        self.path = path
+        self._digest = None
+    
+    @classmethod
+    def from_upload(cls, uploaded_file):
+        """Wrap a Streamlit upload, sharing its in-memory buffer."""
+        from .telemetry import span
+        
+        with span("upload.read") as read_span:
+            document = cls(uploaded_file.getbuffer())
+            read_span.set(document_bytes=document.size)
+        return document
+    
+    @classmethod
+    def from_path(cls, path):
+        """Memory-map a PDF on disk."""
+        with open(path, "rb") as pdf_file:
+            if os.fstat(pdf_file.fileno()).st_size == 0:
+                return cls(b"", path=path)
+            mapped = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, path=path)
+    
+    @property
+    def size(self):
+        return self.data.nbytes
+    
+    def sha256(self):
+        """Hex digest of the document bytes."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+    
+    def to_bytes(self):
+        """Copy the document into a bytes object."""
+        return self.data.tobytes()
+    
+    def open(self):
+        """Binary file object reading from the shared buffer."""
+        return io.BufferedReader(_MemoryviewReader(self.data))
+    
+    @contextmanager
+    def as_file(self):
+        """Yield a filesystem path for tools that need one, removing any temp copy afterwards."""
+        if self.path is not None:
+            yield self.path
+            return
+        
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as temp_pdf:
+            temp_pdf.write(self.data)
+            temp_pdf.flush()
+            yield temp_pdf.name
+
+
+class PdfProcessor:
+    """Processor for PDF files."""
+    
+    @staticmethod
+    def open_document(pdf_file):
+        """Wrap an uploaded PDF file in a zero-copy document handle."""
+        return PdfDocument.from_upload(pdf_file)
+    
+    @staticmethod
+    def create_thumbnail(document, max_size=THUMBNAIL_MAX_SIZE, dpi=THUMBNAIL_DPI):
+        """
+        Create a JPEG thumbnail of the first page of a PDF.
+        
+        The PDF is piped to poppler's pdftoppm through stdin and the image read
+        back from stdout, so no temporary files are written.
+        
+        Returns:
+            bytes: JPEG image, or None if poppler could not render the page
+        """
+        command = [
+            "pdftoppm", "-f", "1", "-l", "1", "-singlefile", "-jpeg",
+            "-r", str(dpi), "-scale-to", str(max_size), "-",
+        ]
+        try:
+            result = subprocess.run(
+                command, input=document.data, capture_output=True, timeout=THUMBNAIL_TIMEOUT, check=True
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return result.stdout or None
+
+
+class ThumbnailService:
+    """Render first-page previews on a background pool, cached by content hash."""
+    
+    def __init__(self, max_workers=THUMBNAIL_WORKERS, max_entries=THUMBNAIL_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, document):
+        """
+        Start rendering a document's thumbnail, reusing a cached or in-flight render.
+        
+        Returns:
+            Future: Resolves to the JPEG bytes, or None
+        """
+        key = document.sha256()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            
+            future = self._executor.submit(PdfProcessor.create_thumbnail, document)
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._store(key, done))
+        return future
+    
+    def _store(self, key, future):
+        """Move a finished render from the pending set into the LRU cache."""
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                return
+            self._cache[key] = future.result()
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+
+def get_thumbnail_service():
+    """Process-wide thumbnail renderer shared by every session."""
+    global _thumbnail_service
+    with _thumbnail_service_lock:
+        if _thumbnail_service is None:
+            _thumbnail_service = ThumbnailService()
+        return _thumbnail_service
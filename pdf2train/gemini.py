@@ -0,0 +1,576 @@
+"""Gemini extraction client."""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+import uuid
+
+from .config import (
+    BUCKET_NAME,
+    EXTRACTION_MODE,
+    GEMINI_STREAM_TIMEOUT,
+    HYBRID_PROMPT,
+    INLINE_PDF_MAX_BYTES,
+    LOCATION,
+    PROJECT_ID,
+    RESUME_PROMPT,
+    STAGING_FOLDER,
+)
+
+_safety_settings = None
+_safety_settings_lock = threading.Lock()
+
+
+class GeminiClient:
+    """Client for interacting with Google's Gemini AI model."""
+    
+    def __init__(self, project_id, location, client=None, storage_manager=None, quota_guard=None,
+                 extraction_mode=EXTRACTION_MODE, context_cache=None, router=None):
+        from .context_cache import get_context_cache
+        from .quota import get_quota_guard
+        from .routing import get_model_router
+        
+        self.client = client or build_gemini_client(project_id, location)
+        self.storage_manager = storage_manager
+        self.quota_guard = quota_guard or get_quota_guard()
+        self.extraction_mode = extraction_mode
+        self.context_cache = context_cache or get_context_cache(self.client)
+        self.router = router or get_model_router()
+        self._configs = {}
+    
+    def get_safety_settings(self):
+        """Define safety settings for the model, built once per process since they never change."""
+        global _safety_settings
+        with _safety_settings_lock:
+            if _safety_settings is None:
+                from google.genai import types
+                
+                _safety_settings = [
+                    types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
+                    types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
+                    types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
+                    types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
+                ]
+            return _safety_settings
+    
+    def document_part(self, document):
+        """
+        Build the PDF part, by GCS URI for large documents and inline bytes otherwise.
+        
+        Each request stages its own copy, so deleting it in `release_contents`
+        once the request is over cannot pull it from under another request of
+        the same document.
+        """
+        from google.genai import types
+        
+        if document.size > INLINE_PDF_MAX_BYTES and self.storage_manager is not None:
+            file_uri = self.storage_manager.stage_document(
+                BUCKET_NAME, f"{STAGING_FOLDER}/{document.sha256()}-{uuid.uuid4().hex[:8]}.pdf", document
+            )
+            return types.Part.from_uri(file_uri=file_uri, mime_type="application/pdf")
+        
+        # The SDK needs a bytes object here; this is the only copy of the PDF we make
+        return types.Part.from_bytes(data=document.to_bytes(), mime_type="application/pdf")
+    
+    def hybrid_parts(self, document):
+        """Parts carrying the PDF's text layer and crops instead of the PDF, or None to send the PDF."""
+        from google.genai import types
+        
+        from .layout import extract_layout
+        from .telemetry import span
+        
+        with span("layout.extract", document_bytes=document.size) as layout_span:
+            layout = extract_layout(document)
+            layout_span.set(used=layout is not None)
+            if layout is None:
+                return None
+            layout_span.set(pages=layout.pages, words=layout.words, crops=len(layout.crops),
+                            text_chars=len(layout.text))
+        return [types.Part.from_text(layout.text)] + [
+            types.Part.from_bytes(data=crop, mime_type="image/jpeg") for crop in layout.crops
+        ] + [types.Part.from_text(HYBRID_PROMPT)]
+    
+    def generation_config(self, system_instructions, structured=False, cached_content=None):
+        """
+        Generation config for a request, built once per combination and then reused.
+        
+        With `cached_content`, the system instructions are read from that
+        cached content instead of being sent with the request.
+        """
+        key = (system_instructions, structured, cached_content)
+        config = self._configs.get(key)
+        if config is not None:
+            return config
+        
+        from google.genai import types
+        
+        from .schema import TrendspotReport
+        
+        structured_output = {}
+        if structured:
+            structured_output = {
+                "response_mime_type": "application/json",
+                "response_schema": TrendspotReport,
+            }
+        if cached_content:
+            instructions = {"cached_content": cached_content}
+        else:
+            instructions = {"system_instruction": [types.Part.from_text(system_instructions)]}
+        
+        config = types.GenerateContentConfig(
+            temperature=1,
+            top_p=0.95,
+            max_output_tokens=8192,
+            response_modalities=["TEXT"],
+            safety_settings=self.get_safety_settings(),
+            **instructions,
+            **structured_output,
+        )
+        # Handles of expired cached contents are never asked for again, so drop their configs
+        if len(self._configs) >= 16:
+            self._configs.clear()
+        self._configs[key] = config
+        return config
+    
+    def build_contents(self, document):
+        """Build the request contents for a PDF extraction."""
+        from google.genai import types
+        
+        parts = self.hybrid_parts(document) if self.extraction_mode == "hybrid" else None
+        if parts is None:
+            parts = [self.document_part(document), types.Part.from_text("Avalie o documento anexado")]
+        return [types.Content(role="user", parts=parts)]
+    
+    def release_contents(self, contents):
+        """Delete the PDFs `build_contents` staged in Cloud Storage for a request that is over."""
+        staged = f"gs://{BUCKET_NAME}/{STAGING_FOLDER}/"
+        for content in contents or ():
+            for part in content.parts:
+                file_data = getattr(part, "file_data", None)
+                if file_data is not None and (file_data.file_uri or "").startswith(staged):
+                    self.storage_manager.unstage_document(file_data.file_uri)
+    
+    def build_request(self, document, system_instructions, structured=False):
+        """Build the contents and the (uncached) generation config for a PDF extraction."""
+        return self.build_contents(document), self.generation_config(system_instructions, structured)
+    
+    @staticmethod
+    def continuation(contents, emitted):
+        """Contents that ask the model to carry on after the partial answer `emitted`."""
+        if not emitted:
+            return contents
+        
+        from google.genai import types
+        
+        return contents + [
+            types.Content(role="model", parts=[types.Part.from_text(emitted)]),
+            types.Content(role="user", parts=[types.Part.from_text(RESUME_PROMPT)]),
+        ]
+    
+    @staticmethod
+    def has_text(chunk):
+        """Whether a streamed chunk carries any content parts."""
+        return bool(chunk.candidates and chunk.candidates[0].content.parts)
+    
+    @staticmethod
+    def record_metadata(chunk, metadata):
+        """Copy stream metadata (finish reason, token usage) from a chunk into `metadata`."""
+        if metadata is None:
+            return
+        if chunk.candidates and chunk.candidates[0].finish_reason:
+            metadata["finish_reason"] = chunk.candidates[0].finish_reason
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage is not None:
+            # Usage is cumulative within a response, so the last chunk carries the totals
+            metadata["usage"] = {
+                "prompt_tokens": usage.prompt_token_count or 0,
+                "output_tokens": usage.candidates_token_count or 0,
+                "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+            }
+    
+    @staticmethod
+    def account_usage(model, metadata, request_span):
+        """Move the usage of a finished attempt into the token metrics and the running totals."""
+        from .telemetry import estimate_cost, get_telemetry
+        
+        usage = metadata.pop("usage", None)
+        if not usage:
+            return
+        get_telemetry().record_usage(model, **usage)
+        request_span.add(**usage)
+        totals = metadata.setdefault("tokens", {"prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0})
+        for kind, count in usage.items():
+            totals[kind] = totals.get(kind, 0) + count
+        metadata["cost_usd"] = metadata.get("cost_usd", 0.0) + estimate_cost(model, **usage)
+    
+    @staticmethod
+    def observe_first_chunk(model, request_span, start):
+        from .telemetry import get_telemetry
+        
+        time_to_first_chunk = time.perf_counter() - start
+        request_span.set(time_to_first_chunk=round(time_to_first_chunk, 4))
+        get_telemetry().observe("pdf2train_gemini_time_to_first_chunk_seconds", time_to_first_chunk, model=model)
+    
+    @staticmethod
+    def is_truncated(metadata):
+        """Whether the stream stopped because it hit max_output_tokens."""
+        return metadata.get("finish_reason") == "MAX_TOKENS"
+    
+    @property
+    def model_key(self):
+        """Model part of extraction cache keys; it changes whenever routing may pick another model."""
+        return self.router.signature
+    
+    def rejection(self, response, structured, metadata):
+        """Why a speculative response must be escalated, or None to keep it."""
+        from .routing import check_extraction
+        
+        if self.is_truncated(metadata):
+            return "truncated"
+        return check_extraction(response, structured)
+    
+    @staticmethod
+    def settle_speculation(response, reason, attempt, metadata):
+        """
+        Fold a speculative attempt into the request's `metadata`.
+        
+        Its tokens and cost count whether or not it is kept.
+        
+        Returns:
+            str: The response if it was accepted, else None
+        """
+        totals = metadata.setdefault("tokens", {"prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0})
+        for kind, count in attempt.get("tokens", {}).items():
+            totals[kind] = totals.get(kind, 0) + count
+        metadata["cost_usd"] = metadata.get("cost_usd", 0.0) + attempt.get("cost_usd", 0.0)
+        if reason is not None:
+            return None
+        metadata.update(model=attempt.get("model"), finish_reason=attempt.get("finish_reason"))
+        return response
+    
+    def process_pdf(self, document, system_instructions, structured=False, metadata=None):
+        """
+        Process a PDF document with Gemini AI model.
+        
+        With `structured=True` the model streams JSON matching TrendspotReport.
+        If `metadata` is a dict, it receives the stream's "finish_reason", its
+        token totals under "tokens", the estimated "cost_usd", the "route" and
+        the "model" that answered. Quota and availability errors are retried by
+        the quota guard; a free-text stream that fails midway continues where
+        it stopped.
+        
+        The router picks the model. On a speculative route the fast model's
+        response is yielded whole once it holds up as a Trendspot report, and
+        the route's model streams the extraction otherwise.
+        """
+        from .telemetry import span
+        
+        metadata = metadata if metadata is not None else {}
+        start = time.perf_counter()
+        route = self.router.route(document)
+        metadata["route"] = route.name
+        outcome = "failed"
+        contents = None
+        try:
+            with span("gemini.build_request", route=route.name, pages=route.pages):
+                contents = self.build_contents(document)
+            if route.speculative_model:
+                response = self.speculate(route, document, contents, system_instructions, structured, metadata)
+                if response is not None:
+                    outcome = "accepted"
+                    yield response
+                    return
+            yield from self.stream_model(route.model, document, contents, system_instructions, structured, metadata)
+            outcome = "escalated" if route.speculative_model else "ok"
+        finally:
+            self.release_contents(contents)
+            self.router.record(route, outcome, time.perf_counter() - start, metadata.get("cost_usd", 0.0))
+    
+    def speculate(self, route, document, contents, system_instructions, structured, metadata):
+        """Run the route's fast model to completion; returns its response if it is kept, else None."""
+        from .telemetry import span
+        
+        attempt = {}
+        with span("gemini.speculate", route=route.name, model=route.speculative_model) as speculate_span:
+            try:
+                response = "".join(self.stream_model(
+                    route.speculative_model, document, contents, system_instructions, structured, attempt
+                ))
+                reason = self.rejection(response, structured, attempt)
+            except Exception as exc:
+                # Whatever stopped the fast model, the stronger one may still get through
+                response, reason = None, type(exc).__name__
+            speculate_span.set(accepted=reason is None, reason=reason)
+        return self.settle_speculation(response, reason, attempt, metadata)
+    
+    def stream_model(self, model, document, contents, system_instructions, structured, metadata):
+        """Stream one model's extraction of the prepared `contents`."""
+        from .context_cache import is_cache_miss
+        from .telemetry import span
+        
+        metadata["model"] = model
+        start = time.perf_counter()
+        with span("gemini.request", model=model, structured=structured,
+                  document_bytes=document.size) as request_span:
+            def stream_once(emitted, cached_content):
+                try:
+                    for chunk in self.client.models.generate_content_stream(
+                        model=model,
+                        contents=self.continuation(contents, emitted),
+                        config=self.generation_config(system_instructions, structured, cached_content),
+                    ):
+                        self.record_metadata(chunk, metadata)
+                        if not self.has_text(chunk):
+                            continue
+                        yield chunk.text
+                finally:
+                    self.account_usage(model, metadata, request_span)
+            
+            def open_stream(emitted):
+                cached_content = self.context_cache.get(system_instructions, model)
+                request_span.set(context_cache="cached" if cached_content else "inline")
+                received = False
+                try:
+                    for text in stream_once(emitted, cached_content):
+                        received = True
+                        yield text
+                except Exception as exc:
+                    # An expired cached content fails the request before any output; resend the instructions inline
+                    if received or cached_content is None or not is_cache_miss(exc):
+                        raise
+                    self.context_cache.invalidate(cached_content)
+                    request_span.set(context_cache="fallback")
+                    yield from stream_once(emitted, None)
+            
+            chunks = 0
+            # A JSON document cannot be continued by a second response, so structured streams restart instead
+            for text in self.quota_guard.stream(open_stream, resumable=not structured):
+                if not chunks:
+                    self.observe_first_chunk(model, request_span, start)
+                chunks += 1
+                yield text
+            request_span.set(chunks=chunks, finish_reason=str(metadata.get("finish_reason")))
+    
+    async def process_pdf_async(self, document, system_instructions, timeout=GEMINI_STREAM_TIMEOUT,
+                                structured=False, metadata=None):
+        """
+        Process a PDF document on the genai async client.
+        
+        The whole stream, speculation and retries included, must finish within
+        `timeout` seconds, otherwise asyncio.TimeoutError is raised. Cancelling
+        the consuming task closes the underlying stream. Routing and `metadata`
+        work as in `process_pdf`.
+        """
+        from .telemetry import span
+        
+        metadata = metadata if metadata is not None else {}
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Counting pages parses the PDF, so routing stays off the event loop like the request building
+        route = await asyncio.to_thread(self.router.route, document)
+        metadata["route"] = route.name
+        outcome = "failed"
+        contents = None
+        try:
+            with span("gemini.build_request", route=route.name, pages=route.pages):
+                contents = await asyncio.to_thread(self.build_contents, document)
+            if route.speculative_model:
+                response = await self.speculate_async(
+                    route, document, contents, system_instructions, structured, metadata, deadline
+                )
+                if response is not None:
+                    outcome = "accepted"
+                    yield response
+                    return
+            stream = self.stream_model_async(
+                route.model, document, contents, system_instructions, structured, metadata, deadline
+            )
+            try:
+                async for text in stream:
+                    yield text
+            finally:
+                await stream.aclose()
+            outcome = "escalated" if route.speculative_model else "ok"
+        finally:
+            self.router.record(route, outcome, time.perf_counter() - start, metadata.get("cost_usd", 0.0))
+            # Staged blobs are deleted on a thread, as they were uploaded
+            if contents is not None:
+                await asyncio.to_thread(self.release_contents, contents)
+    
+    async def speculate_async(self, route, document, contents, system_instructions, structured, metadata, deadline):
+        """Async counterpart of `speculate`, bound by the request's `deadline`."""
+        from .telemetry import span
+        
+        attempt = {}
+        with span("gemini.speculate", route=route.name, model=route.speculative_model) as speculate_span:
+            try:
+                response = "".join([text async for text in self.stream_model_async(
+                    route.speculative_model, document, contents, system_instructions, structured, attempt, deadline
+                )])
+                reason = self.rejection(response, structured, attempt)
+            except asyncio.TimeoutError:
+                # The deadline covers the whole request, so there is no time left to escalate
+                raise
+            except Exception as exc:
+                response, reason = None, type(exc).__name__
+            speculate_span.set(accepted=reason is None, reason=reason)
+        return self.settle_speculation(response, reason, attempt, metadata)
+    
+    async def stream_model_async(self, model, document, contents, system_instructions, structured, metadata,
+                                 deadline):
+        """Stream one model's extraction on the async client, giving up at `deadline` (event loop time)."""
+        from .context_cache import is_cache_miss
+        from .telemetry import span
+        
+        metadata["model"] = model
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with span("gemini.request", model=model, structured=structured,
+                  document_bytes=document.size) as request_span:
+            async def stream_once(emitted, cached_content):
+                stream = self.client.aio.models.generate_content_stream(
+                    model=model,
+                    contents=self.continuation(contents, emitted),
+                    config=self.generation_config(system_instructions, structured, cached_content),
+                )
+                # Newer genai releases return an awaitable that resolves to the iterator
+                if inspect.isawaitable(stream):
+                    stream = await asyncio.wait_for(stream, max(deadline - loop.time(), 0))
+                
+                iterator = stream.__aiter__()
+                try:
+                    while True:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError("Gemini stream exceeded its deadline")
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            break
+                        self.record_metadata(chunk, metadata)
+                        if not self.has_text(chunk):
+                            continue
+                        yield chunk.text
+                finally:
+                    self.account_usage(model, metadata, request_span)
+                    aclose = getattr(iterator, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+            
+            async def open_stream(emitted):
+                cached_content = None
+                if self.context_cache.cacheable(system_instructions):
+                    # Creating or refreshing the cached content is a blocking call
+                    cached_content = await asyncio.to_thread(self.context_cache.get, system_instructions, model)
+                request_span.set(context_cache="cached" if cached_content else "inline")
+                received = False
+                attempt = stream_once(emitted, cached_content)
+                try:
+                    async for text in attempt:
+                        received = True
+                        yield text
+                except Exception as exc:
+                    if received or cached_content is None or not is_cache_miss(exc):
+                        raise
+                    self.context_cache.invalidate(cached_content)
+                    request_span.set(context_cache="fallback")
+                    attempt = stream_once(emitted, None)
+                    async for text in attempt:
+                        yield text
+                finally:
+                    await attempt.aclose()
+            
+            chunks = 0
+            stream = self.quota_guard.astream(open_stream, resumable=not structured)
+            try:
+                async for text in stream:
+                    if not chunks:
+                        self.observe_first_chunk(model, request_span, start)
+                    chunks += 1
+                    yield text
+            finally:
+                await stream.aclose()
+            request_span.set(chunks=chunks, finish_reason=str(metadata.get("finish_reason")))
+
+
+def build_gemini_client(project_id=PROJECT_ID, location=LOCATION):
+    """Vertex AI genai client on the pooled session; the SDK is imported on first use to keep startup fast."""
+    from google import genai
+    
+    from .storage import build_http_session
+    
+    session = build_http_session()
+    client = genai.Client(vertexai=True, project=project_id, location=location, credentials=session.credentials)
+    use_http_session(client, session)
+    return client
+
+
+# google-genai releases whose private transport use_http_session is written against; pinned in requirements.txt
+PATCHED_GENAI_VERSIONS = ("0.4.0",)
+
+
+def _transport_matches(api_client):
+    """Whether the SDK's private request method and response type have the shape the replacement mimics."""
+    from google import genai
+    
+    if getattr(genai, "__version__", None) not in PATCHED_GENAI_VERSIONS:
+        return False
+    try:
+        from google.genai import _api_client, errors
+        
+        request_parameters = list(inspect.signature(api_client._request).parameters)
+        response_parameters = list(inspect.signature(_api_client.HttpResponse).parameters)
+    except (ImportError, AttributeError, TypeError, ValueError):
+        return False
+    return (
+        request_parameters == ["http_request", "stream"]
+        and response_parameters == ["headers", "response_stream"]
+        and hasattr(_api_client, "RequestJsonEncoder")
+        and hasattr(errors.APIError, "raise_for_response")
+    )
+
+
+def use_http_session(client, session):
+    """
+    Send the requests of the genai `client` through the pooled `session`.
+    
+    The SDK opens a new AuthorizedSession, and with it a new TLS connection,
+    for every request and takes no transport options that would change that.
+    This replaces its private request method with the same request on
+    `session`, so sync and async calls (which run the sync one on a thread)
+    reuse the keep-alive connections of its pool. Clients not on Vertex AI,
+    and SDK versions other than PATCHED_GENAI_VERSIONS or whose transport
+    changed shape, keep the SDK's own transport.
+    """
+    import json
+    
+    from google import genai
+    
+    api_client = getattr(client, "_api_client", None)
+    if not getattr(api_client, "vertexai", False) or not hasattr(api_client, "_request"):
+        return client
+    if not _transport_matches(api_client):
+        logging.getLogger(__name__).warning(
+            "google-genai %s is not one of %s; requests use the SDK's own transport, without connection pooling",
+            getattr(genai, "__version__", "?"), ", ".join(PATCHED_GENAI_VERSIONS),
+        )
+        return client
+    
+    from google.genai import _api_client, errors
+    
+    def request(http_request, stream=False):
+        response = session.request(
+            http_request.method.upper(),
+            http_request.url,
+            headers=http_request.headers,
+            data=json.dumps(http_request.data, cls=_api_client.RequestJsonEncoder) if http_request.data else None,
+            timeout=http_request.timeout,
+            stream=stream,
+        )
+        errors.APIError.raise_for_response(response)
+        return _api_client.HttpResponse(response.headers, response if stream else [response.text])
+    
+    api_client._request = request
+    return client
@@ -0,0 +1,631 @@
+"""Durable extraction jobs backed by SQLite and consumed by worker processes.
+
+Jobs, their partial output and their results live in a single SQLite file, so
+an extraction keeps running and can be re-attached across browser refreshes
+and Streamlit session timeouts. Workers claim jobs under a lease that they keep
+renewing while the stream runs; if a worker dies, its lease expires and the
+job goes back to the queue.
+"""
+import multiprocessing
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from .config import (
+    BATCH_RETRY_BACKOFF,
+    JOB_CLAIM_TIMEOUT,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_PARTIAL_FLUSH_INTERVAL,
+    JOB_POLL_INTERVAL,
+    JOB_RETENTION,
+    JOB_WORKERS,
+    JOBS_DB_PATH,
+    STRUCTURED_SYSTEM_INSTRUCTIONS,
+    SYSTEM_INSTRUCTIONS,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    cache_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    structured INTEGER NOT NULL DEFAULT 0,
+    page_split INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    partial TEXT NOT NULL DEFAULT '',
+    chunks INTEGER NOT NULL DEFAULT 0,
+    response TEXT,
+    error TEXT,
+    problems TEXT,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    first_chunk_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, submitted_at);
+CREATE INDEX IF NOT EXISTS jobs_by_cache_key ON jobs (cache_key, submitted_at);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+# Jobs a new submit of the same document attaches to: pending ones, and finished ones with a clean response
+_REUSABLE_JOB = (
+    "(status IN ('queued', 'running') OR (status = 'done' AND error IS NULL AND truncated = 0 "
+    "AND response IS NOT NULL AND response != ''))"
+)
+
+_job_store = None
+_worker_pool = None
+_shared_lock = threading.Lock()
+
+
+@dataclass
+class Job:
+    """Snapshot of a row in the job store."""
+    
+    id: str
+    cache_key: str
+    name: str
+    pdf_path: str
+    structured: bool
+    page_split: bool
+    status: str
+    partial: str
+    chunks: int
+    response: str
+    error: str
+    # What the report pipeline advises reviewing, "; " separated; unlike `error`, the extraction is still clean
+    problems: str
+    truncated: bool
+    attempts: int
+    worker: str
+    lease_until: float
+    submitted_at: float
+    started_at: float
+    first_chunk_at: float
+    finished_at: float
+    
+    @classmethod
+    def from_row(cls, row):
+        job = cls(**dict(row))
+        job.structured = bool(job.structured)
+        job.page_split = bool(job.page_split)
+        job.truncated = bool(job.truncated)
+        return job
+    
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+    
+    def unclaimed_for(self, now=None):
+        """Seconds the job has been runnable without a worker taking it, or 0."""
+        now = time.time() if now is None else now
+        if self.status == "queued":
+            return max(0.0, now - max(self.submitted_at, self.lease_until or 0))
+        if self.status == "running" and self.lease_until is not None:
+            return max(0.0, now - self.lease_until)
+        return 0.0
+    
+    def metrics(self):
+        """Timing of the last attempt, in the shape the UI renders."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return {
+            "time_to_first_chunk": (
+                self.first_chunk_at - self.started_at if self.first_chunk_at is not None else None
+            ),
+            "total": self.finished_at - self.started_at,
+            "chunks": self.chunks,
+        }
+
+
+def is_retryable(exc):
+    """
+    Whether another attempt of a failed job can succeed.
+    
+    A response that breaks the report schema, or a single page that alone
+    exceeds the token limit, fails the same way on every attempt.
+    """
+    from pydantic import ValidationError
+    
+    from .pages import PageTruncatedError
+    
+    return not isinstance(exc, (ValidationError, PageTruncatedError))
+
+
+class JobStore:
+    """SQLite-backed job queue shared by the app, the CLI and worker processes."""
+    
+    def __init__(self, db_path=JOBS_DB_PATH, max_attempts=JOB_MAX_ATTEMPTS, lease_seconds=JOB_LEASE_SECONDS):
+        self.db_path = db_path
+        self.documents_dir = os.path.join(os.path.dirname(db_path), "documents")
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        os.makedirs(self.documents_dir, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        # Databases created before pipeline problems had their own column
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+        if "problems" not in columns:
+            connection.execute("ALTER TABLE jobs ADD COLUMN problems TEXT")
+    
+    def _connection(self):
+        """One connection per thread; SQLite connections must not be shared across threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _store_document(self, document):
+        """Write the PDF next to the database, once per distinct content."""
+        path = os.path.join(self.documents_dir, f"{document.sha256()}.pdf")
+        if os.path.exists(path):
+            return path
+        fd, temp_path = tempfile.mkstemp(dir=self.documents_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(document.data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+    
+    def submit(self, name, document, cache_key, structured=False, page_split=False):
+        """
+        Queue a document for extraction.
+        
+        Submitting a document whose extraction is already queued, running or
+        cleanly done returns that job instead of starting another one; one
+        that finished with an error or a truncated response is extracted again.
+        
+        Returns:
+            Job: The new or existing job
+        """
+        existing = self.find(cache_key)
+        if existing is not None:
+            return existing
+        
+        pdf_path = self._store_document(document)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f"SELECT * FROM jobs WHERE cache_key = ? AND {_REUSABLE_JOB} ORDER BY submitted_at DESC LIMIT 1",
+                (cache_key,),
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                connection.execute(
+                    "INSERT INTO jobs (id, cache_key, name, pdf_path, structured, page_split, submitted_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, cache_key, name, pdf_path, int(structured), int(page_split), time.time()),
+                )
+                row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return Job.from_row(row)
+    
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row is not None else None
+    
+    def find(self, cache_key):
+        """Latest job for `cache_key` that is pending or finished cleanly, or None."""
+        row = self._connection().execute(
+            f"SELECT * FROM jobs WHERE cache_key = ? AND {_REUSABLE_JOB} ORDER BY submitted_at DESC LIMIT 1",
+            (cache_key,),
+        ).fetchone()
+        return Job.from_row(row) if row is not None else None
+    
+    def claim(self, worker_id, job_id=None):
+        """
+        Take the oldest runnable job: queued and past its retry delay, or
+        running under an expired lease. Jobs that used up their attempts are
+        failed instead of claimed. With `job_id`, only that job is taken.
+        
+        Returns:
+            Job: The claimed job, or None if nothing is runnable
+        """
+        connection = self._connection()
+        while True:
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT * FROM jobs WHERE ((status = 'queued' AND COALESCE(lease_until, 0) <= ?) "
+                    "OR (status = 'running' AND lease_until < ?)) AND (? IS NULL OR id = ?) "
+                    "ORDER BY submitted_at LIMIT 1",
+                    (now, now, job_id, job_id),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    error = row["error"] or "o worker parou durante a extração"
+                    connection.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, worker = NULL "
+                        "WHERE id = ?",
+                        (f"{error} (após {row['attempts']} tentativas)", now, row["id"]),
+                    )
+                    connection.execute("COMMIT")
+                    continue
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                    "started_at = ?, first_chunk_at = NULL, partial = '', chunks = 0 WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, now, row["id"]),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            return self.get(row["id"])
+    
+    def renew(self, job_id, worker_id):
+        """Extend the lease; returns False if the worker no longer owns the job."""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+    
+    def update_partial(self, job_id, worker_id, partial, chunks, first_chunk_at):
+        """Publish the output streamed so far; returns False if the lease was lost."""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET partial = ?, chunks = ?, first_chunk_at = ?, lease_until = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (partial, chunks, first_chunk_at, time.time() + self.lease_seconds, job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+    
+    def finish(self, job_id, worker_id, response, error=None, truncated=False, problems=None):
+        """Store the final response of a job."""
+        self._connection().execute(
+            "UPDATE jobs SET status = 'done', response = ?, partial = '', error = ?, problems = ?, truncated = ?, "
+            "finished_at = ?, worker = NULL, lease_until = NULL WHERE id = ? AND worker = ?",
+            (response, error, problems, int(truncated), time.time(), job_id, worker_id),
+        )
+    
+    def fail(self, job_id, worker_id, error, retry_delay=0.0, retryable=True):
+        """Put a job back in the queue after `retry_delay`, or fail it if out of attempts or not `retryable`."""
+        now = time.time()
+        max_attempts = self.max_attempts if retryable else 0
+        self._connection().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, lease_until = ?, finished_at = CASE WHEN attempts >= ? THEN ? END, worker = NULL "
+            "WHERE id = ? AND worker = ?",
+            (max_attempts, error, now + retry_delay, max_attempts, now, job_id, worker_id),
+        )
+    
+    def heartbeat(self, worker_id, now=None):
+        """Record that a worker consuming the queue is alive."""
+        self._connection().execute(
+            "INSERT INTO workers (id, heartbeat_at) VALUES (?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+            (worker_id, time.time() if now is None else now),
+        )
+    
+    def forget_worker(self, worker_id):
+        self._connection().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+    
+    def live_workers(self, max_age=JOB_CLAIM_TIMEOUT, now=None):
+        """Number of workers that sent a heartbeat in the last `max_age` seconds."""
+        now = time.time() if now is None else now
+        row = self._connection().execute(
+            "SELECT COUNT(*) AS workers FROM workers WHERE heartbeat_at >= ?", (now - max_age,)
+        ).fetchone()
+        return row["workers"]
+    
+    def orphaned(self, job, timeout=JOB_CLAIM_TIMEOUT, now=None):
+        """
+        Whether `job` waited `timeout` seconds unclaimed and no worker is alive to claim it.
+        
+        A job waiting behind busy workers is not orphaned: their heartbeats
+        keep coming while they run other jobs.
+        """
+        now = time.time() if now is None else now
+        return job.unclaimed_for(now) > timeout and self.live_workers(timeout, now) == 0
+    
+    def purge(self, max_age=JOB_RETENTION):
+        """Delete finished jobs older than `max_age` seconds, PDFs no job refers to and long-gone workers."""
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (time.time() - max_age,)
+        )
+        connection.execute("DELETE FROM workers WHERE heartbeat_at < ?", (time.time() - max_age,))
+        referenced = {row["pdf_path"] for row in connection.execute("SELECT DISTINCT pdf_path FROM jobs")}
+        for entry in os.scandir(self.documents_dir):
+            # Skip fresh files: a submit may have written one and not inserted its row yet
+            if entry.path in referenced or time.time() - entry.stat().st_mtime < 3600:
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def stats(self):
+        """Number of jobs per status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status")
+        return {row["status"]: row["jobs"] for row in rows}
+
+
+class JobWorker:
+    """Claim jobs from a JobStore and run them to completion."""
+    
+    def __init__(self, store, gemini_client, cache=None, worker_id=None,
+                 poll_interval=JOB_POLL_INTERVAL, flush_interval=JOB_PARTIAL_FLUSH_INTERVAL,
+                 retry_backoff=BATCH_RETRY_BACKOFF, duplicates=None, pipeline=None,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL):
+        from .pipeline import ReportPipeline
+        
+        self.store = store
+        self.gemini_client = gemini_client
+        self.cache = cache
+        self.duplicates = duplicates
+        # Normalizes free-text responses as they stream; the UI saves reports itself, so no sinks by default
+        self.pipeline = pipeline or ReportPipeline()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.retry_backoff = retry_backoff
+        self.heartbeat_interval = heartbeat_interval
+    
+    def _beat(self, stop):
+        """Heartbeat until `stop` is set, including while a long extraction runs."""
+        while True:
+            try:
+                self.store.heartbeat(self.worker_id)
+            except sqlite3.Error:
+                pass
+            if stop.wait(self.heartbeat_interval):
+                return
+    
+    def _keep_lease(self, job_id, stop):
+        """Renew the lease until `stop` is set, so slow first chunks do not look like a crash."""
+        while not stop.wait(self.store.lease_seconds / 3):
+            if not self.store.renew(job_id, self.worker_id):
+                return
+    
+    def _stream(self, job, document, system_instructions, run=None):
+        """Stream a single extraction, publishing partial output as it arrives and feeding it to `run`."""
+        from .gemini import GeminiClient
+        
+        chunks = []
+        metadata = {}
+        first_chunk_at = None
+        last_flush = time.monotonic()
+        for chunk in self.gemini_client.process_pdf(document, system_instructions, job.structured, metadata):
+            if first_chunk_at is None:
+                first_chunk_at = time.time()
+            chunks.append(chunk)
+            if run is not None:
+                run.feed(chunk)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                last_flush = time.monotonic()
+                if not self.store.update_partial(job.id, self.worker_id, "".join(chunks), len(chunks), first_chunk_at):
+                    raise RuntimeError("lease perdido para outro worker")
+        self.store.update_partial(job.id, self.worker_id, "".join(chunks), len(chunks), first_chunk_at)
+        return "".join(chunks), GeminiClient.is_truncated(metadata)
+    
+    def execute(self, job):
+        """Run a claimed job and record its outcome."""
+        from .telemetry import get_telemetry, span
+        
+        telemetry = get_telemetry()
+        if job.attempts == 1:
+            telemetry.observe("pdf2train_job_queue_wait_seconds", job.started_at - job.submitted_at)
+        with span("job.execute", job_id=job.id, attempt=job.attempts, structured=job.structured,
+                  page_split=job.page_split) as job_span:
+            status = self._execute(job)
+            job_span.set(outcome=status)
+        telemetry.inc("pdf2train_jobs_total", status=status)
+    
+    def _execute(self, job):
+        from .documents import PdfDocument
+        
+        system_instructions = STRUCTURED_SYSTEM_INSTRUCTIONS if job.structured else SYSTEM_INSTRUCTIONS
+        stop = threading.Event()
+        threading.Thread(target=self._keep_lease, args=(job.id, stop), daemon=True).start()
+        try:
+            document = PdfDocument.from_path(job.pdf_path)
+            error = problems = None
+            truncated = False
+            if job.page_split:
+                from .pages import PageSplitExtractor
+                
+                report = PageSplitExtractor(self.gemini_client).extract(document)
+                raw = response = report.model_dump_json(indent=2) if job.structured else report.to_text()
+            else:
+                run = None if job.structured else self.pipeline.start()
+                raw, truncated = self._stream(job, document, system_instructions, run)
+                response = raw
+                if run is not None:
+                    report = run.finish()
+                    response = report.text
+                    problems = "; ".join(report.problems) or None
+                else:
+                    from pydantic import ValidationError
+                    
+                    from .schema import TrendspotReport
+                    
+                    try:
+                        response = TrendspotReport.model_validate_json(raw).model_dump_json(indent=2)
+                    except ValidationError as exc:
+                        error = f"O modelo retornou um JSON inválido: {exc.error_count()} erros."
+        except Exception as exc:
+            retryable = is_retryable(exc)
+            self.store.fail(job.id, self.worker_id, f"{type(exc).__name__}: {exc}",
+                            retry_delay=self.retry_backoff * (2 ** (job.attempts - 1)), retryable=retryable)
+            return "retried" if retryable and job.attempts < self.store.max_attempts else "failed"
+        finally:
+            stop.set()
+        
+        self.store.finish(job.id, self.worker_id, response, error=error, truncated=truncated, problems=problems)
+        # Only clean extractions are cached, and raw as BatchProcessor caches them: whoever reads them post-processes
+        if self.cache is not None and raw and not truncated and error is None:
+            self.cache.put(job.cache_key, raw)
+            if self.duplicates is not None:
+                self._index_duplicate(job, document, system_instructions)
+        return "done"
+    
+    def _index_duplicate(self, job, document, system_instructions):
+        """Make a finished extraction findable by near duplicates of its PDF."""
+        from .dedup import DuplicateIndex
+        
+        # Same instructions string the submitter hashed into the cache key
+        if job.page_split:
+            system_instructions += "\0page-split"
+        variant = DuplicateIndex.variant(self.gemini_client.model_key, system_instructions)
+        try:
+            self.duplicates.add(job.cache_key, job.name, self.duplicates.fingerprint(document), variant)
+        except Exception:
+            # The extraction is already stored; a broken index must not fail the job
+            pass
+    
+    def run_once(self, job_id=None):
+        """Run the next runnable job, or only `job_id`; returns False if there was none."""
+        job = self.store.claim(self.worker_id, job_id)
+        if job is None:
+            return False
+        self.execute(job)
+        return True
+    
+    def run(self, stop=None):
+        """Consume jobs until `stop` is set, purging old jobs while idle."""
+        stop = stop or threading.Event()
+        beating = threading.Event()
+        threading.Thread(target=self._beat, args=(beating,), name="pdf2train-heartbeat", daemon=True).start()
+        last_purge = 0.0
+        try:
+            while not stop.is_set():
+                if self.run_once():
+                    continue
+                if time.monotonic() - last_purge > 3600:
+                    self.store.purge()
+                    last_purge = time.monotonic()
+                stop.wait(self.poll_interval)
+        finally:
+            beating.set()
+            self.store.forget_worker(self.worker_id)
+
+
+def run_worker(db_path=JOBS_DB_PATH, gemini_factory=None, use_cache=True, lease_seconds=JOB_LEASE_SECONDS):
+    """Worker process entry point: build clients and consume jobs until terminated."""
+    from .cache import get_extraction_cache
+    
+    if gemini_factory is None:
+        from .clients import get_client_registry
+        from .gemini import GeminiClient
+        from .storage import StorageManager
+        
+        registry = get_client_registry()
+        storage_manager = StorageManager(None, storage_client=registry.get("storage"))
+        gemini_client = GeminiClient(None, None, client=registry.get("gemini"), storage_manager=storage_manager)
+    else:
+        gemini_client = gemini_factory()
+    
+    cache = duplicates = None
+    if use_cache:
+        from .dedup import get_duplicate_index
+        
+        cache = get_extraction_cache()
+        duplicates = get_duplicate_index()
+    JobWorker(JobStore(db_path, lease_seconds=lease_seconds), gemini_client, cache=cache,
+              duplicates=duplicates).run()
+
+
+class WorkerPool:
+    """Keep a fixed number of worker processes alive, restarting any that exit."""
+    
+    def __init__(self, workers=JOB_WORKERS, db_path=JOBS_DB_PATH, gemini_factory=None, use_cache=True,
+                 lease_seconds=JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.db_path = db_path
+        self.gemini_factory = gemini_factory
+        self.use_cache = use_cache
+        self.lease_seconds = lease_seconds
+        self.restarts = 0
+        self._processes = []
+        # Spawn keeps the children free of the parent's threads and open connections
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+    
+    def _start_process(self):
+        process = self._context.Process(
+            target=run_worker,
+            args=(self.db_path, self.gemini_factory, self.use_cache, self.lease_seconds),
+            name="pdf2train-worker",
+            daemon=True,
+        )
+        process.start()
+        return process
+    
+    def ensure_running(self):
+        """Start missing workers and replace any that died."""
+        with self._lock:
+            alive = [process for process in self._processes if process.is_alive()]
+            self.restarts += len(self._processes) - len(alive)
+            while len(alive) < self.workers:
+                alive.append(self._start_process())
+            self._processes = alive
+    
+    def processes(self):
+        with self._lock:
+            return list(self._processes)
+    
+    def stop(self, timeout=5):
+        with self._lock:
+            for process in self._processes:
+                process.terminate()
+            for process in self._processes:
+                process.join(timeout)
+            self._processes = []
+    
+    def supervise(self, interval=1.0):
+        """Block, restarting dead workers, until interrupted."""
+        try:
+            while True:
+                self.ensure_running()
+                time.sleep(interval)
+        finally:
+            self.stop()
+
+
+def get_job_store():
+    """Process-wide job store."""
+    global _job_store
+    with _shared_lock:
+        if _job_store is None:
+            _job_store = JobStore()
+        return _job_store
+
+
+def get_worker_pool():
+    """Process-wide worker pool; dead workers are replaced on every call."""
+    global _worker_pool
+    with _shared_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool()
+    _worker_pool.ensure_running()
+    return _worker_pool
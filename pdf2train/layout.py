@@ -0,0 +1,247 @@
+"""Local text-layer extraction for the hybrid (text plus crops) request mode.
+
+Trendspot exports carry an embedded text layer, so most of a report can be
+sent to the model as compact text instead of PDF pages it has to read
+visually. Text fragments are grouped into blocks by position. Blocks inside
+dark filled areas are labelled with where the area sits on the page, which is
+how the report marks "Com Potencial de Crescimento" (top) and "Para Aproveitar
+Agora" (bottom band). Images with no text over them, and pages with no text at
+all, are rendered as JPEG crops for the model to read.
+"""
+import subprocess
+from dataclasses import dataclass, field
+
+from .config import HYBRID_CROP_DPI, HYBRID_MAX_CROPS, HYBRID_MIN_WORDS, THUMBNAIL_TIMEOUT
+
+# Fill luminance below this counts as a dark area
+_DARK_FILL = 0.45
+# Images covering less of the page than this are icons and logos, not content
+_MIN_IMAGE_AREA = 0.03
+
+
+@dataclass
+class TextBlock:
+    """Consecutive lines of text that belong together on a page."""
+    
+    lines: list
+    x: float
+    top: float
+    bottom: float
+    area: str = None
+    
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+
+@dataclass
+class PageLayout:
+    """Text blocks, dark areas and text-less images of one page, in PDF points."""
+    
+    number: int
+    width: float
+    height: float
+    blocks: list = field(default_factory=list)
+    dark_areas: list = field(default_factory=list)
+    images: list = field(default_factory=list)
+    
+    @property
+    def words(self):
+        return sum(len(line.split()) for block in self.blocks for line in block.lines)
+
+
+@dataclass
+class DocumentLayout:
+    """What the hybrid request sends instead of the PDF: compact text plus JPEG crops."""
+    
+    text: str
+    crops: list
+    pages: int
+    words: int
+
+
+def _apply(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def _multiply(m, n):
+    return [
+        m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def _box(matrix, x, y, width, height):
+    corners = [_apply(matrix, x + dx, y + dy) for dx in (0, width) for dy in (0, height)]
+    xs = [corner[0] for corner in corners]
+    ys = [corner[1] for corner in corners]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _luminance(operator, operands):
+    values = [float(value) for value in operands]
+    if operator == b"g" and len(values) == 1:
+        return values[0]
+    if operator == b"rg" and len(values) == 3:
+        return 0.299 * values[0] + 0.587 * values[1] + 0.114 * values[2]
+    if operator == b"k" and len(values) == 4:
+        cyan, magenta, yellow, black = values
+        return (0.299 * (1 - cyan) + 0.587 * (1 - magenta) + 0.114 * (1 - yellow)) * (1 - black)
+    return None
+
+
+def _contains(box, x, y):
+    return box[0] <= x <= box[2] and box[1] <= y <= box[3]
+
+
+def _area_label(box, height):
+    center = (box[1] + box[3]) / 2
+    if center > height * 0.6:
+        return "topo"
+    if center < height * 0.25:
+        return "rodapé"
+    return "meio"
+
+
+def read_page(page, number):
+    """Collect the text fragments, dark fills and image placements of a pypdf page."""
+    width = float(page.mediabox.width)
+    height = float(page.mediabox.height)
+    layout = PageLayout(number, width, height)
+    fragments = []
+    state = {"fill": 1.0, "paths": []}
+    
+    def before_operator(operator, operands, cm, tm):
+        if operator in (b"g", b"rg", b"k"):
+            luminance = _luminance(operator, operands)
+            if luminance is not None:
+                state["fill"] = luminance
+        elif operator == b"re" and len(operands) == 4:
+            state["paths"].append(_box(cm, *(float(value) for value in operands)))
+        elif operator in (b"f", b"F", b"f*", b"B", b"B*"):
+            if state["fill"] < _DARK_FILL:
+                layout.dark_areas.extend(
+                    box for box in state["paths"]
+                    if (box[2] - box[0]) * (box[3] - box[1]) > width * height * 0.01
+                )
+            state["paths"] = []
+        elif operator in (b"n", b"S", b"s"):
+            state["paths"] = []
+        elif operator == b"Do":
+            # Images are drawn into the unit square scaled by the current matrix
+            box = _box(cm, 0, 0, 1, 1)
+            if (box[2] - box[0]) * (box[3] - box[1]) > width * height * _MIN_IMAGE_AREA:
+                layout.images.append(box)
+    
+    def visit_text(text, cm, tm, font_dict, font_size):
+        if not text.strip():
+            return
+        x, y = _apply(_multiply(tm, cm), 0, 0)
+        size = abs(font_size * _multiply(tm, cm)[3]) or font_size or 10
+        for line in text.splitlines():
+            if line.strip():
+                fragments.append((x, y, size, line.strip()))
+                y -= size * 1.2
+    
+    page.extract_text(visitor_operand_before=before_operator, visitor_text=visit_text)
+    layout.blocks = group_blocks(fragments, layout)
+    # An image that text is drawn over is a background, already covered by that text
+    layout.images = [
+        box for box in layout.images
+        if not any(_contains(box, block.x, block.top) for block in layout.blocks)
+    ]
+    return layout
+
+
+def group_blocks(fragments, layout):
+    """Merge fragments into lines, and lines into blocks of the same column and area."""
+    lines = []
+    for x, y, size, text in sorted(fragments, key=lambda fragment: (-round(fragment[1]), fragment[0])):
+        if lines and abs(lines[-1]["y"] - y) < size * 0.5 and 0 <= x - lines[-1]["end"] < size * 3:
+            lines[-1]["text"] += " " + text
+            lines[-1]["end"] = x + len(text) * size * 0.5
+            continue
+        lines.append({"x": x, "y": y, "size": size, "text": text, "end": x + len(text) * size * 0.5})
+    
+    blocks = []
+    for line in lines:
+        area = next((box for box in layout.dark_areas if _contains(box, line["x"], line["y"])), None)
+        label = _area_label(area, layout.height) if area is not None else None
+        for block in reversed(blocks):
+            same_column = abs(block.x - line["x"]) < layout.width * 0.2
+            if same_column and block.area == label and 0 <= block.bottom - line["y"] < line["size"] * 2.2:
+                block.lines.append(line["text"])
+                block.bottom = line["y"]
+                break
+        else:
+            blocks.append(TextBlock([line["text"]], line["x"], line["y"], line["y"], label))
+    return blocks
+
+
+def render_text(pages):
+    """The text the model receives, with each block tagged by page and area."""
+    sections = []
+    for page in pages:
+        sections.append(f"=== Página {page.number} ===")
+        for block in page.blocks:
+            tag = f"[Área escura, {block.area}]" if block.area else "[Bloco]"
+            sections.append(f"{tag}\n{block.text}")
+    return "\n\n".join(sections)
+
+
+def render_crop(document, page, box=None, dpi=HYBRID_CROP_DPI):
+    """
+    Render a region of a page (the whole page when `box` is None) as JPEG with poppler.
+    
+    Returns:
+        bytes: JPEG image, or None if poppler could not render it
+    """
+    command = ["pdftoppm", "-f", str(page.number), "-l", str(page.number), "-singlefile", "-jpeg",
+               "-r", str(dpi)]
+    if box is not None:
+        scale = dpi / 72
+        # Poppler crops in pixels from the top-left corner; PDF points grow from the bottom-left
+        command += ["-x", str(int(box[0] * scale)), "-y", str(int((page.height - box[3]) * scale)),
+                    "-W", str(int((box[2] - box[0]) * scale)), "-H", str(int((box[3] - box[1]) * scale))]
+    command.append("-")
+    try:
+        result = subprocess.run(
+            command, input=document.data, capture_output=True, timeout=THUMBNAIL_TIMEOUT, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout or None
+
+
+def extract_layout(document, min_words=HYBRID_MIN_WORDS, max_crops=HYBRID_MAX_CROPS):
+    """
+    Turn a PDF into compact text plus the crops the text layer cannot stand in for.
+    
+    Returns:
+        DocumentLayout: The layout, or None when the text layer is too thin
+        to replace the PDF (scanned or outlined exports)
+    """
+    from pypdf import PdfReader
+    
+    try:
+        reader = PdfReader(document.open())
+        pages = [read_page(page, number) for number, page in enumerate(reader.pages, 1)]
+    except Exception:
+        return None
+    words = sum(page.words for page in pages)
+    if words < min_words:
+        return None
+    
+    crops = []
+    for page in pages:
+        # A page without text is read from its image; otherwise only text-less pictures are
+        regions = [None] if not page.blocks else page.images
+        for box in regions:
+            if len(crops) >= max_crops:
+                break
+            image = render_crop(document, page, box)
+            if image is not None:
+                crops.append(image)
+    return DocumentLayout(render_text(pages), crops, len(pages), words)
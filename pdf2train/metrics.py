@@ -0,0 +1,33 @@
+"""Timing of streamed extractions."""
+import time
+
+
+class StreamMetrics:
+    """Time-to-first-chunk and total time of one streamed extraction."""
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_chunk_at = None
+        self.end = None
+        self.chunks = 0
+        self.chars = 0
+    
+    def record(self, chunk):
+        """Account for one received chunk."""
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self.chunks += 1
+        self.chars += len(chunk)
+    
+    def finish(self):
+        self.end = time.perf_counter()
+    
+    @property
+    def time_to_first_chunk(self):
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.start
+    
+    @property
+    def total(self):
+        return (self.end or time.perf_counter()) - self.start
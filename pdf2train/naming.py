@@ -0,0 +1,55 @@
+"""Report file naming."""
+import hashlib
+import re
+import unicodedata
+
+
+class ReportNameGenerator:
+    """Generator for report file names."""
+    
+    @staticmethod
+    def suggest_name(text, max_words=10, max_length=50):
+        """
+        Suggest a report name based on the first words of the generated text.
+        
+        Args:
+            text (str): Report text
+            max_words (int): Maximum number of words to use
+            max_length (int): Maximum length of the filename
+            
+        Returns:
+            str: Suggested report name
+        """
+        if not text.strip():
+            return "relatorio_sem_nome"
+
+        # Extract the first `max_words` words from the text
+        words = text.split(maxsplit=max_words)[:max_words]
+        clean_text = " ".join(words)
+
+        # Transliterate accented letters ("Alimentação" -> "Alimentacao") instead of dropping them
+        clean_text = unicodedata.normalize("NFKD", clean_text).encode("ascii", "ignore").decode("ascii")
+
+        # Replace every run of other characters with one underscore to avoid filename issues
+        clean_text = re.sub(r"[^a-zA-Z0-9]+", "_", clean_text).strip("_")
+        if not clean_text:
+            return "relatorio_sem_nome"
+        if len(clean_text) <= max_length:
+            return clean_text
+
+        # Truncated names of different reports can share a prefix, so a digest of the full name tells them apart
+        digest = hashlib.sha256(clean_text.encode("ascii")).hexdigest()[:8]
+        return f"{clean_text[:max_length - len(digest) - 1].rstrip('_')}_{digest}"
+    
+    @staticmethod
+    def legacy_name(text, max_words=10, max_length=50):
+        """
+        Name `suggest_name` gave before it transliterated accents and told truncated names apart.
+        
+        Reports saved back then still carry it; `StorageManager.migrate_report_names` moves them
+        to the current name, so saving them again does not create a second blob.
+        """
+        if not text.strip():
+            return "relatorio_sem_nome"
+        clean_text = re.sub(r"[^a-zA-Z0-9\s]", "", " ".join(text.split()[:max_words]))
+        return clean_text.replace(" ", "_")[:max_length]
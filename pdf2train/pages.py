@@ -0,0 +1,157 @@
+"""Page-range (map-reduce) extraction of long PDFs."""
+import contextvars
+import io
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .batch import RateLimiter
+from .config import (
+    BATCH_MAX_WORKERS,
+    BATCH_REQUESTS_PER_MINUTE,
+    PAGES_PER_SHARD,
+    SHARD_INSTRUCTIONS,
+    STRUCTURED_SYSTEM_INSTRUCTIONS,
+)
+from .documents import PdfDocument
+
+
+class PageTruncatedError(RuntimeError):
+    """Raised when a single page alone exceeds the output token limit, so no split can help."""
+
+
+class PageSplitExtractor:
+    """Extract long PDFs as concurrent page ranges and merge the results into one report."""
+    
+    def __init__(self, gemini_client, pages_per_shard=PAGES_PER_SHARD, max_workers=BATCH_MAX_WORKERS,
+                 requests_per_minute=BATCH_REQUESTS_PER_MINUTE):
+        self.gemini_client = gemini_client
+        self.pages_per_shard = max(1, pages_per_shard)
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+    
+    @staticmethod
+    def page_count(document):
+        """Number of pages in a PDF document."""
+        from pypdf import PdfReader
+        
+        with document.open() as stream:
+            return len(PdfReader(stream).pages)
+    
+    @staticmethod
+    def split(reader, first_page, last_page):
+        """Copy pages `first_page`..`last_page` (1-based, inclusive) into a new document."""
+        from pypdf import PdfWriter
+        
+        writer = PdfWriter()
+        for index in range(first_page - 1, last_page):
+            writer.add_page(reader.pages[index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return PdfDocument(buffer.getbuffer())
+    
+    def _extract_shard(self, shard, first_page, last_page):
+        """Extract one page range, returning (report or None, truncated, raw response)."""
+        from .schema import TrendspotReport
+        
+        self.rate_limiter.acquire()
+        system_instructions = STRUCTURED_SYSTEM_INSTRUCTIONS + SHARD_INSTRUCTIONS.format(
+            first_page=first_page, last_page=last_page
+        )
+        metadata = {}
+        response = "".join(self.gemini_client.process_pdf(shard, system_instructions, True, metadata))
+        if self.gemini_client.is_truncated(metadata):
+            return None, True, response
+        return TrendspotReport.model_validate_json(response), False, response
+    
+    def extract(self, document, on_progress=None):
+        """
+        Extract a document shard by shard.
+        
+        Shards whose output hits the token limit are split in half and
+        extracted again; a truncated single page raises PageTruncatedError.
+        
+        Args:
+            document (PdfDocument): Document to extract
+            on_progress (callable): Called with (finished shards, known shards)
+            
+        Returns:
+            TrendspotReport: Merged report
+        """
+        from .telemetry import span
+        
+        with span("pages.extract", document_bytes=document.size):
+            return self._extract_shards(document, on_progress)
+    
+    def _extract_shards(self, document, on_progress):
+        from pypdf import PdfReader
+        
+        with document.open() as stream:
+            reader = PdfReader(stream)
+            total_pages = len(reader.pages)
+            ranges = [
+                (first, min(first + self.pages_per_shard - 1, total_pages))
+                for first in range(1, total_pages + 1, self.pages_per_shard)
+            ]
+            
+            reports = {}
+            known = len(ranges)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = {
+                    # Each shard runs in a copy of this context so its spans nest under pages.extract
+                    executor.submit(
+                        contextvars.copy_context().run, self._extract_shard, self.split(reader, first, last), first, last
+                    ): (first, last)
+                    for first, last in ranges
+                }
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        first, last = pending.pop(future)
+                        report, truncated, _ = future.result()
+                        if not truncated:
+                            reports[first] = report
+                        elif first == last:
+                            raise PageTruncatedError(f"A extração da página {first} excedeu o limite de tokens.")
+                        else:
+                            middle = (first + last) // 2
+                            known += 1
+                            for sub_first, sub_last in ((first, middle), (middle + 1, last)):
+                                shard = self.split(reader, sub_first, sub_last)
+                                future = executor.submit(
+                                    contextvars.copy_context().run, self._extract_shard, shard, sub_first, sub_last
+                                )
+                                pending[future] = (sub_first, sub_last)
+                        if on_progress is not None:
+                            on_progress(len(reports), known)
+        
+        return self.merge([reports[first] for first in sorted(reports)])
+    
+    @staticmethod
+    def merge(reports):
+        """
+        Merge shard reports in page order.
+        
+        Header fields come from the first shard that has them, "Para Aproveitar
+        Agora" from the last one, and repeated quadros are kept once.
+        """
+        from .schema import TrendspotReport
+        
+        def first_value(field, ordered):
+            return next((getattr(r, field) for r in ordered if getattr(r, field).strip()), "")
+        
+        quadros = []
+        seen = set()
+        for report in reports:
+            for quadro in report.quadros:
+                key = (quadro.title.strip().lower(), quadro.description.strip().lower())
+                if key in seen:
+                    continue
+                seen.add(key)
+                quadros.append(quadro)
+        
+        return TrendspotReport(
+            report_date=first_value("report_date", reports),
+            category=first_value("category", reports),
+            report_link=first_value("report_link", reports),
+            quadros=quadros,
+            para_aproveitar_agora=first_value("para_aproveitar_agora", list(reversed(reports))),
+        )
@@ -0,0 +1,528 @@
+"""Streaming post-processing of free-text extractions.
+
+Response chunks go through a chain of stages as they arrive: lines are split
+off, parsed into header fields, quadros and the "Para Aproveitar Agora" text,
+dates are normalized, link placeholders resolved and every piece validated.
+Between chunks only the unfinished line and the open quadro are kept, and
+nothing is parsed twice. The normalized report is rendered along the way and,
+once the stream ends, handed to every sink in turn, so saving it to Cloud
+Storage, a JSONL file and the search index is a single pass over the response.
+"""
+import datetime
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from .config import BUCKET_NAME, REPORT_LINK_TEMPLATE, REPORT_MIN_QUADROS, REPORTS_FOLDER
+from .search import PARA_APROVEITAR_AGORA, fold, parse_date
+
+LINK_PLACEHOLDER = "Insira o link aqui"
+
+_SEPARATOR = re.compile(r"^\*{3,}$")
+_FIELD = re.compile(r"^([^:]{1,40}?)\s*:\s*(.*)$")
+_SEPARATOR_LINE = "*" * 47
+_PARA_KEY = fold(PARA_APROVEITAR_AGORA)
+_PLACEHOLDER_KEY = fold(LINK_PLACEHOLDER)
+
+
+@functools.lru_cache(maxsize=256)
+def _field_key(label):
+    # Every line is checked for a field label, and a report only uses a handful of them
+    return fold(label)
+
+
+@dataclass(frozen=True)
+class ReportEvent:
+    """
+    One piece of a report passed between stages.
+    
+    Kinds and their data:
+        field: name ("report_date", "category" or "report_link") and value
+        quadro: section, title, description, type and link
+        para_aproveitar_agora: text
+        problem: reason, in Portuguese, for whoever reviews the report
+    """
+    
+    kind: str
+    data: dict
+
+
+def _problem(reason):
+    return ReportEvent("problem", {"reason": reason})
+
+
+class LineSplitter:
+    """Chunks in, complete lines out; only the unfinished last line is carried to the next chunk."""
+    
+    def __init__(self):
+        self._tail = ""
+    
+    def feed(self, chunk):
+        lines = (self._tail + chunk).split("\n")
+        self._tail = lines.pop()
+        return lines
+    
+    def finish(self):
+        tail, self._tail = self._tail, ""
+        return [tail] if tail else []
+
+
+class SectionParser:
+    """
+    Lines in, report events out, each quadro once it is closed.
+    
+    Follows the free-text Nome/Categoria/quadros format, tolerating the
+    model's small deviations: separators close the open quadro, a line ending
+    with a colon opens a section and "Tipo" and "Link" lines belong to the
+    quadro above them.
+    """
+    
+    def __init__(self):
+        self._section = ""
+        self._quadro = None
+        self._para = None
+    
+    def feed(self, raw_line):
+        line = raw_line.strip()
+        if line.startswith("***") and _SEPARATOR.match(line):
+            return self.finish()
+        # Markdown emphasis sneaks in despite the instructions
+        line = line.strip("*#_").strip()
+        if not line:
+            return []
+        # Most lines are titles and descriptions, which the field pattern would only reject more slowly
+        match = _FIELD.match(line) if ":" in line else None
+        key = _field_key(match.group(1)) if match else None
+        value = match.group(2).strip().strip("*_").strip() if match else ""
+        
+        events = []
+        if key == "nome":
+            events.append(ReportEvent("field", {
+                "name": "report_date", "value": re.sub(r"(?i)^trendspot do dia\s*", "", value),
+            }))
+        elif key == "categoria":
+            events.append(ReportEvent("field", {"name": "category", "value": value}))
+        elif key == "link do relatorio":
+            events.append(ReportEvent("field", {"name": "report_link", "value": value}))
+        elif key == "link":
+            if self._quadro is not None:
+                self._quadro["link"] = value
+        elif key == _PARA_KEY:
+            events.extend(self._close_quadro())
+            self._para = [value] if value else []
+        elif key == "tipo" and self._quadro is not None:
+            self._quadro["type"] = value
+        elif match and not value:
+            # A line ending with a colon opens a section ("Com Potencial de Crescimento:")
+            events.extend(self._close_quadro())
+            self._section = match.group(1)
+        elif self._para is not None:
+            self._para.append(line)
+        elif self._quadro is None:
+            self._quadro = {"section": self._section, "title": line, "description": "", "type": "", "link": ""}
+        else:
+            self._quadro["description"] = f"{self._quadro['description']}\n{line}".strip()
+        return events
+    
+    def _close_quadro(self):
+        quadro, self._quadro = self._quadro, None
+        return [ReportEvent("quadro", quadro)] if quadro is not None else []
+    
+    def finish(self):
+        events = self._close_quadro()
+        if self._para is not None:
+            events.append(ReportEvent("para_aproveitar_agora", {"text": "\n".join(self._para)}))
+            self._para = None
+        return events
+
+
+class DateNormalizer:
+    """Report dates as ISO dates, however the model wrote them; a date that cannot be read is kept and flagged."""
+    
+    def feed(self, event):
+        if event.kind != "field" or event.data["name"] != "report_date" or not event.data["value"]:
+            return [event]
+        iso_date = parse_date(event.data["value"])
+        if iso_date is None:
+            return [event, _problem(f"data do relatório não reconhecida: {event.data['value']}")]
+        return [ReportEvent("field", {"name": "report_date", "value": iso_date})]
+    
+    def finish(self):
+        return []
+
+
+def template_link(template=REPORT_LINK_TEMPLATE):
+    """Link resolver filling in the report link from `template` and the report's date and category."""
+    def resolve(event, header):
+        if not template or event.kind != "field":
+            return None
+        report_date = parse_date(header.get("report_date", ""))
+        category = fold(header.get("category", "")).replace(" ", "-")
+        if report_date is None or not category:
+            return None
+        return template.format(date=report_date, category=category)
+    
+    return resolve
+
+
+class LinkResolver:
+    """
+    Replace link placeholders with a resolved link, or with "" when none is known.
+    
+    `resolve(event, header)` gets each report_link field or quadro whose
+    link is missing, along with the header fields seen so far, and returns
+    the link or None. A report without a "Link do relatório" line gets one
+    where the header closes, before its first quadro, when a link can be
+    resolved for it.
+    """
+    
+    def __init__(self, resolve=None):
+        self.resolve = resolve or template_link()
+        self._header = {}
+        self._has_report_link = False
+    
+    def _link(self, value, event):
+        if value and value != LINK_PLACEHOLDER and fold(value) != _PLACEHOLDER_KEY:
+            return value
+        return self.resolve(event, self._header) or ""
+    
+    def _missing_report_link(self):
+        """The resolved report_link field of a header that had none, once; [] if there is nothing to add."""
+        if self._has_report_link:
+            return []
+        self._has_report_link = True
+        event = ReportEvent("field", {"name": "report_link", "value": ""})
+        link = self._link("", event)
+        if not link:
+            return []
+        self._header["report_link"] = link
+        return [ReportEvent("field", {"name": "report_link", "value": link})]
+    
+    def feed(self, event):
+        if event.kind == "field":
+            if event.data["name"] == "report_link":
+                self._has_report_link = True
+                event = ReportEvent("field", {"name": "report_link", "value": self._link(event.data["value"], event)})
+            self._header[event.data["name"]] = event.data["value"]
+            return [event]
+        if event.kind == "quadro":
+            event = ReportEvent("quadro", dict(event.data, link=self._link(event.data["link"], event)))
+        if event.kind == "problem":
+            return [event]
+        # The first quadro or "Para Aproveitar Agora" closes the header, where the report link belongs
+        return self._missing_report_link() + [event]
+    
+    def finish(self):
+        return self._missing_report_link()
+
+
+class SchemaValidator:
+    """Check each quadro against the Quadro schema as it closes, and the report as a whole at the end."""
+    
+    def __init__(self, min_quadros=REPORT_MIN_QUADROS):
+        from pydantic import ValidationError
+        
+        from .schema import Quadro
+        
+        self._model = Quadro
+        self._validation_error = ValidationError
+        self.min_quadros = min_quadros
+        self._header = {}
+        self._quadros = 0
+    
+    def feed(self, event):
+        events = [event]
+        if event.kind == "field":
+            self._header[event.data["name"]] = event.data["value"]
+        elif event.kind == "quadro":
+            self._quadros += 1
+            try:
+                self._model.model_validate(event.data)
+            except self._validation_error as exc:
+                events.append(_problem(f"quadro {self._quadros} fora do esquema ({exc.error_count()} erros)"))
+            missing = [label for key, label in (("title", "título"), ("type", "tipo")) if not event.data[key]]
+            if missing:
+                events.append(_problem(f"quadro {self._quadros} sem {' e '.join(missing)}"))
+        return events
+    
+    def finish(self):
+        events = []
+        if not self._header.get("report_date"):
+            events.append(_problem("relatório sem data"))
+        if not self._header.get("category"):
+            events.append(_problem("relatório sem categoria"))
+        if self._quadros < self.min_quadros:
+            events.append(_problem(f"{self._quadros} quadros"))
+        return events
+
+
+DEFAULT_STAGES = (LineSplitter, SectionParser, DateNormalizer, LinkResolver, SchemaValidator)
+
+
+def empty_report():
+    """Report fields before any event, as parse_report returns them."""
+    return {"report_date": "", "category": "", "report_link": "", "quadros": [], "para_aproveitar_agora": ""}
+
+
+def apply_event(report, event):
+    """Record an event in a report dict shaped like parse_report's."""
+    if event.kind == "field":
+        report[event.data["name"]] = event.data["value"]
+    elif event.kind == "quadro":
+        report["quadros"].append(event.data)
+    elif event.kind == "para_aproveitar_agora":
+        report["para_aproveitar_agora"] = event.data["text"]
+
+
+def parse_lines(lines):
+    """Parse the lines of a free-text report into a dict shaped like parse_report's."""
+    report = empty_report()
+    parser = SectionParser()
+    for line in lines:
+        for event in parser.feed(line):
+            apply_event(report, event)
+    for event in parser.finish():
+        apply_event(report, event)
+    return report
+
+
+class TextRenderer:
+    """Events in, lines of the normalized report out, laid out the way TrendspotReport.to_text lays them out."""
+    
+    def __init__(self):
+        self._section = None
+        self._in_header = True
+    
+    @staticmethod
+    def _display_date(value):
+        try:
+            return datetime.date.fromisoformat(value).strftime("%d/%m/%Y")
+        except ValueError:
+            return value
+    
+    def feed(self, event):
+        if event.kind == "field":
+            name, value = event.data["name"], event.data["value"]
+            if name == "report_date":
+                return [f"Nome : Trendspot do dia {self._display_date(value)}"]
+            if name == "category":
+                return [f"Categoria : {value}"]
+            return [f"Link do relatório : {value or LINK_PLACEHOLDER}"]
+        if event.kind == "problem":
+            return []
+        
+        lines = []
+        if self._in_header:
+            self._in_header = False
+            lines.append(_SEPARATOR_LINE)
+        if event.kind == "para_aproveitar_agora":
+            lines.append(f"{PARA_APROVEITAR_AGORA}: {event.data['text']}")
+            return lines
+        quadro = event.data
+        if quadro["section"] and quadro["section"] != self._section:
+            self._section = quadro["section"]
+            lines.append(f"{self._section}:")
+        lines.extend([
+            quadro["title"],
+            quadro["description"],
+            f"Tipo : {quadro['type']}",
+            f"Link : {quadro['link'] or LINK_PLACEHOLDER}",
+            _SEPARATOR_LINE,
+        ])
+        return lines
+
+
+@dataclass
+class PipelineResult:
+    """A post-processed report: its normalized text and fields, the problems found and the sinks that failed it."""
+    
+    name: str
+    text: str
+    report: dict
+    sha256: str
+    problems: list = field(default_factory=list)
+    # Sink class name -> error, for each sink that failed to write the report
+    sink_errors: dict = field(default_factory=dict)
+    
+    @property
+    def file_name(self):
+        return f"{self.name}.txt"
+
+
+class PipelineRun:
+    """One report going through a pipeline: feed it the response chunks as they arrive, then finish it."""
+    
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self._stages = [factory() for factory in pipeline.stages]
+        self._renderer = TextRenderer()
+        # Rendered lines, UTF-8 encoded as they are hashed; a list grows without copying what it already holds
+        self._encoded = []
+        self._digest = hashlib.sha256()
+        self._report = empty_report()
+        self._problems = []
+    
+    def _push(self, items, first_stage=0):
+        for stage in self._stages[first_stage:]:
+            if not items:
+                # Most lines only add to the open quadro, so later stages have nothing to do
+                break
+            items = [output for item in items for output in stage.feed(item)]
+        return items
+    
+    def _emit(self, events):
+        for event in events:
+            if event.kind == "problem":
+                self._problems.append(event.data["reason"])
+            else:
+                apply_event(self._report, event)
+            for line in self._renderer.feed(event):
+                encoded = f"\n{line}".encode("utf-8") if self._encoded else line.encode("utf-8")
+                self._digest.update(encoded)
+                self._encoded.append(encoded)
+    
+    def feed(self, chunk):
+        """Push a response chunk through every stage."""
+        events = self._push([chunk])
+        if events:
+            self._emit(events)
+    
+    def finish(self):
+        """
+        Flush every stage, then hand the report to each sink in order.
+        
+        Returns:
+            PipelineResult: The post-processed report
+        """
+        from .naming import ReportNameGenerator
+        from .telemetry import get_telemetry, span
+        
+        # Whatever a stage still holds goes through the stages after it
+        for index, stage in enumerate(self._stages):
+            self._emit(self._push(stage.finish(), index + 1))
+        text = b"".join(self._encoded).decode("utf-8")
+        self._encoded = []
+        result = PipelineResult(
+            ReportNameGenerator.suggest_name(text), text, self._report, self._digest.hexdigest(), self._problems
+        )
+        
+        telemetry = get_telemetry()
+        telemetry.inc("pdf2train_pipeline_reports_total", outcome="problems" if result.problems else "valid")
+        with span("pipeline.sinks", sinks=len(self.pipeline.sinks), problems=len(result.problems)) as sinks_span:
+            for sink in self.pipeline.sinks:
+                try:
+                    sink.write(result)
+                except Exception as exc:
+                    # One sink failing must not keep the report from the others
+                    result.sink_errors[type(sink).__name__] = f"{type(exc).__name__}: {exc}"
+                    telemetry.inc("pdf2train_pipeline_sink_errors_total", sink=type(sink).__name__)
+            sinks_span.set(failed=len(result.sink_errors))
+        return result
+
+
+class ReportPipeline:
+    """
+    Post-process free-text extractions through a chain of stages and hand each report to the sinks.
+    
+    Args:
+        stages: Stage factories, called once per report since stages keep
+            per-report state. A stage has `feed(item)` and `finish()`, each
+            returning the items for the next stage; the first one is fed
+            response chunks and the last one must put out ReportEvents.
+        sinks: Objects with `write(result)`, called with each finished
+            PipelineResult in order; they must be safe to call from several
+            threads at once.
+    """
+    
+    def __init__(self, stages=DEFAULT_STAGES, sinks=()):
+        self.stages = tuple(stages)
+        self.sinks = list(sinks)
+    
+    def start(self):
+        """Begin post-processing a report."""
+        return PipelineRun(self)
+    
+    def process(self, chunks):
+        """Post-process a complete response, or any iterable of its chunks."""
+        run = self.start()
+        for chunk in chunks:
+            run.feed(chunk)
+        return run.finish()
+
+
+class DirectorySink:
+    """Write each report's normalized text to a local directory."""
+    
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def write(self, result):
+        with open(os.path.join(self.directory, result.file_name), "w", encoding="utf-8") as output:
+            output.write(result.text)
+
+
+class StorageSink:
+    """Save each report's normalized text to Cloud Storage, like a report saved from the app."""
+    
+    def __init__(self, storage_manager, bucket_name=BUCKET_NAME, folder=REPORTS_FOLDER):
+        self.storage_manager = storage_manager
+        self.bucket_name = bucket_name
+        self.folder = folder
+    
+    def write(self, result):
+        file_path = f"{self.folder}/{result.file_name}"
+        if self.storage_manager.upload_report(self.bucket_name, file_path, result.text) == "conflict":
+            raise FileExistsError(f"gs://{self.bucket_name}/{file_path} já existe com outro conteúdo")
+
+
+class IndexSink:
+    """
+    Record each report in the search index from its parsed fields, under the path a StorageSink saves it to.
+    
+    Put it after the sinks that save the report: a report one of them failed
+    to write is not indexed, so the index never points at a missing blob. The
+    StorageManager of a StorageSink in the same pipeline should have no report
+    index of its own, or the report is indexed twice.
+    """
+    
+    def __init__(self, report_index, bucket_name=BUCKET_NAME, folder=REPORTS_FOLDER):
+        self.report_index = report_index
+        self.bucket_name = bucket_name
+        self.folder = folder
+    
+    def write(self, result):
+        if result.sink_errors:
+            return
+        self.report_index.add(
+            self.bucket_name, f"{self.folder}/{result.file_name}", result.text, result.sha256, report=result.report
+        )
+
+
+class JsonlSink:
+    """Append one JSON line per quadro to a file, with its report's fields; safe to share across extractions."""
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def write(self, result):
+        report = result.report
+        header = {
+            "report": result.name,
+            "report_date": report["report_date"],
+            "category": report["category"],
+            "report_link": report["report_link"],
+        }
+        quadros = list(report["quadros"])
+        if report["para_aproveitar_agora"]:
+            quadros.append({"section": PARA_APROVEITAR_AGORA, "title": PARA_APROVEITAR_AGORA,
+                            "description": report["para_aproveitar_agora"], "type": "", "link": ""})
+        # A report's lines stay together even with several extractions writing at once
+        with self._lock, open(self.path, "a", encoding="utf-8") as output:
+            for position, quadro in enumerate(quadros):
+                output.write(json.dumps(dict(header, position=position, **quadro), ensure_ascii=False) + "\n")
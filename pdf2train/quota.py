@@ -0,0 +1,386 @@
+"""Client-side protection against Vertex AI quota and availability errors.
+
+TokenBucket paces request starts across every session and worker process.
+AdaptiveConcurrency shrinks the number of in-flight streams when the service
+pushes back and grows it again while calls succeed (AIMD). CircuitBreaker
+stops calling a service that keeps failing. QuotaGuard ties them together with
+jittered exponential retries.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+from .config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    GEMINI_BURST,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_RETRIES,
+    GEMINI_REQUESTS_PER_MINUTE,
+    GEMINI_RETRY_BASE,
+    GEMINI_RETRY_MAX,
+    QUOTA_STATE_PATH,
+)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; the bucket then only covers the current process
+    fcntl = None
+
+_guard = None
+_guard_lock = threading.Lock()
+
+_QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "Too Many Requests")
+_UNAVAILABLE_MARKERS = ("503", "504", "UNAVAILABLE", "DEADLINE_EXCEEDED")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service that is failing repeatedly."""
+
+
+def classify_error(exc):
+    """
+    Tell retryable service errors apart from everything else.
+    
+    Returns:
+        str: "quota" for 429s, "unavailable" for 5xx, deadlines and dropped
+        connections, None for errors a retry will not fix
+    """
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(exc, "status_code", None)
+    if code == 429:
+        return "quota"
+    if code in (500, 502, 503, 504):
+        return "unavailable"
+    if isinstance(exc, ConnectionError):
+        return "unavailable"
+    message = str(exc)
+    if any(marker in message for marker in _QUOTA_MARKERS):
+        return "quota"
+    if any(marker in message for marker in _UNAVAILABLE_MARKERS):
+        return "unavailable"
+    return None
+
+
+class TokenBucket:
+    """
+    Token bucket over request starts.
+    
+    With a `state_path`, the bucket lives in a small file guarded by an
+    exclusive lock, so every process on the host draws from the same quota.
+    """
+    
+    def __init__(self, requests_per_minute, burst, state_path=None):
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.state_path = state_path if fcntl is not None else None
+        self._state = {"tokens": float(self.burst), "updated": time.time()}
+        self._lock = threading.Lock()
+    
+    def _take(self, state):
+        """Take one token from `state`, returning how long the caller must wait for it."""
+        now = time.time()
+        tokens = min(self.burst, state["tokens"] + max(0.0, now - state["updated"]) * self.rate) - 1
+        state["tokens"] = tokens
+        state["updated"] = now
+        # A negative balance is a reservation: the caller waits until it is paid back
+        return -tokens / self.rate if tokens < 0 else 0.0
+    
+    def reserve(self):
+        """Reserve a request start; returns the seconds to wait before making it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            if self.state_path is None:
+                return self._take(self._state)
+            with open(self.state_path, "a+", encoding="utf-8") as state_file:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+                try:
+                    state_file.seek(0)
+                    try:
+                        state = json.loads(state_file.read())
+                    except ValueError:
+                        state = {"tokens": float(self.burst), "updated": time.time()}
+                    delay = self._take(state)
+                    state_file.seek(0)
+                    state_file.truncate()
+                    state_file.write(json.dumps(state))
+                    state_file.flush()
+                finally:
+                    fcntl.flock(state_file, fcntl.LOCK_UN)
+            return delay
+    
+    def acquire(self):
+        """Block until a request may start."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit in-flight calls with additive-increase / multiplicative-decrease.
+    
+    Each success raises the limit by `increase / limit` (about +1 per round of
+    calls); each throttled call multiplies it by `decrease_factor`, at most
+    once per `cooldown` seconds, so a burst of 429s from one wave of requests
+    counts as a single signal.
+    """
+    
+    def __init__(self, max_limit, min_limit=1, decrease_factor=0.5, increase=1.0, cooldown=1.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.increase = increase
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+    
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+    
+    def release(self, outcome):
+        """Free a slot and adapt the limit to the call's outcome ("ok", "quota", "unavailable" or other)."""
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            elif outcome in ("quota", "unavailable"):
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Stop calling a service after `failure_threshold` consecutive failures.
+    
+    After `reset_timeout` seconds one trial call is let through (half-open);
+    its success closes the circuit again, its failure re-opens it.
+    """
+    
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        """
+        Let a call through, or refuse it while the circuit is open.
+        
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+            if self.state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(f"Gemini indisponível; novas tentativas em {remaining:.0f}s")
+    
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+    
+    def record_abandoned(self):
+        """The call ended without telling us anything about the service (e.g. the caller stopped reading)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class QuotaGuard:
+    """Run streaming model calls under the token bucket, AIMD limit, circuit breaker and retries."""
+    
+    def __init__(self, bucket, concurrency, breaker, max_retries=GEMINI_MAX_RETRIES,
+                 retry_base=GEMINI_RETRY_BASE, retry_max=GEMINI_RETRY_MAX):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._random = random.Random()
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "resumed": 0, "quota_errors": 0, "unavailable_errors": 0}
+    
+    def _count(self, name):
+        from .telemetry import get_telemetry
+        
+        with self._stats_lock:
+            self._stats[name] += 1
+        if name == "retries":
+            get_telemetry().inc("pdf2train_gemini_retries_total")
+        elif name.endswith("_errors"):
+            get_telemetry().inc("pdf2train_gemini_errors_total", kind=name[:-len("_errors")])
+    
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff before retry number `attempt`."""
+        return self._random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+    
+    def _finish_attempt(self, outcome):
+        self.concurrency.release(outcome)
+        if outcome == "ok":
+            self.breaker.record_success()
+        elif outcome == "unavailable":
+            self.breaker.record_failure()
+        else:
+            # Quota errors mean the service is up but we are over budget; AIMD handles those
+            self.breaker.record_abandoned()
+    
+    def _should_retry(self, exc, attempt, emitted, resumable):
+        kind = classify_error(exc)
+        if kind is not None:
+            self._count(f"{kind}_errors")
+        if kind is None or attempt >= self.max_retries or (emitted and not resumable):
+            return kind, False
+        self._count("retries")
+        if emitted:
+            self._count("resumed")
+        return kind, True
+    
+    def stream(self, open_stream, resumable=True):
+        """
+        Yield the text chunks of a streaming call, retrying retryable errors.
+        
+        Args:
+            open_stream (callable): Called with the text already yielded ("" on
+                the first attempt) and returns an iterator of text chunks; after
+                a mid-stream failure it must continue from that text
+            resumable (bool): Whether a stream that already yielded text may be
+                retried; when False such a failure is re-raised
+        """
+        emitted = []
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.bucket.acquire()
+            self.concurrency.acquire()
+            self._count("calls")
+            outcome = None
+            stream = None
+            try:
+                stream = open_stream("".join(emitted))
+                for text in stream:
+                    emitted.append(text)
+                    yield text
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome, retry = self._should_retry(exc, attempt, emitted, resumable)
+                if not retry:
+                    raise
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                self._finish_attempt(outcome)
+            attempt += 1
+            time.sleep(self.backoff(attempt))
+    
+    async def _acquire_slot(self):
+        """Wait for a concurrency slot without blocking the event loop, and without leaking it if cancelled."""
+        acquire = asyncio.ensure_future(asyncio.to_thread(self.concurrency.acquire))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The thread still takes the slot once one frees up; hand it straight back
+            def release(future):
+                if not future.cancelled() and future.exception() is None:
+                    self.concurrency.release(None)
+            
+            acquire.add_done_callback(release)
+            raise
+    
+    async def astream(self, open_stream, resumable=True):
+        """Async counterpart of `stream`; `open_stream` returns an async iterator of text chunks."""
+        emitted = []
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            delay = self.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._acquire_slot()
+            self._count("calls")
+            outcome = None
+            stream = None
+            try:
+                stream = open_stream("".join(emitted))
+                async for text in stream:
+                    emitted.append(text)
+                    yield text
+                outcome = "ok"
+                return
+            except Exception as exc:
+                outcome, retry = self._should_retry(exc, attempt, emitted, resumable)
+                if not retry:
+                    raise
+            finally:
+                aclose = getattr(stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+                self._finish_attempt(outcome)
+            attempt += 1
+            await asyncio.sleep(self.backoff(attempt))
+    
+    def stats(self):
+        """Retry counters plus the current concurrency limit and circuit state."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(
+            concurrency_limit=round(self.concurrency.limit, 2),
+            in_flight=self.concurrency.in_flight,
+            circuit=self.breaker.state,
+        )
+        return stats
+
+
+def build_quota_guard(requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, burst=GEMINI_BURST,
+                      max_concurrency=GEMINI_MAX_CONCURRENCY, state_path=QUOTA_STATE_PATH):
+    """QuotaGuard with the configured limits; pass state_path=None to keep the bucket in-process."""
+    if state_path:
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    return QuotaGuard(
+        TokenBucket(requests_per_minute, burst, state_path=state_path),
+        AdaptiveConcurrency(max_concurrency),
+        CircuitBreaker(),
+    )
+
+
+def get_quota_guard():
+    """Process-wide quota guard; its token bucket is shared with every other process on the host."""
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            _guard = build_quota_guard()
+        return _guard
@@ -0,0 +1,160 @@
+"""Per-document model routing and the check that decides whether a speculative response is kept."""
+import threading
+from dataclasses import dataclass
+
+from .config import (
+    MODEL_FAST,
+    MODEL_NAME,
+    MODEL_ROUTING,
+    MODEL_STRONG,
+    ROUTE_FAST_MAX_BYTES,
+    ROUTE_FAST_MAX_PAGES,
+    ROUTE_MIN_QUADROS,
+    ROUTE_STRONG_MIN_BYTES,
+    ROUTE_STRONG_MIN_PAGES,
+)
+
+_router = None
+_router_lock = threading.Lock()
+
+ROUTING_MODES = ("off", "size", "speculative")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Where a document's extraction goes: its model, and the cheaper model to try first, if any."""
+    
+    name: str
+    model: str
+    pages: int = None
+    speculative_model: str = None
+
+
+def check_extraction(response, structured, min_quadros=ROUTE_MIN_QUADROS):
+    """
+    Check that a response holds up as a Trendspot report.
+    
+    Structured responses must match TrendspotReport; both kinds need a valid
+    report date, a category and at least `min_quadros` quadros, each with a
+    title and a type.
+    
+    Returns:
+        str: Why the response is rejected, or None if it is usable
+    """
+    from .search import parse_date, parse_report
+    
+    if structured:
+        from pydantic import ValidationError
+        
+        from .schema import TrendspotReport
+        
+        try:
+            TrendspotReport.model_validate_json(response)
+        except ValidationError as exc:
+            return f"schema ({exc.error_count()} errors)"
+    report = parse_report(response)
+    if parse_date(report["report_date"]) is None:
+        return "report date"
+    if not report["category"]:
+        return "category"
+    if len(report["quadros"]) < min_quadros:
+        return f"{len(report['quadros'])} quadros"
+    if any(not quadro["title"] or not quadro["type"] for quadro in report["quadros"]):
+        return "incomplete quadro"
+    return None
+
+
+class ModelRouter:
+    """Pick the model for each document and keep latency, cost and escalation counts per route."""
+    
+    def __init__(self, mode=MODEL_ROUTING, fast_model=MODEL_FAST, default_model=MODEL_NAME, strong_model=MODEL_STRONG,
+                 fast_max_pages=ROUTE_FAST_MAX_PAGES, fast_max_bytes=ROUTE_FAST_MAX_BYTES,
+                 strong_min_pages=ROUTE_STRONG_MIN_PAGES, strong_min_bytes=ROUTE_STRONG_MIN_BYTES):
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode {mode!r}; expected one of {', '.join(ROUTING_MODES)}")
+        self.mode = mode
+        self.models = {"fast": fast_model, "default": default_model, "strong": strong_model}
+        self.fast_max_pages = fast_max_pages
+        self.fast_max_bytes = fast_max_bytes
+        self.strong_min_pages = strong_min_pages
+        self.strong_min_bytes = strong_min_bytes
+        self._stats = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def signature(self):
+        """Model part of extraction cache keys: the model itself, or the routing setup when documents are routed."""
+        if self.mode == "off":
+            return self.models["default"]
+        return f"{self.mode}:{self.models['fast']}/{self.models['default']}/{self.models['strong']}"
+    
+    def route(self, document):
+        """
+        Route a document by page count and size.
+        
+        Short, small documents go to the fast model, long or large ones to the
+        strong model and the rest to the default model. In speculative mode
+        every document below the strong tier is tried on the fast model first
+        and escalates one tier above its own.
+        """
+        if self.mode == "off":
+            return Route("default", self.models["default"])
+        
+        from .pages import PageSplitExtractor
+        
+        try:
+            pages = PageSplitExtractor.page_count(document)
+        except Exception:
+            # Unreadable here does not mean unreadable for the model; route by size alone
+            pages = None
+        if (pages or 0) >= self.strong_min_pages or document.size >= self.strong_min_bytes:
+            return Route("strong", self.models["strong"], pages)
+        tier = "default"
+        if pages is not None and pages <= self.fast_max_pages and document.size <= self.fast_max_bytes:
+            tier = "fast"
+        if self.mode == "speculative":
+            escalation = "default" if tier == "fast" else "strong"
+            return Route(f"{tier}/speculative", self.models[escalation], pages, self.models["fast"])
+        return Route(tier, self.models[tier], pages)
+    
+    def record(self, route, outcome, seconds, cost):
+        """Account a finished extraction to its route."""
+        from .telemetry import get_telemetry
+        
+        telemetry = get_telemetry()
+        telemetry.inc("pdf2train_route_requests_total", route=route.name, outcome=outcome)
+        telemetry.observe("pdf2train_route_seconds", seconds, route=route.name)
+        if cost:
+            telemetry.inc("pdf2train_route_cost_usd_total", cost, route=route.name)
+        with self._lock:
+            stats = self._stats.setdefault(
+                route.name, {"requests": 0, "escalated": 0, "failed": 0, "seconds": 0.0, "cost_usd": 0.0}
+            )
+            stats["requests"] += 1
+            stats["escalated"] += outcome == "escalated"
+            stats["failed"] += outcome == "failed"
+            stats["seconds"] += seconds
+            stats["cost_usd"] += cost
+    
+    def stats(self):
+        """Requests, mean latency, cost and escalation rate per route."""
+        with self._lock:
+            return {
+                name: {
+                    "requests": stats["requests"],
+                    "failed": stats["failed"],
+                    "mean_seconds": round(stats["seconds"] / stats["requests"], 3),
+                    "cost_usd": round(stats["cost_usd"], 6),
+                    "escalation_rate": round(stats["escalated"] / stats["requests"], 3),
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+def get_model_router():
+    """Process-wide model router shared by every GeminiClient."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,129 @@
+"""Typed Trendspot report records and incremental parsing of streamed JSON."""
+import json
+from typing import List
+
+from pydantic import BaseModel
+
+from .naming import ReportNameGenerator
+
+
+class Quadro(BaseModel):
+    """One card of a Trendspot report."""
+    
+    section: str
+    title: str
+    description: str
+    type: str
+    link: str
+
+
+class TrendspotReport(BaseModel):
+    """Typed record of a Trendspot report, used as the model's response schema."""
+    
+    report_date: str
+    category: str
+    report_link: str
+    quadros: List[Quadro]
+    para_aproveitar_agora: str
+    
+    def to_text(self):
+        """Render the report in the free-text Nome/Categoria/quadros format."""
+        separator = "*" * 47
+        lines = [
+            f"Nome : Trendspot do dia {self.report_date}",
+            f"Categoria : {self.category}",
+            f"Link do relatório : {self.report_link or 'Insira o link aqui'}",
+            separator,
+        ]
+        section = None
+        for quadro in self.quadros:
+            if quadro.section != section:
+                section = quadro.section
+                lines.append(f"{section}:")
+            lines.extend([
+                quadro.title,
+                quadro.description,
+                f"Tipo : {quadro.type}",
+                f"Link : {quadro.link or 'Insira o link aqui'}",
+                separator,
+            ])
+        lines.append(f"Para Aproveitar Agora: {self.para_aproveitar_agora}")
+        return "\n".join(lines)
+
+
+class StructuredStreamParser:
+    """Pick complete quadros out of a streamed JSON report as they arrive."""
+    
+    def __init__(self):
+        self._chunks = []
+        self._containers = []
+        self._in_string = False
+        self._escape = False
+        self._capture = None
+    
+    def feed(self, chunk):
+        """
+        Consume a streamed chunk.
+        
+        Returns:
+            list: Quadro dicts completed by this chunk
+        """
+        self._chunks.append(chunk)
+        completed = []
+        for char in chunk:
+            if self._capture is not None:
+                self._capture.append(char)
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._containers.append(char)
+                # Objects inside an array of the top-level object are quadros
+                if self._containers == ["{", "[", "{"]:
+                    self._capture = ["{"]
+            elif char in "}]" and self._containers:
+                if char == "}" and self._capture is not None and len(self._containers) == 3:
+                    try:
+                        completed.append(json.loads("".join(self._capture)))
+                    except ValueError:
+                        pass
+                    self._capture = None
+                self._containers.pop()
+        return completed
+    
+    def text(self):
+        """Raw JSON received so far."""
+        return "".join(self._chunks)
+    
+    def result(self):
+        """Validate the complete response once, raising ValidationError if it is malformed."""
+        return TrendspotReport.model_validate_json(self.text())
+
+
+def render_report(response, structured):
+    """
+    Turn an extraction into what gets saved.
+    
+    Structured responses are validated and stored as compact JSON records,
+    free-text responses are stored as-is.
+    
+    Returns:
+        tuple: (suggested name, content, file extension)
+        
+    Raises:
+        ValidationError: If a structured response does not match TrendspotReport
+    """
+    if not structured:
+        return ReportNameGenerator.suggest_name(response), response, "txt"
+    
+    report = TrendspotReport.model_validate_json(response)
+    return ReportNameGenerator.suggest_name(report.to_text()), report.model_dump_json(), "json"
@@ -0,0 +1,501 @@
+"""Local search index over the saved Trendspot reports.
+
+Reports are stored as loose blobs, so answering "every Beleza trend of type
+Áudio last month" from the bucket means downloading all of them. The index
+keeps the metadata of every saved report (date, category, and section and type
+of each quadro) in indexed SQLite columns and the text of its quadros in an
+FTS5 full-text table, and is updated as reports are saved. Case and accents are
+folded on both sides, so "audio" finds "Áudio".
+"""
+import datetime
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from .config import REPORT_INDEX_FETCH_WORKERS, REPORT_INDEX_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    report_date TEXT,
+    category TEXT NOT NULL,
+    category_key TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    indexed_at REAL NOT NULL,
+    UNIQUE (bucket, path)
+);
+CREATE INDEX IF NOT EXISTS reports_by_date ON reports (report_date);
+CREATE INDEX IF NOT EXISTS reports_by_category ON reports (category_key, report_date);
+CREATE TABLE IF NOT EXISTS quadros (
+    id INTEGER PRIMARY KEY,
+    report_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    type TEXT NOT NULL,
+    type_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quadros_by_report ON quadros (report_id, position);
+CREATE INDEX IF NOT EXISTS quadros_by_type ON quadros (type_key, report_id);
+-- One document per report (rowid = reports.id), so a common word costs one row per report, not per quadro.
+-- Contentless: the text is already in quadros and is rebuilt from there to delete a document.
+CREATE VIRTUAL TABLE IF NOT EXISTS report_text USING fts5(
+    body, content='', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+PARA_APROVEITAR_AGORA = "Para Aproveitar Agora"
+
+_MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+# SQLite builds limit the number of bound parameters of a statement
+_MAX_PARAMETERS = 500
+# Seconds the search filter options are reused before being counted again
+_FACETS_TTL = 30
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass
+class ReportHit:
+    """A report matching a search, with its quadros that match the text and type searched for."""
+    
+    bucket: str
+    path: str
+    name: str
+    report_date: str
+    category: str
+    quadros: list = field(default_factory=list)
+
+
+@dataclass
+class SearchResult:
+    """The newest `limit` matching reports, out of `total`."""
+    
+    hits: list
+    total: int
+    seconds: float
+
+
+def fold(value):
+    """Case- and accent-insensitive key: "Áudio" and "audio" fold to the same string."""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    return " ".join("".join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+def parse_date(value):
+    """
+    Normalize a report date ("14/10/2026", "14 de outubro de 2026", "2026-10-14").
+    
+    Returns:
+        str: ISO date, or None if `value` holds no valid date
+    """
+    folded = fold(value)
+    match = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", folded)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+    else:
+        match = re.search(r"(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})", folded)
+        if match:
+            day, month, year = (int(part) for part in match.groups())
+            year += 2000 if year < 100 else 0
+        else:
+            match = re.search(r"(\d{1,2})\s+de\s+([a-z]+)\s+de\s+(\d{4})", folded)
+            if not match or match.group(2) not in _MONTHS:
+                return None
+            day, month, year = int(match.group(1)), _MONTHS[match.group(2)], int(match.group(3))
+    try:
+        return datetime.date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _parse_text(content):
+    """Parse the free-text Nome/Categoria/quadros format, tolerating the model's small deviations."""
+    # The streaming report pipeline parses free text line by line; a saved report is just all of its lines
+    from .pipeline import parse_lines
+    
+    return parse_lines(content.splitlines())
+
+
+def parse_report(content):
+    """
+    Pull the searchable fields out of a saved report, JSON (structured) or free text.
+    
+    Returns:
+        dict: report_date, category, report_link, quadros (section, title,
+        description, type and link dicts) and para_aproveitar_agora, with ""
+        for what is missing
+    """
+    if content.lstrip().startswith("{"):
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return {
+                "report_date": str(data.get("report_date") or ""),
+                "category": str(data.get("category") or ""),
+                "report_link": str(data.get("report_link") or ""),
+                "quadros": [
+                    {key: str(quadro.get(key) or "") for key in ("section", "title", "description", "type", "link")}
+                    for quadro in data.get("quadros") or [] if isinstance(quadro, dict)
+                ],
+                "para_aproveitar_agora": str(data.get("para_aproveitar_agora") or ""),
+            }
+    return _parse_text(content)
+
+
+def _words(text):
+    return re.findall(r"\w+", fold(text))
+
+
+def _match_query(words):
+    """FTS5 query requiring every word, each as a prefix, with FTS syntax neutralized."""
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _body(quadros):
+    """The full-text document of a report."""
+    return "\n".join(f"{quadro['title']}\n{quadro['description']}" for quadro in quadros)
+
+
+def _matching_quadros(quadros, words, type_key):
+    """Quadros of the searched type holding every word, or any of them if the words are spread across quadros."""
+    if type_key:
+        quadros = [quadro for quadro in quadros if fold(quadro["type"]) == type_key]
+    if not words:
+        return quadros
+    found = []
+    for quadro in quadros:
+        tokens = _words(f"{quadro['title']} {quadro['description']}")
+        found.append(sum(any(token.startswith(word) for token in tokens) for word in words))
+    best = max(found, default=0)
+    return [quadro for quadro, count in zip(quadros, found) if count == best and count]
+
+
+def _chunks(values, size=_MAX_PARAMETERS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class ReportIndex:
+    """SQLite index of saved reports: metadata columns plus full-text search over their quadros."""
+    
+    def __init__(self, db_path=REPORT_INDEX_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._facets = None
+        self._facets_at = 0.0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+    
+    def _connection(self):
+        """One connection per thread; SQLite connections must not be shared across threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._facets = None
+    
+    def _store(self, connection, bucket, path, content, digest, report=None):
+        """Insert or replace one report; returns False if it was already indexed with this content."""
+        row = connection.execute(
+            "SELECT id, sha256 FROM reports WHERE bucket = ? AND path = ?", (bucket, path)
+        ).fetchone()
+        if row is not None and row[1] == digest:
+            return False
+        
+        if report is None:
+            report = parse_report(content)
+        name = posixpath.splitext(posixpath.basename(path))[0]
+        values = (name, parse_date(report["report_date"]), report["category"], fold(report["category"]),
+                  digest, time.time())
+        if row is None:
+            report_id = connection.execute(
+                "INSERT INTO reports (name, report_date, category, category_key, sha256, indexed_at, bucket, path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (bucket, path),
+            ).lastrowid
+        else:
+            report_id = row[0]
+            self._forget_quadros(connection, report_id)
+            connection.execute(
+                "UPDATE reports SET name = ?, report_date = ?, category = ?, category_key = ?, sha256 = ?, "
+                "indexed_at = ? WHERE id = ?",
+                values + (report_id,),
+            )
+        
+        quadros = list(report["quadros"])
+        if report["para_aproveitar_agora"]:
+            quadros.append({"section": PARA_APROVEITAR_AGORA, "title": PARA_APROVEITAR_AGORA,
+                            "description": report["para_aproveitar_agora"], "type": ""})
+        connection.executemany(
+            "INSERT INTO quadros (report_id, position, section, title, description, type, type_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (report_id, position, quadro["section"], quadro["title"], quadro["description"],
+                 quadro["type"], fold(quadro["type"]))
+                for position, quadro in enumerate(quadros)
+            ],
+        )
+        connection.execute("INSERT INTO report_text (rowid, body) VALUES (?, ?)", (report_id, _body(quadros)))
+        return True
+    
+    @staticmethod
+    def _forget_quadros(connection, report_id):
+        """Delete a report's quadros and its full-text document."""
+        quadros = [
+            {"title": title, "description": description}
+            for title, description in connection.execute(
+                "SELECT title, description FROM quadros WHERE report_id = ? ORDER BY position", (report_id,)
+            )
+        ]
+        # A contentless FTS5 table deletes a document given the exact text it was indexed with
+        connection.execute(
+            "INSERT INTO report_text (report_text, rowid, body) VALUES ('delete', ?, ?)", (report_id, _body(quadros))
+        )
+        connection.execute("DELETE FROM quadros WHERE report_id = ?", (report_id,))
+    
+    def add(self, bucket, path, content, sha256=None, report=None):
+        """
+        Index a saved report, replacing what was indexed for `path` before.
+        
+        Args:
+            bucket (str): Bucket the report was saved to
+            path (str): Blob name of the report
+            content (str): Report content as saved
+            sha256 (str): Hex digest of the content, if already known
+            report (dict): The content as parse_report returns it, if already
+                parsed
+        
+        Returns:
+            bool: False if the report was already indexed with this content
+        """
+        digest = sha256 or hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._transaction() as connection:
+            return self._store(connection, bucket, path, content, digest, report)
+    
+    def add_many(self, reports):
+        """Index (bucket, path, content, sha256) tuples in a single transaction; returns how many changed."""
+        reports = list(reports)
+        if not reports:
+            return 0
+        with self._transaction() as connection:
+            return sum(
+                self._store(connection, bucket, path, content,
+                            sha256 or hashlib.sha256(content.encode("utf-8")).hexdigest())
+                for bucket, path, content, sha256 in reports
+            )
+    
+    def remove(self, bucket, paths):
+        """Drop reports that no longer exist in `bucket`."""
+        with self._transaction() as connection:
+            for path in paths:
+                row = connection.execute(
+                    "SELECT id FROM reports WHERE bucket = ? AND path = ?", (bucket, path)
+                ).fetchone()
+                if row is not None:
+                    self._forget_quadros(connection, row[0])
+                    connection.execute("DELETE FROM reports WHERE id = ?", (row[0],))
+    
+    def known(self, bucket, prefix=""):
+        """{path: sha256} of the indexed reports of `bucket` under `prefix`."""
+        return dict(self._connection().execute(
+            "SELECT path, sha256 FROM reports WHERE bucket = ? AND substr(path, 1, ?) = ?",
+            (bucket, len(prefix), prefix),
+        ))
+    
+    def search(self, text=None, category=None, quadro_type=None, date_from=None, date_to=None,
+               bucket=None, limit=50):
+        """
+        Find reports by quadro text, category, quadro type and date range.
+        
+        Args:
+            text (str): Words that must all appear in the report's quadros,
+                each matched as a prefix
+            category (str): Report category, e.g. "Beleza"
+            quadro_type (str): Quadro type, e.g. "Áudio"
+            date_from (datetime.date | str): First report date, inclusive
+            date_to (datetime.date | str): Last report date, inclusive
+            bucket (str): Only reports saved to this bucket
+            limit (int): Maximum number of reports returned
+        
+        Returns:
+            SearchResult: Matching reports, newest first, each with the
+            quadros that match `text` and `quadro_type` (all of its quadros
+            when neither is given)
+        """
+        from .telemetry import span
+        
+        start = time.perf_counter()
+        conditions, parameters = [], []
+        if category:
+            conditions.append("r.category_key = ?")
+            parameters.append(fold(category))
+        if date_from:
+            conditions.append("r.report_date >= ?")
+            parameters.append(str(date_from))
+        if date_to:
+            conditions.append("r.report_date <= ?")
+            parameters.append(str(date_to))
+        if bucket:
+            conditions.append("r.bucket = ?")
+            parameters.append(bucket)
+        type_key = fold(quadro_type)
+        if type_key:
+            conditions.append("EXISTS (SELECT 1 FROM quadros q WHERE q.type_key = ? AND q.report_id = r.id)")
+            parameters.append(type_key)
+        words = _words(text)
+        if words:
+            conditions.append("r.id IN (SELECT rowid FROM report_text WHERE report_text MATCH ?)")
+            parameters.append(_match_query(words))
+        
+        connection = self._connection()
+        with span("reports.search", text=bool(words), category=bool(category), quadro_type=bool(type_key)):
+            # The window count saves a second pass over the matches just to count them
+            rows = connection.execute(
+                f"SELECT r.id, COUNT(*) OVER () FROM reports r WHERE {' AND '.join(conditions) or '1'} "
+                "ORDER BY r.report_date DESC, r.id DESC LIMIT ?",
+                parameters + [limit],
+            ).fetchall()
+            hits = self._load(connection, [report_id for report_id, _ in rows])
+        if words or type_key:
+            for hit in hits:
+                hit.quadros = _matching_quadros(hit.quadros, words, type_key)
+        return SearchResult(hits, rows[0][1] if rows else 0, time.perf_counter() - start)
+    
+    @staticmethod
+    def _load(connection, report_ids):
+        """Hits for `report_ids`, in order, with all their quadros."""
+        hits = {}
+        for chunk in _chunks(report_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            for report_id, *fields in connection.execute(
+                f"SELECT id, bucket, path, name, report_date, category FROM reports WHERE id IN ({placeholders})",
+                chunk,
+            ):
+                hits[report_id] = ReportHit(*fields)
+            for report_id, section, title, description, quadro_type in connection.execute(
+                "SELECT report_id, section, title, description, type FROM quadros "
+                f"WHERE report_id IN ({placeholders}) ORDER BY report_id, position",
+                chunk,
+            ):
+                hits[report_id].quadros.append(
+                    {"section": section, "title": title, "description": description, "type": quadro_type}
+                )
+        return [hits[report_id] for report_id in report_ids]
+    
+    def facets(self):
+        """
+        Categories and quadro types in the index, most frequent first, for search filters.
+        
+        Returns:
+            dict: {"categories": [(name, reports)], "types": [(name, quadros)]}
+        """
+        if self._facets is not None and time.monotonic() - self._facets_at < _FACETS_TTL:
+            return self._facets
+        connection = self._connection()
+        facets = {}
+        for facet, table, column, key in (("categories", "reports", "category", "category_key"),
+                                          ("types", "quadros", "type", "type_key")):
+            # Counting by key alone reads only the index; the display name is then looked up once per key
+            counts = connection.execute(
+                f"SELECT {key}, COUNT(*) FROM {table} WHERE {key} != '' GROUP BY {key} ORDER BY COUNT(*) DESC"
+            ).fetchall()
+            facets[facet] = [
+                (connection.execute(f"SELECT {column} FROM {table} WHERE {key} = ? LIMIT 1", (value,)).fetchone()[0],
+                 count)
+                for value, count in counts
+            ]
+        self._facets = facets
+        self._facets_at = time.monotonic()
+        return self._facets
+    
+    def rebuild(self, storage_manager, bucket, prefix="", max_workers=REPORT_INDEX_FETCH_WORKERS, batch_size=200):
+        """
+        Bring the index in line with the reports saved in `bucket` under `prefix`.
+        
+        Blobs whose sha256 metadata matches the indexed content are skipped,
+        the rest are fetched in parallel and indexed in batches, and indexed
+        reports no longer in the bucket are dropped.
+        
+        Returns:
+            dict: Counts of listed, unchanged, fetched, failed and removed reports
+        """
+        from .telemetry import span
+        
+        with span("reports.rebuild", bucket=bucket, prefix=prefix) as rebuild_span:
+            known = self.known(bucket, prefix)
+            listed = dict(storage_manager.list_reports(bucket, prefix))
+            pending = [path for path, digest in listed.items() if digest is None or known.get(path) != digest]
+            counts = {"listed": len(listed), "unchanged": len(listed) - len(pending), "fetched": 0, "failed": 0}
+            
+            batch = []
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = {executor.submit(storage_manager.read_report, bucket, path): path for path in pending}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        batch.append((bucket, path, future.result(), listed[path]))
+                    except Exception:
+                        counts["failed"] += 1
+                        continue
+                    counts["fetched"] += 1
+                    if len(batch) >= batch_size:
+                        self.add_many(batch)
+                        batch = []
+            self.add_many(batch)
+            
+            stale = [path for path in known if path not in listed]
+            self.remove(bucket, stale)
+            counts["removed"] = len(stale)
+            rebuild_span.set(**counts)
+        return counts
+    
+    def stats(self):
+        """Number of indexed reports and quadros."""
+        connection = self._connection()
+        return {
+            "reports": connection.execute("SELECT COUNT(*) FROM reports").fetchone()[0],
+            "quadros": connection.execute("SELECT COUNT(*) FROM quadros").fetchone()[0],
+        }
+
+
+def get_report_index():
+    """Process-wide report search index shared by every session."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ReportIndex()
+        return _index
@@ -0,0 +1,246 @@
+"""Lightweight HTTP extraction service with a bounded request queue.
+
+Endpoints:
+    POST /extract?name=relatorio.pdf&structured=1   body: PDF bytes -> 202 {"id": ..., "status": "queued"}
+    GET  /jobs/<id>                                 -> job status and, once done, the response
+    GET  /reports?q=cabelo&category=Beleza&type=Áudio&since=2026-09-01
+                                                    -> saved reports matching the search
+    GET  /metrics                                   -> Prometheus metrics of every pdf2train process
+    GET  /healthz                                   -> queue depth, worker count and quota guard state
+    GET  /readyz                                    -> 200 once the boot warm-up is done, 503 until then
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .config import (
+    BATCH_MAX_WORKERS,
+    BATCH_REQUESTS_PER_MINUTE,
+    SERVER_MAX_JOBS,
+    SERVER_MAX_UPLOAD_BYTES,
+    SERVER_QUEUE_SIZE,
+    STRUCTURED_SYSTEM_INSTRUCTIONS,
+    SYSTEM_INSTRUCTIONS,
+)
+
+
+@dataclass
+class ExtractionJob:
+    """An extraction request and its outcome."""
+    
+    id: str
+    name: str
+    structured: bool
+    status: str = "queued"
+    response: str = None
+    error: str = None
+    duplicate_of: str = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    
+    def to_dict(self):
+        return asdict(self)
+
+
+class ExtractionService:
+    """Queue extraction jobs and run them on a fixed pool of worker threads."""
+    
+    def __init__(self, gemini_client, workers=BATCH_MAX_WORKERS, queue_size=SERVER_QUEUE_SIZE,
+                 requests_per_minute=BATCH_REQUESTS_PER_MINUTE, cache=None, max_jobs=SERVER_MAX_JOBS,
+                 duplicates=None):
+        from .batch import BatchProcessor, RateLimiter
+        
+        rate_limiter = RateLimiter(requests_per_minute)
+        self._processors = {
+            structured: BatchProcessor(
+                gemini_client,
+                STRUCTURED_SYSTEM_INSTRUCTIONS if structured else SYSTEM_INSTRUCTIONS,
+                max_workers=1,
+                cache=cache,
+                structured=structured,
+                rate_limiter=rate_limiter,
+                duplicates=duplicates,
+            )
+            for structured in (False, True)
+        }
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f"extraction-{index}", daemon=True).start()
+    
+    def submit(self, name, document, structured=False):
+        """
+        Queue a document for extraction.
+        
+        Raises:
+            queue.Full: If the queue is at capacity
+        """
+        job = ExtractionJob(id=uuid.uuid4().hex, name=name, structured=structured)
+        self._queue.put_nowait((job, document))
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once the store is full
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self.max_jobs:
+                    break
+                if self._jobs[job_id].status in ("done", "failed"):
+                    del self._jobs[job_id]
+        return job
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def stats(self):
+        from .quota import get_quota_guard
+        from .routing import get_model_router
+        
+        return {"queued": self._queue.qsize(), "workers": self.workers, "jobs": len(self._jobs),
+                "quota": get_quota_guard().stats(), "routes": get_model_router().stats()}
+    
+    def _work(self):
+        while True:
+            job, document = self._queue.get()
+            job.status = "running"
+            try:
+                result = self._processors[job.structured].extract(job.name, document)
+                job.response = result.response
+                job.error = result.error
+                job.duplicate_of = result.duplicate_of
+                job.status = "done" if result.ok else "failed"
+            except Exception as exc:
+                job.error = f"{type(exc).__name__}: {exc}"
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the ExtractionService attached to the server."""
+    
+    def _send_text(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _search_reports(self, query):
+        from .search import get_report_index
+        
+        def param(name):
+            return query.get(name, [None])[0]
+        
+        try:
+            limit = int(param("limit") or 50)
+        except ValueError:
+            self._send_json(400, {"error": "limit deve ser um número"})
+            return
+        result = get_report_index().search(
+            param("q"), category=param("category"), quadro_type=param("type"),
+            date_from=param("since"), date_to=param("until"), limit=limit,
+        )
+        self._send_json(200, {
+            "total": result.total,
+            "seconds": round(result.seconds, 4),
+            "reports": [asdict(hit) for hit in result.hits],
+        })
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path
+        service = self.server.service
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok", **service.stats()})
+        elif path == "/readyz":
+            warmup = self.server.warmup
+            self._send_json(200 if warmup.ready else 503, warmup.status())
+        elif path == "/metrics":
+            from .telemetry import render_metrics
+            
+            self._send_text(200, render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path.startswith("/jobs/"):
+            job = service.get(path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "job não encontrado"})
+            else:
+                self._send_json(200, job.to_dict())
+        elif path == "/reports":
+            self._search_reports(parse_qs(url.query))
+        else:
+            self._send_json(404, {"error": "rota não encontrada"})
+    
+    def do_POST(self):
+        from .documents import PdfDocument
+        
+        url = urlsplit(self.path)
+        if url.path != "/extract":
+            self._send_json(404, {"error": "rota não encontrada"})
+            return
+        
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "envie o PDF no corpo da requisição"})
+            return
+        if length > SERVER_MAX_UPLOAD_BYTES:
+            self._send_json(413, {"error": f"PDF maior que {SERVER_MAX_UPLOAD_BYTES} bytes"})
+            return
+        
+        query = parse_qs(url.query)
+        name = query.get("name", ["documento.pdf"])[0]
+        structured = query.get("structured", ["0"])[0] in ("1", "true")
+        document = PdfDocument(self.rfile.read(length))
+        try:
+            job = self.server.service.submit(name, document, structured)
+        except queue.Full:
+            self._send_json(503, {"error": "fila cheia, tente novamente"}, {"Retry-After": "5"})
+            return
+        self._send_json(202, {"id": job.id, "status": job.status}, {"Location": f"/jobs/{job.id}"})
+
+
+def run_server(host, port, workers=BATCH_MAX_WORKERS, queue_size=SERVER_QUEUE_SIZE):
+    """Serve extraction requests until interrupted."""
+    from .cache import get_extraction_cache
+    from .clients import get_client_registry
+    from .dedup import get_duplicate_index
+    from .gemini import GeminiClient
+    from .storage import StorageManager
+    from .warmup import get_warmup
+    
+    registry = get_client_registry()
+    storage_manager = StorageManager(None, storage_client=registry.get("storage"))
+    gemini_client = GeminiClient(None, None, client=registry.get("gemini"), storage_manager=storage_manager)
+    
+    server = ThreadingHTTPServer((host, port), ExtractionRequestHandler)
+    server.service = ExtractionService(gemini_client, workers=workers, queue_size=queue_size,
+                                       cache=get_extraction_cache(), duplicates=get_duplicate_index())
+    # Listening already answers /healthz; /readyz waits for the SDK imports and the first connections
+    server.warmup = get_warmup().start()
+    print(f"pdf2train serving on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
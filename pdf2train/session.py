@@ -0,0 +1,235 @@
+"""Large session payloads kept on disk by content hash, so session state only holds small handles."""
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .config import SESSION_DIR, SESSION_GLOBAL_MEMORY_BYTES, SESSION_MAX_DISK_BYTES, SESSION_MEMORY_BYTES
+from .telemetry import get_telemetry
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+# File extension of each payload kind; "text" payloads are read back as str
+_EXTENSIONS = {"pdf": "pdf", "text": "txt", "jpeg": "jpg"}
+
+
+@dataclass(frozen=True)
+class Payload:
+    """Handle of a stored payload, kept in session state instead of the payload itself."""
+    
+    digest: str
+    size: int
+    kind: str
+    name: str = None
+
+
+class SessionStore:
+    """
+    Content-addressed disk store for session payloads, with a memory tier bounded per session and overall.
+    
+    Every payload is written to disk once, so sessions holding the same PDF or
+    response share one copy. Payloads read back stay in memory for the reruns
+    that follow, least recently used first out once a session holds more than
+    `session_budget` bytes or all sessions together more than `global_budget`.
+    PDFs never enter the memory tier: they are memory-mapped from disk.
+    """
+    
+    def __init__(self, directory=SESSION_DIR, session_budget=SESSION_MEMORY_BYTES,
+                 global_budget=SESSION_GLOBAL_MEMORY_BYTES, max_disk_bytes=SESSION_MAX_DISK_BYTES):
+        self.directory = directory
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.max_disk_bytes = max_disk_bytes
+        # digest -> (value, size), in least recently used order
+        self._memory = OrderedDict()
+        # digest -> sessions that read or stored it while resident
+        self._owners = {}
+        # session id -> OrderedDict of its resident digests and their sizes
+        self._sessions = {}
+        self._session_bytes = {}
+        self._resident = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+    
+    @staticmethod
+    def new_session():
+        """Id under which a new session's payloads are accounted."""
+        return uuid.uuid4().hex
+    
+    def _path(self, payload):
+        return os.path.join(self.directory, f"{payload.digest}.{_EXTENSIONS[payload.kind]}")
+    
+    def put(self, session_id, data, kind, name=None):
+        """
+        Store a payload and return its handle.
+        
+        Args:
+            session_id (str): Session the payload is accounted to while in memory
+            data (str | bytes | memoryview): The payload; str only for "text"
+            kind (str): "pdf", "text" or "jpeg"
+            name (str): Optional display name kept on the handle
+        """
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        payload = Payload(hashlib.sha256(raw).hexdigest(), memoryview(raw).nbytes, kind, name)
+        path = self._path(payload)
+        try:
+            # Stored before, by this or another session: refresh mtime so disk eviction stays least-recently-used
+            os.utime(path)
+        except OSError:
+            self._write(path, raw)
+        get_telemetry().inc("pdf2train_session_payloads_total", event="stored")
+        if kind != "pdf":
+            self._remember(session_id, payload, data if isinstance(data, str) else bytes(data))
+        
+        with self._lock:
+            self._written += payload.size
+            sweep = self._written > self.max_disk_bytes / 20
+            if sweep:
+                self._written = 0
+        if sweep:
+            self._evict_disk()
+        return payload
+    
+    def _write(self, path, raw):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(raw)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def get(self, session_id, payload):
+        """
+        Read a payload back.
+        
+        Returns:
+            str | bytes: The payload, or None once it was evicted from disk
+        """
+        with self._lock:
+            entry = self._memory.get(payload.digest)
+            if entry is not None:
+                self._memory.move_to_end(payload.digest)
+                self._own(session_id, payload.digest, entry[1])
+        if entry is not None:
+            get_telemetry().inc("pdf2train_session_payloads_total", event="memory_hit")
+            return entry[0]
+        
+        path = self._path(payload)
+        try:
+            with open(path, "rb") as stored:
+                value = stored.read()
+            os.utime(path)
+        except OSError:
+            get_telemetry().inc("pdf2train_session_payloads_total", event="missing")
+            return None
+        get_telemetry().inc("pdf2train_session_payloads_total", event="disk_hit")
+        if payload.kind == "text":
+            value = value.decode("utf-8")
+        if payload.kind != "pdf":
+            self._remember(session_id, payload, value)
+        return value
+    
+    def open_document(self, payload):
+        """Memory-map a stored PDF, or None once it was evicted from disk."""
+        from .documents import PdfDocument
+        
+        path = self._path(payload)
+        try:
+            os.utime(path)
+        except OSError:
+            get_telemetry().inc("pdf2train_session_payloads_total", event="missing")
+            return None
+        return PdfDocument.from_path(path)
+    
+    def contains(self, payload):
+        """Whether the payload is still on disk."""
+        return os.path.exists(self._path(payload))
+    
+    def _remember(self, session_id, payload, value):
+        """Keep a payload in memory, then evict until the session and global budgets hold."""
+        if payload.size > self.session_budget:
+            return
+        with self._lock:
+            if payload.digest not in self._memory:
+                self._memory[payload.digest] = (value, payload.size)
+                self._resident += payload.size
+            self._memory.move_to_end(payload.digest)
+            self._own(session_id, payload.digest, payload.size)
+            
+            while self._session_bytes.get(session_id, 0) > self.session_budget:
+                self._disown(session_id, next(iter(self._sessions[session_id])))
+            while self._resident > self.global_budget:
+                digest = next(iter(self._memory))
+                for owner in list(self._owners.get(digest, ())):
+                    self._disown(owner, digest)
+    
+    def _own(self, session_id, digest, size):
+        """Account a resident payload to a session, as its most recently used one."""
+        entries = self._sessions.setdefault(session_id, OrderedDict())
+        if digest not in entries:
+            entries[digest] = size
+            self._session_bytes[session_id] = self._session_bytes.get(session_id, 0) + size
+            self._owners.setdefault(digest, set()).add(session_id)
+        entries.move_to_end(digest)
+    
+    def _disown(self, session_id, digest):
+        """Drop a session's claim on a payload, and the payload itself once no session holds it."""
+        entries = self._sessions[session_id]
+        self._session_bytes[session_id] -= entries.pop(digest)
+        if not entries:
+            # Sessions end without notice, so one with nothing resident is forgotten
+            del self._sessions[session_id]
+            del self._session_bytes[session_id]
+        owners = self._owners[digest]
+        owners.discard(session_id)
+        if not owners:
+            del self._owners[digest]
+            _, size = self._memory.pop(digest)
+            self._resident -= size
+            get_telemetry().inc("pdf2train_session_payloads_total", event="evicted")
+    
+    def _evict_disk(self):
+        """Delete the least recently used payload files until the disk tier fits its budget."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    
+    def stats(self):
+        """Sessions with payloads in memory and the bytes they hold."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._resident,
+            }
+
+
+def get_session_store():
+    """Process-wide session payload store shared by every session."""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
@@ -0,0 +1,249 @@
+"""Cloud Storage persistence of reports and staged PDFs."""
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .config import HTTP_POOL_SIZE, PROJECT_ID, SAVE_MESSAGES, UPLOAD_MAX_WORKERS, UPLOAD_TIMEOUT
+
+
+class StorageManager:
+    """Manager for Google Cloud Storage operations."""
+    
+    def __init__(self, project_id, storage_client=None, report_index=None):
+        self.storage_client = storage_client or build_storage_client(project_id)
+        self.report_index = report_index
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def bucket(self, bucket_name):
+        """Return a reusable handle for `bucket_name`."""
+        with self._lock:
+            if bucket_name not in self._buckets:
+                self._buckets[bucket_name] = self.storage_client.bucket(bucket_name)
+            return self._buckets[bucket_name]
+    
+    @staticmethod
+    def content_type(file_path):
+        if file_path.endswith(".json"):
+            return "application/json"
+        return "text/plain; charset=utf-8"
+    
+    def _write(self, blob, payload, digest, content_type, generation):
+        """Upload a gzipped payload only if the blob is still at `generation` (0 = absent)."""
+        from google.cloud.storage.retry import DEFAULT_RETRY
+        
+        blob.content_encoding = "gzip"
+        blob.metadata = {"sha256": digest}
+        blob.upload_from_string(
+            payload,
+            content_type=content_type,
+            if_generation_match=generation,
+            retry=DEFAULT_RETRY,
+            timeout=UPLOAD_TIMEOUT,
+        )
+    
+    def upload_report(self, bucket_name, file_path, report_content, overwrite=False):
+        """
+        Upload a report gzipped, without silently overwriting other reports.
+        
+        Saving the same content twice is a no-op. A different report already
+        saved under the same name, say another document whose suggested name
+        collided, is left alone unless `overwrite` is set; it then replaces
+        the blob only if nobody else changed it since it was read.
+        
+        Returns:
+            str: "created", "updated", "unchanged" or "conflict" (not saved)
+            
+        Raises:
+            PreconditionFailed: If another writer changed the blob meanwhile
+        """
+        from .telemetry import span
+        
+        with span("storage.save", file_path=file_path) as save_span:
+            outcome = self._upload_report(bucket_name, file_path, report_content, overwrite)
+            save_span.set(outcome=outcome)
+        if self.report_index is not None and outcome != "conflict":
+            self._index_report(bucket_name, file_path, report_content)
+        return outcome
+    
+    def _index_report(self, bucket_name, file_path, report_content):
+        """Make a saved report searchable in the local report index."""
+        from .telemetry import get_telemetry
+        
+        try:
+            self.report_index.add(bucket_name, file_path, report_content)
+        except Exception:
+            # The report is already saved; a broken index must not fail the save
+            get_telemetry().inc("pdf2train_report_index_errors_total")
+    
+    def _upload_report(self, bucket_name, file_path, report_content, overwrite):
+        from google.api_core.exceptions import PreconditionFailed
+        
+        data = report_content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        # mtime=0 keeps the compressed bytes identical for identical reports
+        payload = gzip.compress(data, mtime=0)
+        content_type = self.content_type(file_path)
+        blob = self.bucket(bucket_name).blob(file_path)
+        
+        try:
+            self._write(blob, payload, digest, content_type, generation=0)
+            return "created"
+        except PreconditionFailed:
+            pass
+        
+        blob.reload()
+        if (blob.metadata or {}).get("sha256") == digest:
+            return "unchanged"
+        if not overwrite:
+            return "conflict"
+        self._write(blob, payload, digest, content_type, generation=blob.generation)
+        return "updated"
+    
+    def save_report(self, bucket_name, file_path, report_content, overwrite=False):
+        """Save report content to Google Cloud Storage."""
+        return SAVE_MESSAGES[self.upload_report(bucket_name, file_path, report_content, overwrite)]
+    
+    def save_reports(self, bucket_name, reports, max_workers=UPLOAD_MAX_WORKERS):
+        """
+        Upload many reports in parallel through a bounded pool.
+        
+        Args:
+            bucket_name (str): Destination bucket
+            reports (list): (file_path, report_content) pairs
+            max_workers (int): Concurrent uploads
+            
+        Yields:
+            tuple: (file_path, status, error) in completion order; `status` is
+            None when the upload failed and "conflict" when another report
+            already has that name
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(self.upload_report, bucket_name, file_path, content): file_path
+                for file_path, content in reports
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as exc:
+                    yield futures[future], None, exc
+    
+    def list_reports(self, bucket_name, prefix=""):
+        """
+        List the reports saved under `prefix`.
+        
+        Yields:
+            tuple: (file_path, sha256 of the content, or None if the blob has no digest)
+        """
+        for blob in self.storage_client.list_blobs(bucket_name, prefix=prefix):
+            yield blob.name, (blob.metadata or {}).get("sha256")
+    
+    def read_report(self, bucket_name, file_path):
+        """Download a saved report's content."""
+        return self._decode(self.bucket(bucket_name).blob(file_path).download_as_bytes(timeout=UPLOAD_TIMEOUT))
+    
+    @staticmethod
+    def _decode(data):
+        # Reports are stored gzipped and served decompressed unless the client asked for the raw bytes
+        if data[:2] == b"\x1f\x8b":
+            data = gzip.decompress(data)
+        return data.decode("utf-8")
+    
+    def migrate_report_names(self, bucket_name, prefix="", max_workers=UPLOAD_MAX_WORKERS):
+        """
+        Move reports saved under an old suggested name to the name suggested for them now.
+        
+        Only reports still named `ReportNameGenerator.legacy_name` of their
+        content are moved, so names typed by hand stay as they are. A report
+        whose new name holds another report is left in place.
+        
+        Returns:
+            dict: Counts of listed, unchanged, renamed, conflict and failed reports
+        """
+        paths = [path for path, _ in self.list_reports(bucket_name, prefix)]
+        counts = {"listed": len(paths), "unchanged": 0, "renamed": 0, "conflict": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for outcome in executor.map(lambda path: self._migrate_report_name(bucket_name, path), paths):
+                counts[outcome] += 1
+        return counts
+    
+    def _migrate_report_name(self, bucket_name, file_path):
+        from google.api_core.exceptions import PreconditionFailed
+        
+        from .naming import ReportNameGenerator
+        
+        folder, _, file_name = file_path.rpartition("/")
+        stem, _, extension = file_name.rpartition(".")
+        try:
+            blob = self.bucket(bucket_name).blob(file_path)
+            blob.reload()
+            generation = blob.generation
+            content = self._decode(blob.download_as_bytes(if_generation_match=generation, timeout=UPLOAD_TIMEOUT))
+            text = content
+            if extension == "json":
+                from .schema import TrendspotReport
+                
+                text = TrendspotReport.model_validate_json(content).to_text()
+            name = ReportNameGenerator.suggest_name(text)
+            if not stem or stem == name or stem != ReportNameGenerator.legacy_name(text):
+                return "unchanged"
+            
+            new_path = f"{folder}/{name}.{extension}" if folder else f"{name}.{extension}"
+            if self.upload_report(bucket_name, new_path, content) == "conflict":
+                return "conflict"
+            # Only drop the old blob if nobody saved over it since it was read
+            blob.delete(if_generation_match=generation)
+            return "renamed"
+        except PreconditionFailed:
+            return "conflict"
+        except Exception:
+            return "failed"
+    
+    def stage_document(self, bucket_name, file_path, document):
+        """Upload a PDF for the model to read by URI, skipping it if already staged; see `unstage_document`."""
+        blob = self.bucket(bucket_name).blob(file_path)
+        if not blob.exists():
+            with document.open() as stream:
+                blob.upload_from_file(stream, size=document.size, content_type="application/pdf")
+        return f"gs://{bucket_name}/{file_path}"
+    
+    def unstage_document(self, file_uri):
+        """Delete a PDF staged by `stage_document` once its request is over; returns whether it was deleted."""
+        bucket_name, _, file_path = file_uri.removeprefix("gs://").partition("/")
+        try:
+            self.bucket(bucket_name).blob(file_path).delete(timeout=UPLOAD_TIMEOUT)
+        except Exception:
+            # The extraction already has its response; a blob left behind must not fail it
+            return False
+        return True
+    
+    async def save_report_async(self, bucket_name, file_path, report_content, overwrite=False):
+        """Save report content without blocking the event loop."""
+        # google-cloud-storage has no asyncio transport, so the upload runs on a worker thread
+        return await asyncio.to_thread(self.save_report, bucket_name, file_path, report_content, overwrite)
+
+
+def build_http_session():
+    """Authorized HTTP session with a keep-alive connection pool sized for concurrent sessions."""
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+    
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+
+def build_storage_client(project_id=PROJECT_ID):
+    """Cloud Storage client on the pooled session, or on the emulator if STORAGE_EMULATOR_HOST is set."""
+    from google.cloud import storage
+    
+    if os.getenv("STORAGE_EMULATOR_HOST"):
+        return storage.Client(project_id)
+    return storage.Client(project_id, _http=build_http_session())
@@ -0,0 +1,472 @@
+"""Per-request telemetry: stage spans, token usage, Prometheus metrics and JSON span logs.
+
+Every span records its duration in `pdf2train_stage_seconds` and is handed to
+the configured exporters (PDF2TRAIN_SPAN_EXPORTERS: "json", "none", the
+default, or "package.module:factory" entries, comma separated). Metrics live
+per process; each process snapshots its own into METRICS_DIR, so
+`render_metrics()` serves the sum over the app, the job workers and the HTTP
+service from any of them. A snapshot nobody rewrote for METRICS_STALE_AFTER
+belongs to a process that exited: its counts are added to a retired snapshot
+that stays in the sum, so exported counters never go down when a worker
+restarts.
+"""
+import atexit
+import contextvars
+import http.server
+import importlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .config import (
+    CACHED_INPUT_PRICE_FACTOR,
+    METRICS_DIR,
+    METRICS_FLUSH_INTERVAL,
+    METRICS_STALE_AFTER,
+    MODEL_PRICES,
+    SPAN_EXPORTERS,
+)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; concurrent collectors may then both retire the same snapshot
+    fcntl = None
+
+# Counts of processes that exited, kept in the sum
+RETIRED_SNAPSHOT = "retired.json"
+
+HISTOGRAM_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRICS = {
+    "pdf2train_stage_seconds": ("histogram", "Duration of each instrumented stage, by outcome."),
+    "pdf2train_gemini_time_to_first_chunk_seconds": ("histogram", "Time from a Gemini request to its first chunk."),
+    "pdf2train_gemini_tokens_total": ("counter", "Tokens reported by Gemini usage_metadata, by model and kind."),
+    "pdf2train_gemini_cost_usd_total": ("counter", "Estimated Gemini cost in USD, by model."),
+    "pdf2train_gemini_errors_total": ("counter", "Retryable Gemini errors, by kind."),
+    "pdf2train_gemini_retries_total": ("counter", "Gemini calls retried by the quota guard."),
+    "pdf2train_route_requests_total": ("counter", "Routed extractions, by route and outcome."),
+    "pdf2train_route_seconds": ("histogram", "Duration of routed extractions, speculation included, by route."),
+    "pdf2train_route_cost_usd_total": ("counter", "Estimated Gemini cost of routed extractions, by route."),
+    "pdf2train_context_cache_events_total": ("counter", "Cached contents created, refreshed, expired or failed."),
+    "pdf2train_cache_requests_total": ("counter", "Extraction cache lookups, by result."),
+    "pdf2train_session_payloads_total": ("counter", "Session payloads stored and read back, by event."),
+    "pdf2train_dedup_lookups_total": ("counter", "Near-duplicate index lookups, by result."),
+    "pdf2train_report_index_errors_total": ("counter", "Saved reports the search index failed to record."),
+    "pdf2train_pipeline_reports_total": ("counter", "Post-processed reports, by whether problems were found."),
+    "pdf2train_pipeline_sink_errors_total": ("counter", "Post-processed reports a sink failed to write, by sink."),
+    "pdf2train_jobs_total": ("counter", "Finished extraction jobs, by status."),
+    "pdf2train_job_queue_wait_seconds": ("histogram", "Time jobs waited in the queue before a worker claimed them."),
+}
+
+_current_span = contextvars.ContextVar("pdf2train_span", default=None)
+_telemetry = None
+_telemetry_lock = threading.Lock()
+_metrics_server = None
+
+
+class Span:
+    """A timed stage of a request, nested under the span that was current when it started."""
+    
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error = None
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def add(self, **values):
+        """Accumulate numeric attributes, e.g. tokens over several attempts."""
+        for key, value in values.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+    
+    def end(self):
+        self.duration = time.perf_counter() - self._start
+    
+    def to_dict(self):
+        return {
+            "span": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class JsonLogExporter:
+    """Write each finished span as one JSON line on the `pdf2train.spans` logger."""
+    
+    def __init__(self, logger_name="pdf2train.spans"):
+        self.logger = logging.getLogger(logger_name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+    
+    def export(self, span):
+        self.logger.info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+
+class InMemoryExporter:
+    """Keep finished spans in a list; handy for benchmarks."""
+    
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+    
+    def export(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+def load_exporters(spec=SPAN_EXPORTERS):
+    """Build the exporters named in `spec`."""
+    exporters = []
+    for name in filter(None, (part.strip() for part in spec.split(","))):
+        if name == "none":
+            continue
+        if name == "json":
+            exporters.append(JsonLogExporter())
+            continue
+        module_name, _, factory_name = name.partition(":")
+        exporters.append(getattr(importlib.import_module(module_name), factory_name)())
+    return exporters
+
+
+def _labels_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+class Telemetry:
+    """Metric registry plus span exporters for one process."""
+    
+    def __init__(self, exporters=None, metrics_dir=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL,
+                 stale_after=METRICS_STALE_AFTER):
+        self.exporters = list(exporters) if exporters is not None else load_exporters()
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        # Cumulative snapshot last written, and the part of it a collector already retired
+        self._written = None
+        self._retired = {"counters": {}, "histograms": {}}
+        # Tells this process's snapshot apart from one left by an earlier process with the same PID
+        self._snapshot_name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            atexit.register(self.flush)
+            # Rewriting the snapshot while idle is what tells collectors this process is still alive
+            if self.flush_interval > 0:
+                threading.Thread(
+                    target=self._keep_flushing, name="pdf2train-metrics-flush", daemon=True
+                ).start()
+    
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+    
+    def inc(self, name, value=1.0, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _labels_key(labels)
+            series[key] = series.get(key, 0.0) + value
+        self._maybe_flush()
+    
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _labels_key(labels)
+            histogram = series.setdefault(key, {"buckets": [0] * len(HISTOGRAM_BUCKETS), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(HISTOGRAM_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self._maybe_flush()
+    
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a stage and export it as a span.
+        
+        The span records status "error" if the block raises and "cancelled"
+        if a generator wrapping it is closed early.
+        """
+        span = Span(name, parent=_current_span.get(), **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except GeneratorExit:
+            span.status = "cancelled"
+            raise
+        except BaseException as exc:
+            span.status = "error"
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator resumed in another context; the span still ends normally
+                pass
+            span.end()
+            self.observe("pdf2train_stage_seconds", span.duration, stage=name, status=span.status)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception:
+                    logging.getLogger(__name__).exception("span exporter failed")
+    
+    def record_usage(self, model, prompt_tokens=0, output_tokens=0, cached_tokens=0):
+        """Count Gemini tokens and their estimated cost; `cached_tokens` are part of `prompt_tokens`."""
+        if prompt_tokens:
+            self.inc("pdf2train_gemini_tokens_total", prompt_tokens, model=model, kind="prompt")
+        if output_tokens:
+            self.inc("pdf2train_gemini_tokens_total", output_tokens, model=model, kind="output")
+        if cached_tokens:
+            self.inc("pdf2train_gemini_tokens_total", cached_tokens, model=model, kind="cached")
+        cost = estimate_cost(model, prompt_tokens, output_tokens, cached_tokens)
+        if cost:
+            self.inc("pdf2train_gemini_cost_usd_total", cost, model=model)
+    
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({"counters": self._counters, "histograms": self._histograms}))
+    
+    def _maybe_flush(self):
+        if self.metrics_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def _keep_flushing(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        """Write this process's metrics where other processes can aggregate them."""
+        if not self.metrics_dir:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.metrics_dir, self._snapshot_name)
+        snapshot = self.snapshot()
+        with self._lock:
+            # A collector took this process for dead and retired what it had written: only write the rest now
+            if self._written is not None and not os.path.exists(path):
+                self._retired = self._written
+            self._written = snapshot
+            retired = self._retired
+        fd, temp_path = tempfile.mkstemp(dir=self.metrics_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                json.dump(subtract_snapshot(snapshot, retired), temp_file)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def collect(self):
+        """
+        Metrics of every process that flushed into METRICS_DIR, summed.
+        
+        Snapshots not rewritten for `stale_after` seconds are folded into the
+        retired snapshot and removed. Staleness goes by modification time, not
+        PID, so a collector in another PID namespace sharing the directory
+        does not take live processes for dead.
+        """
+        if not self.metrics_dir:
+            return self.snapshot()
+        self.flush()
+        stale = []
+        snapshots = []
+        for entry in os.scandir(self.metrics_dir):
+            if not entry.name.endswith(".json") or entry.name == RETIRED_SNAPSHOT:
+                continue
+            try:
+                if entry.name != self._snapshot_name and time.time() - entry.stat().st_mtime > self.stale_after:
+                    stale.append(entry.path)
+                    continue
+                with open(entry.path, "r", encoding="utf-8") as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+        snapshots.append(self._retire(stale))
+        return merge_snapshots(snapshots)
+    
+    def _retire(self, paths):
+        """Add the stale snapshots at `paths` to the retired snapshot, remove them and return the retired one."""
+        with open(os.path.join(self.metrics_dir, RETIRED_SNAPSHOT), "a+", encoding="utf-8") as retired_file:
+            if fcntl is not None:
+                fcntl.flock(retired_file, fcntl.LOCK_EX)
+            try:
+                retired_file.seek(0)
+                try:
+                    retired = json.loads(retired_file.read() or "{}")
+                except ValueError:
+                    retired = {}
+                moved = []
+                for path in paths:
+                    try:
+                        # Another collector may have retired it, or its process flushed again, meanwhile
+                        if time.time() - os.stat(path).st_mtime <= self.stale_after:
+                            continue
+                        with open(path, "r", encoding="utf-8") as snapshot_file:
+                            retired = merge_snapshots([retired, json.load(snapshot_file)])
+                    except (OSError, ValueError):
+                        continue
+                    moved.append(path)
+                if moved:
+                    retired_file.seek(0)
+                    retired_file.truncate()
+                    retired_file.write(json.dumps(retired))
+                    retired_file.flush()
+                    os.fsync(retired_file.fileno())
+                    for path in moved:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(retired_file, fcntl.LOCK_UN)
+        return retired
+
+
+def merge_snapshots(snapshots):
+    """Sum counters and histograms across process snapshots."""
+    merged = {"counters": {}, "histograms": {}}
+    for snapshot in snapshots:
+        for name, series in snapshot.get("counters", {}).items():
+            target = merged["counters"].setdefault(name, {})
+            for key, value in series.items():
+                target[key] = target.get(key, 0.0) + value
+        for name, series in snapshot.get("histograms", {}).items():
+            target = merged["histograms"].setdefault(name, {})
+            for key, histogram in series.items():
+                total = target.setdefault(key, {"buckets": [0] * len(HISTOGRAM_BUCKETS), "sum": 0.0, "count": 0})
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+                total["sum"] += histogram["sum"]
+                total["count"] += histogram["count"]
+    return merged
+
+
+def subtract_snapshot(snapshot, other):
+    """Counters and histograms of `snapshot` minus those of `other`, an earlier snapshot of the same process."""
+    result = {"counters": {}, "histograms": {}}
+    for name, series in snapshot.get("counters", {}).items():
+        previous = other.get("counters", {}).get(name, {})
+        result["counters"][name] = {key: value - previous.get(key, 0.0) for key, value in series.items()}
+    for name, series in snapshot.get("histograms", {}).items():
+        previous = other.get("histograms", {}).get(name, {})
+        target = result["histograms"][name] = {}
+        for key, histogram in series.items():
+            before = previous.get(key, {"buckets": [0] * len(HISTOGRAM_BUCKETS), "sum": 0.0, "count": 0})
+            target[key] = {
+                "buckets": [a - b for a, b in zip(histogram["buckets"], before["buckets"])],
+                "sum": histogram["sum"] - before["sum"],
+                "count": histogram["count"] - before["count"],
+            }
+    return result
+
+
+def estimate_cost(model, prompt_tokens=0, output_tokens=0, cached_tokens=0):
+    """Estimated USD cost of a request, with cached prompt tokens at the discounted rate."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    prompt_price = (prompt_tokens - cached_tokens + cached_tokens * CACHED_INPUT_PRICE_FACTOR) * input_price
+    return (prompt_price + output_tokens * output_price) / 1_000_000
+
+
+def _format_labels(key, extra=None):
+    pairs = [tuple(pair) for pair in json.loads(key)] + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def to_prometheus(snapshot):
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        series = snapshot[f"{kind}s"].get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(series.items()):
+            if kind == "counter":
+                lines.append(f"{name}{_format_labels(key)} {value}")
+                continue
+            for bound, count in zip(HISTOGRAM_BUCKETS, value["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', bound))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {value['count']}")
+            lines.append(f"{name}_sum{_format_labels(key)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def get_telemetry():
+    """Process-wide telemetry."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+        return _telemetry
+
+
+def span(name, **attributes):
+    """Shortcut for `get_telemetry().span(...)`."""
+    return get_telemetry().span(name, **attributes)
+
+
+def render_metrics():
+    """Prometheus text for every process sharing METRICS_DIR."""
+    return to_prometheus(get_telemetry().collect())
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve GET /metrics."""
+    
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host, port):
+    """Serve /metrics from a daemon thread, once per process."""
+    global _metrics_server
+    with _telemetry_lock:
+        if _metrics_server is None:
+            _metrics_server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="pdf2train-metrics", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,155 @@
+"""Boot-time warm-up, so the first request to a new replica does not pay for its cold start.
+
+A fresh process would otherwise import streamlit, the genai and Cloud Storage
+SDKs, pydantic and pypdf, build the shared clients, open the local SQLite
+stores and fetch an access token while serving its first request. Warmup does
+all of that once on boot, and the entry points only report ready once it is
+done: `python -m pdf2train app` opens the Streamlit port afterwards and
+`python -m pdf2train serve` answers /readyz.
+"""
+import importlib
+import threading
+import time
+
+from .config import BUCKET_NAME, MODEL_NAME, STARTUP_CONNECT, STARTUP_WARMUP, SYSTEM_INSTRUCTIONS
+
+# What the first extraction imports, in dependency order
+SDK_MODULES = (
+    "pydantic",
+    "pypdf",
+    "google.auth",
+    "google.auth.transport.requests",
+    "google.api_core.exceptions",
+    "google.cloud.storage",
+    "google.genai",
+    "google.genai.types",
+)
+# pdf2train modules behind lazy imports in app_v2 and the entry points
+CORE_MODULES = (
+    "pdf2train.batch",
+    "pdf2train.gemini",
+    "pdf2train.jobs",
+    "pdf2train.pages",
+    "pdf2train.pipeline",
+    "pdf2train.schema",
+    "pdf2train.storage",
+)
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def build_clients():
+    from .clients import get_client_registry
+    
+    registry = get_client_registry()
+    registry.get("storage")
+    registry.get("gemini")
+
+
+def open_stores(app=False):
+    from .cache import get_extraction_cache
+    from .dedup import get_duplicate_index
+    from .search import get_report_index
+    
+    get_extraction_cache()
+    get_duplicate_index().stats()
+    get_report_index().stats()
+    if app:
+        from .jobs import get_job_store
+        from .session import get_session_store
+        
+        get_session_store()
+        get_job_store()
+
+
+def connect():
+    """One authenticated request per service: fetches the access token and opens the pooled TLS connections."""
+    from .clients import get_client_registry
+    from .context_cache import get_context_cache
+    
+    registry = get_client_registry()
+    registry.get("storage").bucket(BUCKET_NAME).exists()
+    client = registry.get("gemini")
+    client.models.count_tokens(model=MODEL_NAME, contents="Trendspot")
+    # Creates the cached content of the instructions now if they are long enough to be cached at all
+    get_context_cache(client).get(SYSTEM_INSTRUCTIONS)
+
+
+def default_steps(app=False, connect_on_boot=STARTUP_CONNECT):
+    """Warm-up steps of the Streamlit app (`app=True`) or the HTTP service."""
+    steps = [
+        ("imports", lambda: import_modules((("streamlit",) if app else ()) + SDK_MODULES + CORE_MODULES)),
+        ("clients", build_clients),
+        ("stores", lambda: open_stores(app)),
+    ]
+    if connect_on_boot:
+        steps.append(("connect", connect))
+    return steps
+
+
+class Warmup:
+    """Run the warm-up steps once, in order, and tell readiness probes when they are done."""
+    
+    def __init__(self, steps):
+        self.steps = steps
+        self.seconds = {}
+        self.errors = {}
+        self._started = False
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def ready(self):
+        return self._ready.is_set()
+    
+    def run(self):
+        """Run every step, once per instance; a failed step is recorded and does not stop the others."""
+        from .telemetry import span
+        
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            with span("startup.warmup"):
+                for name, step in self.steps:
+                    start = time.perf_counter()
+                    try:
+                        with span("startup.warmup.step", step=name):
+                            step()
+                    except Exception as exc:
+                        self.errors[name] = f"{type(exc).__name__}: {exc}"
+                    self.seconds[name] = time.perf_counter() - start
+        finally:
+            self._ready.set()
+    
+    def start(self):
+        """Run the steps on a daemon thread."""
+        threading.Thread(target=self.run, name="pdf2train-warmup", daemon=True).start()
+        return self
+    
+    def wait(self, timeout=None):
+        """Block until the steps are done; returns whether they are."""
+        return self._ready.wait(timeout)
+    
+    def status(self):
+        return {
+            "ready": self.ready,
+            "seconds": {name: round(seconds, 3) for name, seconds in self.seconds.items()},
+            "errors": dict(self.errors),
+        }
+
+
+def get_warmup(app=False):
+    """Process-wide warm-up with the default steps of the app or the service, or none if STARTUP_WARMUP is off."""
+    global _warmup
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = Warmup(default_steps(app) if STARTUP_WARMUP else [])
+        return _warmup
@@ -0,0 +1,39 @@
+"""Shared fixtures; the settings below keep the tests off the host's job queue, caches, quota state and stderr."""
+import atexit
+import os
+import shutil
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="pdf2train_tests_")
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+os.environ.setdefault("PDF2TRAIN_SPAN_EXPORTERS", "none")
+os.environ.setdefault("PDF2TRAIN_METRICS_DIR", "")
+os.environ.setdefault("PDF2TRAIN_JOB_WORKERS", "0")
+os.environ.setdefault("PDF2TRAIN_JOBS_DIR", os.path.join(_WORKDIR, "jobs"))
+os.environ.setdefault("PDF2TRAIN_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("PDF2TRAIN_SESSION_DIR", os.path.join(_WORKDIR, "sessions"))
+os.environ.setdefault("PDF2TRAIN_QUOTA_STATE_PATH", os.path.join(_WORKDIR, "quota.json"))
+os.environ.setdefault("PDF2TRAIN_STARTUP_CONNECT", "0")
+
+import pytest
+
+from pdf2train.documents import PdfDocument
+
+
+@pytest.fixture
+def quota_guard():
+    """A guard that never throttles, so tests only wait on what they exercise."""
+    from pdf2train.quota import build_quota_guard
+    
+    return build_quota_guard(requests_per_minute=0, max_concurrency=64, state_path=None)
+
+
+@pytest.fixture
+def make_pdf():
+    """PdfDocument of `size` random bytes behind a PDF header; the same seed gives the same bytes."""
+    def make(size=1024, seed=0):
+        import random
+        
+        return PdfDocument(b"%PDF-1.4\n" + random.Random(seed).randbytes(size))
+    
+    return make
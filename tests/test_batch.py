@@ -0,0 +1,96 @@
+import pytest
+
+from benchmarks.fake_gemini import FakeApiError, FakeGeminiClient
+from pdf2train import SYSTEM_INSTRUCTIONS
+from pdf2train.batch import BatchProcessor
+from pdf2train.cache import ExtractionCache
+from pdf2train.dedup import DuplicateIndex
+from pdf2train.quota import CircuitOpenError
+
+
+def fake_gemini(**options):
+    return FakeGeminiClient(**dict({"first_chunk_latency": 0, "chunk_latency": 0, "chunks": 3}, **options))
+
+
+def test_identical_documents_are_answered_from_the_cache(tmp_path, make_pdf):
+    gemini = fake_gemini()
+    processor = BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0,
+                               cache=ExtractionCache(str(tmp_path)))
+    
+    first = processor.extract("a.pdf", make_pdf())
+    second = processor.extract("b.pdf", make_pdf())
+    
+    assert first.ok and not first.cached
+    assert second.cached and second.response == first.response
+    assert gemini.calls == 1
+
+
+def test_invalid_structured_responses_are_not_cached(tmp_path, make_pdf):
+    gemini = fake_gemini()
+    processor = BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0,
+                               cache=ExtractionCache(str(tmp_path)), structured=True)
+    
+    # The fake answers with free text, which is not a valid structured report
+    processor.extract("a.pdf", make_pdf())
+    result = processor.extract("a.pdf", make_pdf())
+    
+    assert not result.cached
+    assert gemini.calls == 2
+
+
+class FailingGemini:
+    """Gemini stand-in whose extractions raise `errors` in turn, then succeed."""
+    
+    model_key = "fake"
+    
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+    
+    def process_pdf(self, document, system_instructions, structured=False, metadata=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        yield "Quadro 1\n"
+
+
+@pytest.mark.parametrize("error", [
+    CircuitOpenError("Gemini indisponível; novas tentativas em 30s"),
+    FakeApiError(429, "RESOURCE_EXHAUSTED"),
+    FakeApiError(503, "UNAVAILABLE"),
+])
+def test_errors_the_quota_guard_gave_up_on_are_not_retried(make_pdf, error):
+    gemini = FailingGemini(error)
+    processor = BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0, max_retries=2, retry_backoff=0)
+    
+    result = processor.extract("a.pdf", make_pdf())
+    
+    assert not result.ok and result.attempts == 1
+    assert gemini.calls == 1
+
+
+def test_other_errors_are_retried_up_to_max_retries(make_pdf):
+    gemini = FailingGemini(ValueError("resposta vazia"), ValueError("resposta vazia"))
+    processor = BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0, max_retries=2, retry_backoff=0)
+    
+    result = processor.extract("a.pdf", make_pdf())
+    
+    assert result.ok and result.attempts == 3
+    assert result.response == "Quadro 1\n"
+
+
+def test_truncated_responses_are_reported_and_not_cached(tmp_path, make_pdf):
+    gemini = fake_gemini(finish_reason="MAX_TOKENS")
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    duplicates = DuplicateIndex(str(tmp_path / "dedup.sqlite3"))
+    processor = BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0, cache=cache,
+                               duplicates=duplicates)
+    
+    result = processor.extract("a.pdf", make_pdf())
+    
+    assert result.truncated and not result.ok and result.response
+    assert gemini.calls == 1
+    key = ExtractionCache.make_key(make_pdf().data, gemini.model_key, SYSTEM_INSTRUCTIONS)
+    assert cache.get(key) is None
+    assert duplicates.stats()["documents"] == 0
+    assert not processor.extract("a.pdf", make_pdf()).cached
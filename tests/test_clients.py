@@ -0,0 +1,88 @@
+import threading
+
+import requests
+
+from pdf2train.clients import ClientRegistry
+from pdf2train.gemini import use_http_session
+
+
+def test_health_check_runs_off_the_request_path():
+    started, release = threading.Event(), threading.Event()
+    
+    def health_check(client):
+        started.set()
+        release.wait(5)
+        return False
+    
+    registry = ClientRegistry(max_age=3600, health_check_interval=0)
+    registry.register("storage", object, health_check=health_check)
+    client = registry.get("storage")
+    
+    # The due check starts in the background and the shared client is handed out at once
+    assert registry.get("storage") is client
+    assert started.wait(5)
+    assert registry.get("storage") is client
+    
+    release.set()
+    for _ in range(100):
+        if registry.stats()["storage"]["failed_health_checks"]:
+            break
+        threading.Event().wait(0.01)
+    assert registry.stats()["storage"]["failed_health_checks"] == 1
+    assert registry.get("storage") is not client
+    assert registry.stats()["storage"]["builds"] == 2
+
+
+def test_genai_requests_go_through_the_pooled_session():
+    from google import genai
+    from google.auth.credentials import AnonymousCredentials
+    
+    class Session:
+        def __init__(self):
+            self.calls = []
+        
+        def request(self, method, url, **kwargs):
+            self.calls.append((method, url, kwargs))
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"totalTokens": 7}'
+            return response
+    
+    session = Session()
+    client = genai.Client(vertexai=True, project="project", location="us-central1",
+                          credentials=AnonymousCredentials())
+    use_http_session(client, session)
+    
+    client.models.count_tokens(model="gemini-1.5-flash-002", contents="Trendspot")
+    client.models.count_tokens(model="gemini-1.5-flash-002", contents="Trendspot")
+    
+    assert len(session.calls) == 2
+    method, url, kwargs = session.calls[0]
+    assert method == "POST" and url.endswith(":countTokens")
+    assert kwargs["stream"] is False
+
+
+def test_other_genai_transports_are_left_alone(monkeypatch):
+    from google import genai
+    from google.genai import _api_client
+    from google.auth.credentials import AnonymousCredentials
+    
+    def build():
+        return genai.Client(vertexai=True, project="project", location="us-central1",
+                            credentials=AnonymousCredentials())
+    
+    class Session:
+        def request(self, *args, **kwargs):
+            raise AssertionError("the SDK transport should have been kept")
+    
+    # Another release of the SDK
+    monkeypatch.setattr(genai, "__version__", "9.9.9")
+    client = build()
+    assert use_http_session(client, Session())._api_client._request.__self__ is client._api_client
+    monkeypatch.undo()
+    
+    # The same release with a request method of another shape
+    monkeypatch.setattr(_api_client.ApiClient, "_request", lambda self, http_request, stream=False, retry=None: None)
+    client = build()
+    original = client._api_client._request
+    assert use_http_session(client, Session())._api_client._request == original
@@ -0,0 +1,62 @@
+import pytest
+
+from benchmarks.fake_gemini import FakeGeminiClient
+from pdf2train import SYSTEM_INSTRUCTIONS
+from pdf2train.batch import BatchProcessor
+from pdf2train.cache import ExtractionCache
+from pdf2train.dedup import DuplicateIndex, Fingerprint
+from pdf2train.documents import PdfDocument
+
+
+@pytest.fixture
+def processor_for(tmp_path):
+    """BatchProcessor over a fresh cache and an index that fingerprints documents as `kind`, by their last bit."""
+    def build(kind, **options):
+        index = DuplicateIndex(str(tmp_path / "dedup.sqlite3"))
+        # One bit apart: near duplicates of each other
+        index.fingerprint = lambda document: Fingerprint(kind, document.data[-1] & 1)
+        gemini = FakeGeminiClient(first_chunk_latency=0, chunk_latency=0, chunks=2)
+        cache = ExtractionCache(str(tmp_path / "cache"))
+        return BatchProcessor(gemini, SYSTEM_INSTRUCTIONS, requests_per_minute=0, cache=cache,
+                              duplicates=index, **options), gemini
+    
+    return build
+
+
+def near_duplicates():
+    return PdfDocument(b"%PDF-1.4\nTrendspot\x00"), PdfDocument(b"%PDF-1.4\nTrendspot\x01")
+
+
+@pytest.mark.parametrize("kind", ["text", "image"])
+def test_a_near_duplicate_is_only_suggested_by_default(processor_for, kind):
+    processor, gemini = processor_for(kind)
+    original, duplicate = near_duplicates()
+    
+    processor.extract("2026-10-01.pdf", original)
+    result = processor.extract("2026-10-01 (1).pdf", duplicate)
+    
+    assert not result.cached and result.duplicate_of == "2026-10-01.pdf"
+    assert gemini.calls == 2
+
+
+def test_only_text_layer_matches_are_reused_when_asked(processor_for):
+    processor, gemini = processor_for("text", reuse_duplicates=True)
+    original, duplicate = near_duplicates()
+    
+    first = processor.extract("2026-10-01.pdf", original)
+    result = processor.extract("2026-10-01 (1).pdf", duplicate)
+    
+    assert result.cached and result.duplicate_of == "2026-10-01.pdf"
+    assert result.response == first.response
+    assert gemini.calls == 1
+
+
+def test_page_image_matches_are_never_reused(processor_for):
+    processor, gemini = processor_for("image", reuse_duplicates=True)
+    original, duplicate = near_duplicates()
+    
+    processor.extract("2026-10-01.pdf", original)
+    result = processor.extract("2026-10-02.pdf", duplicate)
+    
+    assert not result.cached and result.duplicate_of == "2026-10-01.pdf"
+    assert gemini.calls == 2
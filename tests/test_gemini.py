@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.fake_gemini import FakeGenaiClient, FakeStorageClient
+from benchmarks.replay import SYNTHETIC_CASSETTE, RecordingGenaiClient, ReplayGenaiClient
+from pdf2train import SYSTEM_INSTRUCTIONS, GeminiClient
+from pdf2train.config import BUCKET_NAME, STAGING_FOLDER
+from pdf2train.storage import StorageManager
+
+
+def recorded_text(key):
+    with open(SYNTHETIC_CASSETTE, encoding="utf-8") as cassette:
+        for line in cassette:
+            entry = json.loads(line)
+            if entry["key"] == key:
+                return "".join(chunk["text"] or "" for chunk in entry["chunks"])
+
+
+def test_replayed_stream_is_yielded_whole_with_its_usage(quota_guard, make_pdf):
+    client = GeminiClient(None, None, client=ReplayGenaiClient(speed=0, match="any"), quota_guard=quota_guard)
+    metadata = {}
+    
+    response = "".join(client.process_pdf(make_pdf(), SYSTEM_INSTRUCTIONS, metadata=metadata))
+    
+    assert response == recorded_text("synthetic-text")
+    assert metadata["finish_reason"] == "STOP"
+    assert metadata["tokens"]["prompt_tokens"] == 1290
+    assert metadata["tokens"]["output_tokens"] == 980
+    assert metadata["cost_usd"] > 0
+
+
+def test_recorded_requests_replay_exactly(tmp_path, quota_guard, make_pdf):
+    cassette = str(tmp_path / "cassette.jsonl")
+    recorder = GeminiClient(None, None, client=RecordingGenaiClient(
+        FakeGenaiClient(first_chunk_latency=0, chunk_latency=0, chunks=3), cassette,
+    ), quota_guard=quota_guard)
+    recorded = "".join(recorder.process_pdf(make_pdf(seed=1), SYSTEM_INSTRUCTIONS))
+    
+    replayer = GeminiClient(None, None, client=ReplayGenaiClient(cassette, speed=0), quota_guard=quota_guard)
+    assert "".join(replayer.process_pdf(make_pdf(seed=1), SYSTEM_INSTRUCTIONS)) == recorded
+    with pytest.raises(KeyError):
+        "".join(replayer.process_pdf(make_pdf(seed=2), SYSTEM_INSTRUCTIONS))
+
+
+def test_async_stream_matches_the_sync_one(quota_guard, make_pdf):
+    replay = ReplayGenaiClient(speed=0, match="any")
+    client = GeminiClient(None, None, client=replay, quota_guard=quota_guard)
+    
+    async def extract():
+        return "".join([chunk async for chunk in client.process_pdf_async(make_pdf(), SYSTEM_INSTRUCTIONS)])
+    
+    assert asyncio.run(extract()) == recorded_text("synthetic-text")
+
+
+def test_staged_pdfs_are_deleted_once_the_request_is_over(monkeypatch, quota_guard, make_pdf):
+    monkeypatch.setattr("pdf2train.gemini.INLINE_PDF_MAX_BYTES", 0)
+    storage_client = FakeStorageClient()
+    staged = []
+    
+    class Storage(StorageManager):
+        def stage_document(self, bucket_name, file_path, document):
+            staged.append(file_path)
+            return super().stage_document(bucket_name, file_path, document)
+    
+    client = GeminiClient(None, None, client=FakeGenaiClient(first_chunk_latency=0, chunk_latency=0, chunks=3),
+                          quota_guard=quota_guard, storage_manager=Storage(None, storage_client=storage_client))
+    
+    assert "".join(client.process_pdf(make_pdf(), SYSTEM_INSTRUCTIONS)) == "Quadro 0\nQuadro 1\nQuadro 2\n"
+    
+    async def extract():
+        return "".join([chunk async for chunk in client.process_pdf_async(make_pdf(), SYSTEM_INSTRUCTIONS)])
+    
+    asyncio.run(extract())
+    # Two requests of the same document, each with its own staged copy, and nothing left behind
+    assert len(set(staged)) == 2 and all(path.startswith(f"{STAGING_FOLDER}/") for path in staged)
+    assert storage_client.bucket(BUCKET_NAME).objects == {}
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_gemini import FakeGeminiClient
+
+from pdf2train import SYSTEM_INSTRUCTIONS
+from pdf2train.cache import ExtractionCache
+from pdf2train.jobs import JobStore, JobWorker
+from pdf2train.pages import PageTruncatedError
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), max_attempts=3, lease_seconds=60)
+
+
+def test_submitting_a_pending_or_cleanly_done_document_returns_its_job(store, make_pdf):
+    job = store.submit("a.pdf", make_pdf(), "key")
+    assert store.submit("a.pdf", make_pdf(), "key").id == job.id
+    
+    claimed = store.claim("worker")
+    store.finish(claimed.id, "worker", "Quadro 1")
+    assert store.submit("a.pdf", make_pdf(), "key").id == job.id
+
+
+@pytest.mark.parametrize("outcome", [
+    {"error": "O modelo retornou um JSON inválido: 2 erros."},
+    {"truncated": True},
+])
+def test_a_job_that_finished_badly_is_not_reused(store, make_pdf, outcome):
+    job = store.submit("a.pdf", make_pdf(), "key")
+    store.claim("worker")
+    store.finish(job.id, "worker", '{"quadros": [', **outcome)
+    
+    assert store.submit("a.pdf", make_pdf(), "key").id != job.id
+
+
+def test_a_claimed_job_is_not_claimed_again_until_its_lease_expires(store, make_pdf):
+    job = store.submit("a.pdf", make_pdf(), "key")
+    assert store.claim("first").id == job.id
+    assert store.claim("second") is None
+    
+    store.lease_seconds = -1
+    assert store.renew(job.id, "first")
+    reclaimed = store.claim("second")
+    assert reclaimed.id == job.id and reclaimed.worker == "second" and reclaimed.attempts == 2
+    # The first worker lost the lease, so it can no longer publish or finish the job
+    assert not store.update_partial(job.id, "first", "Quadro", 1, time.time())
+    store.finish(job.id, "first", "Quadro 1")
+    assert store.get(job.id).status == "running"
+
+
+def test_failed_attempts_are_retried_until_out_of_attempts(store, make_pdf):
+    job = store.submit("a.pdf", make_pdf(), "key")
+    for attempt in range(1, 4):
+        claimed = store.claim("worker")
+        assert claimed.attempts == attempt
+        store.fail(job.id, "worker", "ServiceUnavailable: 503")
+    
+    failed = store.get(job.id)
+    assert failed.status == "failed" and failed.error == "ServiceUnavailable: 503"
+    assert store.claim("worker") is None
+    assert store.submit("a.pdf", make_pdf(), "key").id != job.id
+
+
+def test_a_retry_waits_for_its_delay(store, make_pdf):
+    job = store.submit("a.pdf", make_pdf(), "key")
+    store.claim("worker")
+    store.fail(job.id, "worker", "ServiceUnavailable: 503", retry_delay=60)
+    
+    assert store.get(job.id).status == "queued"
+    assert store.claim("worker") is None
+
+
+class FailingGemini:
+    """Gemini stand-in whose every extraction raises `error`."""
+    
+    model_key = "fake"
+    
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+    
+    def process_pdf(self, document, system_instructions, structured=False, metadata=None):
+        self.calls += 1
+        raise self.error
+        yield
+
+
+def validation_error():
+    from pydantic import ValidationError
+    
+    from pdf2train.schema import TrendspotReport
+    
+    try:
+        TrendspotReport.model_validate_json("{}")
+    except ValidationError as exc:
+        return exc
+
+
+@pytest.mark.parametrize("error, attempts", [
+    (RuntimeError("503 UNAVAILABLE"), 3),
+    (PageTruncatedError("A extração da página 4 excedeu o limite de tokens."), 1),
+    (None, 1),
+])
+def test_only_transient_failures_are_retried(store, make_pdf, error, attempts):
+    gemini = FailingGemini(error or validation_error())
+    worker = JobWorker(store, gemini, retry_backoff=0)
+    job = store.submit("a.pdf", make_pdf(), "key")
+    
+    while worker.run_once():
+        pass
+    
+    assert gemini.calls == attempts
+    assert store.get(job.id).status == "failed"
+
+
+def test_a_job_nobody_claims_can_be_run_by_id(store, make_pdf):
+    older = store.submit("a.pdf", make_pdf(seed=1), "older")
+    job = store.submit("b.pdf", make_pdf(seed=2), "key")
+    assert job.unclaimed_for(now=job.submitted_at + 20) == 20
+    
+    worker = JobWorker(store, FakeGeminiClient(first_chunk_latency=0, chunk_latency=0, chunks=2))
+    assert worker.run_once(job.id)
+    
+    assert store.get(job.id).status == "done"
+    assert store.get(job.id).unclaimed_for() == 0
+    assert store.get(older.id).status == "queued"
+
+
+def test_a_job_waiting_behind_a_busy_worker_is_not_run_locally(store, make_pdf):
+    busy = store.submit("a.pdf", make_pdf(seed=1), "busy")
+    job = store.submit("b.pdf", make_pdf(seed=2), "key")
+    now = job.submitted_at + 60
+    
+    # The worker holds a lease on another job and keeps sending heartbeats
+    store.heartbeat("worker", now=now - 2)
+    assert store.claim("worker").id == busy.id
+    assert store.live_workers(15, now=now) == 1
+    assert not store.orphaned(job, timeout=15, now=now)
+    
+    # Once its heartbeats stop, the waiting job has nobody to run it
+    assert store.orphaned(job, timeout=15, now=now + 20)
+
+
+def test_a_running_worker_sends_heartbeats_until_it_stops(store):
+    worker = JobWorker(store, FakeGeminiClient(), poll_interval=0.01, heartbeat_interval=0.01)
+    stop = threading.Event()
+    thread = threading.Thread(target=worker.run, args=(stop,))
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while store.live_workers(1) == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.live_workers(1) == 1
+    finally:
+        stop.set()
+        thread.join(5)
+    assert store.live_workers(1) == 0
+
+
+def test_report_problems_do_not_keep_a_job_from_being_cached_or_reused(store, tmp_path, make_pdf):
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    gemini = FakeGeminiClient(first_chunk_latency=0, chunk_latency=0, chunks=2)
+    job = store.submit("a.pdf", make_pdf(), "key")
+    JobWorker(store, gemini, cache=cache).run_once()
+    
+    # The fake's free text has no date nor link, which the pipeline flags for review
+    done = store.get(job.id)
+    assert done.status == "done" and done.error is None and done.problems
+    # Cached raw, as the batch path caches it; the pipeline runs again on whatever reads it
+    raw = "".join(gemini.process_pdf(make_pdf(), SYSTEM_INSTRUCTIONS))
+    assert cache.get("key") == raw != done.response
+    assert store.submit("a.pdf", make_pdf(), "key").id == job.id
+
+
+def test_a_store_created_before_the_problems_column_gets_it(tmp_path, make_pdf):
+    import sqlite3
+    
+    path = str(tmp_path / "old.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, cache_key TEXT NOT NULL, name TEXT NOT NULL, "
+        "pdf_path TEXT NOT NULL, structured INTEGER NOT NULL DEFAULT 0, page_split INTEGER NOT NULL DEFAULT 0, "
+        "status TEXT NOT NULL DEFAULT 'queued', partial TEXT NOT NULL DEFAULT '', "
+        "chunks INTEGER NOT NULL DEFAULT 0, response TEXT, error TEXT, truncated INTEGER NOT NULL DEFAULT 0, "
+        "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, submitted_at REAL NOT NULL, "
+        "started_at REAL, first_chunk_at REAL, finished_at REAL);"
+    )
+    connection.close()
+    
+    store = JobStore(path)
+    job = store.submit("a.pdf", make_pdf(), "key")
+    store.claim("worker")
+    store.finish(job.id, "worker", "Quadro 1", problems="sem data")
+    assert store.get(job.id).problems == "sem data"
@@ -0,0 +1,53 @@
+from benchmarks.fake_gemini import FakeStorageClient
+from pdf2train.naming import ReportNameGenerator
+from pdf2train.storage import StorageManager
+
+BUCKET = "bucket"
+ACCENTED = "Trendspot do dia 03/10/2026 Alimentação e Nutrição"
+LONG = "Trendspot do dia 03/10/2026 Beleza Cabelo cacheado em alta entre criadoras de conteúdo {}"
+
+
+def test_accented_letters_are_transliterated():
+    assert ReportNameGenerator.suggest_name(ACCENTED) == "Trendspot_do_dia_03_10_2026_Alimentacao_e_Nutricao"
+    assert ReportNameGenerator.legacy_name(ACCENTED) == "Trendspot_do_dia_03102026_Alimentao_e_Nutrio"
+
+
+def test_truncated_names_of_different_reports_do_not_collide():
+    first = ReportNameGenerator.suggest_name(LONG.format("Áudio"), max_words=20)
+    second = ReportNameGenerator.suggest_name(LONG.format("Vídeo"), max_words=20)
+    
+    assert first != second
+    assert len(first) <= 50 and len(second) <= 50
+    assert first == ReportNameGenerator.suggest_name(LONG.format("Áudio"), max_words=20)
+    # Under the old names both reports were saved to the same blob
+    legacy = {ReportNameGenerator.legacy_name(LONG.format(kind), max_words=20) for kind in ("Áudio", "Vídeo")}
+    assert len(legacy) == 1
+
+
+def test_reports_under_their_old_suggested_name_are_moved_to_the_current_one():
+    manager = StorageManager(None, storage_client=FakeStorageClient())
+    legacy_path = f"trendspot/{ReportNameGenerator.legacy_name(ACCENTED)}.txt"
+    manager.upload_report(BUCKET, legacy_path, ACCENTED)
+    manager.upload_report(BUCKET, "trendspot/escolhido_a_mao.txt", ACCENTED + " revisado")
+    
+    counts = manager.migrate_report_names(BUCKET, "trendspot/")
+    
+    assert counts == {"listed": 2, "unchanged": 1, "renamed": 1, "conflict": 0, "failed": 0}
+    assert sorted(name for name, _ in manager.list_reports(BUCKET, "trendspot/")) == [
+        f"trendspot/{ReportNameGenerator.suggest_name(ACCENTED)}.txt", "trendspot/escolhido_a_mao.txt",
+    ]
+    # Saving the report again now finds it under its name instead of creating a second blob
+    path = f"trendspot/{ReportNameGenerator.suggest_name(ACCENTED)}.txt"
+    assert manager.upload_report(BUCKET, path, ACCENTED) == "unchanged"
+
+
+def test_a_report_whose_new_name_is_taken_stays_where_it_is():
+    manager = StorageManager(None, storage_client=FakeStorageClient())
+    legacy_path = f"trendspot/{ReportNameGenerator.legacy_name(ACCENTED)}.txt"
+    manager.upload_report(BUCKET, legacy_path, ACCENTED)
+    manager.upload_report(BUCKET, f"trendspot/{ReportNameGenerator.suggest_name(ACCENTED)}.txt", "outro relatório")
+    
+    counts = manager.migrate_report_names(BUCKET, "trendspot/")
+    
+    assert counts["conflict"] == 1 and counts["renamed"] == 0
+    assert manager.read_report(BUCKET, legacy_path) == ACCENTED
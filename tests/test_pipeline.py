@@ -0,0 +1,48 @@
+from pdf2train.pipeline import (
+    DateNormalizer,
+    LineSplitter,
+    LinkResolver,
+    ReportPipeline,
+    SchemaValidator,
+    SectionParser,
+    template_link,
+)
+
+RESPONSE = """Nome : Trendspot do dia 03/02/2025
+Categoria : Moda
+***********************************************
+Em Alta:
+Saia midi
+Volta com força nas vitrines.
+Tipo : Produto
+Link : Insira o link aqui
+***********************************************
+Para Aproveitar Agora: Apostar em saias.
+"""
+
+
+def pipeline():
+    resolver = template_link("https://trendspot.example/{date}/{category}")
+    return ReportPipeline(stages=(LineSplitter, SectionParser, DateNormalizer, lambda: LinkResolver(resolver),
+                                  SchemaValidator))
+
+
+def test_a_resolved_report_link_is_rendered_in_the_header():
+    # Streamed a few characters at a time, as the model answers
+    report = pipeline().process(RESPONSE[index:index + 7] for index in range(0, len(RESPONSE), 7))
+    
+    lines = report.text.split("\n")
+    assert lines[:4] == [
+        "Nome : Trendspot do dia 03/02/2025",
+        "Categoria : Moda",
+        "Link do relatório : https://trendspot.example/2025-02-03/moda",
+        "*" * 47,
+    ]
+    assert sum(line.startswith("Link do relatório") for line in lines) == 1
+    assert report.report["report_link"] == "https://trendspot.example/2025-02-03/moda"
+
+
+def test_a_report_without_quadros_still_gets_its_link():
+    report = pipeline().process(["Nome : Trendspot do dia 03/02/2025\nCategoria : Moda\n"])
+    
+    assert report.text.split("\n")[-1] == "Link do relatório : https://trendspot.example/2025-02-03/moda"
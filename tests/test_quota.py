@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_gemini import FakeApiError, FakeQuotaService
+from pdf2train.quota import AdaptiveConcurrency, CircuitBreaker, CircuitOpenError, QuotaGuard, TokenBucket
+
+
+def build_guard(max_concurrency=4, max_retries=3, failure_threshold=5):
+    return QuotaGuard(TokenBucket(0, 1), AdaptiveConcurrency(max_concurrency),
+                      CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60),
+                      max_retries=max_retries, retry_base=0, retry_max=0)
+
+
+def test_a_dropped_stream_resumes_after_the_text_already_yielded():
+    service = FakeQuotaService(requests_per_minute=6000, latency=0, chunks=10, chunk_latency=0, burst=100,
+                               drop_rate=0.9, seed=0)
+    guard = build_guard(max_retries=20, failure_threshold=100)
+    
+    chunks = list(guard.stream(service.stream))
+    
+    assert chunks == [f"Quadro {index}\n" for index in range(10)]
+    assert guard.stats()["resumed"] == service.dropped > 0
+    assert guard.concurrency.in_flight == 0
+
+
+def test_retries_stop_at_max_retries():
+    calls = []
+    
+    def open_stream(emitted):
+        calls.append(emitted)
+        raise FakeApiError(429, "RESOURCE_EXHAUSTED")
+    
+    guard = build_guard(max_retries=2)
+    with pytest.raises(FakeApiError):
+        list(guard.stream(open_stream))
+    
+    assert len(calls) == 3
+    assert guard.stats()["quota_errors"] == 3
+    assert guard.concurrency.in_flight == 0
+
+
+def test_errors_a_retry_cannot_fix_are_raised_at_once():
+    calls = []
+    
+    def open_stream(emitted):
+        calls.append(emitted)
+        raise ValueError("400 INVALID_ARGUMENT")
+    
+    with pytest.raises(ValueError):
+        list(build_guard().stream(open_stream))
+    assert len(calls) == 1
+
+
+def test_the_circuit_opens_after_repeated_failures():
+    def open_stream(emitted):
+        raise FakeApiError(503, "UNAVAILABLE")
+    
+    guard = build_guard(max_retries=0, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(FakeApiError):
+            list(guard.stream(open_stream))
+    
+    with pytest.raises(CircuitOpenError):
+        list(guard.stream(open_stream))
+    assert guard.stats()["circuit"] == "open"
+
+
+def test_a_stream_cancelled_while_waiting_for_a_slot_does_not_keep_it():
+    guard = build_guard(max_concurrency=1)
+    
+    async def stream(emitted):
+        yield "Quadro 0\n"
+    
+    async def consume():
+        return [text async for text in guard.astream(stream)]
+    
+    async def scenario():
+        guard.concurrency.acquire()
+        waiting = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        
+        guard.concurrency.release("ok")
+        # The abandoned wait takes the freed slot on its thread; give it time to, and to hand it back
+        await asyncio.sleep(0.2)
+        assert guard.concurrency.in_flight == 0
+    
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import pytest
+from google.api_core.exceptions import PreconditionFailed
+
+from benchmarks.fake_gemini import FakeStorageClient
+from pdf2train.storage import StorageManager
+
+BUCKET = "bucket"
+
+
+@pytest.fixture
+def manager():
+    return StorageManager(None, storage_client=FakeStorageClient())
+
+
+def test_saving_the_same_report_twice_is_a_no_op(manager):
+    assert manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 1") == "created"
+    assert manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 1") == "unchanged"
+    assert manager.read_report(BUCKET, "trendspot/a.txt") == "Quadro 1"
+
+
+def test_another_report_under_the_same_name_is_not_overwritten(manager):
+    manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 1")
+    
+    assert manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 2") == "conflict"
+    assert manager.read_report(BUCKET, "trendspot/a.txt") == "Quadro 1"
+    
+    assert manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 2", overwrite=True) == "updated"
+    assert manager.read_report(BUCKET, "trendspot/a.txt") == "Quadro 2"
+
+
+def test_a_concurrent_write_is_not_overwritten(manager, monkeypatch):
+    manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 1")
+    blob_type = type(manager.bucket(BUCKET).blob("trendspot/a.txt"))
+    reload = blob_type.reload
+    
+    def reload_then_race(blob):
+        reload(blob)
+        # Another writer saves between our read and our write
+        manager.bucket(BUCKET).blob(blob.name).upload_from_string(b"outro")
+    
+    monkeypatch.setattr(blob_type, "reload", reload_then_race)
+    with pytest.raises(PreconditionFailed):
+        manager.upload_report(BUCKET, "trendspot/a.txt", "Quadro 2", overwrite=True)
+
+
+def test_parallel_saves_report_each_outcome(manager):
+    manager.upload_report(BUCKET, "trendspot/taken.txt", "Quadro 0")
+    reports = [(f"trendspot/{index}.txt", f"Quadro {index}") for index in range(8)]
+    reports.append(("trendspot/taken.txt", "Quadro 9"))
+    
+    outcomes = {path: (status, error) for path, status, error in manager.save_reports(BUCKET, reports)}
+    
+    assert outcomes.pop("trendspot/taken.txt") == ("conflict", None)
+    assert set(outcomes.values()) == {("created", None)}
+    assert [name for name, _ in manager.list_reports(BUCKET, "trendspot/")] == sorted(path for path, _ in reports)
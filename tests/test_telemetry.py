@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from pdf2train.telemetry import Telemetry
+
+
+def test_spans_are_not_exported_by_default():
+    env = {name: value for name, value in os.environ.items() if name != "PDF2TRAIN_SPAN_EXPORTERS"}
+    output = subprocess.run(
+        [sys.executable, "-c", "from pdf2train.telemetry import load_exporters; print(len(load_exporters()))"],
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    assert output.strip() == "0"
+
+
+def write_snapshot(directory, name, jobs, age=0):
+    path = directory / name
+    path.write_text(json.dumps({"counters": {"pdf2train_jobs_total": {"[]": jobs}}, "histograms": {}}))
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def test_metrics_are_summed_over_processes_and_stale_snapshots_retired(tmp_path):
+    stale = write_snapshot(tmp_path, "1234-0000abcd.json", 5.0, age=120)
+    first = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    second = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    first.inc("pdf2train_jobs_total")
+    second.inc("pdf2train_jobs_total", 2)
+    second.flush()
+    
+    merged = first.collect()
+    
+    # Two registries of the same process keep separate snapshots; the stale one is folded into the retired one
+    assert merged["counters"]["pdf2train_jobs_total"]["[]"] == 8.0
+    assert not stale.exists()
+    assert (tmp_path / "retired.json").exists()
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+
+def test_counters_do_not_drop_when_a_process_exits(tmp_path):
+    collector = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    worker = write_snapshot(tmp_path, "1234-0000abcd.json", 5.0)
+    assert collector.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 5.0
+    
+    # The worker exits; its snapshot stops being rewritten, then a restarted worker counts from zero
+    os.utime(worker, (time.time() - 120, time.time() - 120))
+    write_snapshot(tmp_path, "1234-1111abcd.json", 1.0)
+    assert collector.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 6.0
+    assert collector.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 6.0
+    
+    # A collector in another PID namespace sharing the directory sums the same
+    other = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    assert other.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 6.0
+
+
+def test_a_process_retired_while_alive_is_not_counted_twice(tmp_path):
+    paused = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    paused.inc("pdf2train_jobs_total", 3)
+    paused.flush()
+    snapshot = tmp_path / paused._snapshot_name
+    os.utime(snapshot, (time.time() - 120, time.time() - 120))
+    collector = Telemetry(exporters=[], metrics_dir=str(tmp_path), stale_after=60)
+    assert collector.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 3.0
+    assert not snapshot.exists()
+    
+    paused.inc("pdf2train_jobs_total")
+    paused.flush()
+    assert collector.collect()["counters"]["pdf2train_jobs_total"]["[]"] == 4.0